@@ -0,0 +1,122 @@
+"""Recent audit log entries of each guild, for working out who did what without querying the audit log"""
+import asyncio
+import collections
+import datetime
+import typing
+
+import discord
+
+BUFFER_SIZE = 100  # entries kept per guild
+WAIT_TIME = 2  # seconds to wait for an entry that hasn't arrived yet
+SHORT_WAIT_TIME = 0.5  # seconds to wait for events that usually have no entry, like members deleting their own messages
+MATCH_WINDOW = datetime.timedelta(seconds=30)  # how old an entry can be and still explain an event happening now
+ENTRY_LIFETIME = datetime.timedelta(minutes=10)  # how long an entry is kept, in case Discord merges later events into it
+MERGE_LOOKUP_LIMIT = 10  # newest entries fetched to see whether an event was merged into an existing entry
+
+
+class AuditLogBuffer:
+    """
+    A ring buffer of each guild's newest audit log entries, fed by the audit log entry create event.
+    Events like bans and nickname changes are matched to their entry by action, target and time. The entry is often
+    sent a moment after the event it explains, so a lookup that finds nothing waits briefly for it to come in.
+    Entries are dropped once they are older than ENTRY_LIFETIME, so an old entry can't explain a new event.
+    """
+
+    def __init__(self, size: int = BUFFER_SIZE):
+        self.size = size
+        self._entries = {}  # guild_id -> deque of entries, oldest first
+        self._waiters = {}  # guild_id -> list of (matcher, future)
+        self._used = {}  # entry id -> how many events a counted entry has explained so far
+
+    def add(self, entry: discord.AuditLogEntry):
+        """Buffers a new entry, handing it to anyone waiting for it"""
+        self._expire(entry.guild.id)
+        entries = self._entries.setdefault(entry.guild.id, collections.deque(maxlen=self.size))
+        if len(entries) == entries.maxlen:
+            self._used.pop(entries[0].id, None)
+        entries.append(entry)
+        for matches, future in self._waiters.get(entry.guild.id, ()):
+            if not future.done() and matches(entry):
+                self._take(entry)
+                future.set_result(entry)
+
+    def clear(self, guild_id: int):
+        """Forgets a guild's entries, after the bot leaves it"""
+        for entry in self._entries.pop(guild_id, ()):
+            self._used.pop(entry.id, None)
+
+    def _expire(self, guild_id: int):
+        entries = self._entries.get(guild_id)
+        cutoff = discord.utils.utcnow() - ENTRY_LIFETIME
+        while entries and entries[0].created_at < cutoff:
+            self._used.pop(entries.popleft().id, None)
+
+    @staticmethod
+    def _count(entry: discord.AuditLogEntry) -> typing.Optional[int]:
+        """How many events an entry stands for, or None if it isn't an entry Discord merges events into"""
+        return getattr(entry.extra, "count", None)
+
+    def _available(self, entry: discord.AuditLogEntry) -> bool:
+        count = self._count(entry)
+        return count is None or self._used.get(entry.id, 0) < count
+
+    def _take(self, entry: discord.AuditLogEntry):
+        if self._count(entry) is not None:
+            self._used[entry.id] = self._used.get(entry.id, 0) + 1
+
+    async def find(self, guild: discord.Guild, action: discord.AuditLogAction, target_id: int, *,
+                   since: datetime.datetime = None, check: typing.Callable[[discord.AuditLogEntry], bool] = None,
+                   timeout: float = WAIT_TIME) -> typing.Optional[discord.AuditLogEntry]:
+        """
+        Returns the newest entry of an action on a target made at or after a time, by default the last few seconds,
+        optionally passing an extra check. Returns None if there isn't one within the timeout, or at once if the bot
+        can't see the audit log.
+
+        Entries with a count, like message deletes, explain that many events. Discord merges repeated actions by the
+        same user on the same target into the existing entry, raising its count without sending a new entry. So when
+        an older buffered entry could have been merged into, the newest entries are fetched to compare their counts.
+        """
+        self._expire(guild.id)
+        since = since or discord.utils.utcnow() - MATCH_WINDOW
+
+        def targets(entry: discord.AuditLogEntry) -> bool:
+            return entry.action == action and getattr(entry.target, "id", None) == target_id and \
+                (check is None or check(entry))
+
+        def matches(entry: discord.AuditLogEntry) -> bool:
+            return targets(entry) and entry.created_at >= since and self._available(entry)
+
+        buffered = [entry for entry in reversed(self._entries.get(guild.id, ())) if targets(entry)]
+        for entry in buffered:
+            if matches(entry):
+                self._take(entry)
+                return entry
+        if not guild.me.guild_permissions.view_audit_log:
+            return None
+        if any(self._count(entry) is not None for entry in buffered):
+            return await self._find_merged(guild, action, targets, since, {entry.id for entry in buffered})
+
+        waiter = (matches, asyncio.get_running_loop().create_future())
+        waiters = self._waiters.setdefault(guild.id, [])
+        waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiters[guild.id]
+
+    async def _find_merged(self, guild: discord.Guild, action: discord.AuditLogAction,
+                           targets: typing.Callable[[discord.AuditLogEntry], bool], since: datetime.datetime,
+                           buffered_ids: typing.Set[int]) -> typing.Optional[discord.AuditLogEntry]:
+        """Fetches the newest entries of an action, returning a buffered one whose count went up or a new one"""
+        try:
+            async for entry in guild.audit_logs(limit=MERGE_LOOKUP_LIMIT, action=action):
+                if targets(entry) and (entry.id in buffered_ids or entry.created_at >= since) and self._available(entry):
+                    self._take(entry)
+                    return entry
+        except discord.HTTPException:
+            pass
+        return None
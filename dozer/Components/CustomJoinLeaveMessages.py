@@ -1,27 +1,58 @@
 """Holder for the custom join/leave messages database class and the associated methods"""
+import functools
+import re
+import typing
+
 import discord
 from loguru import logger
 
 from dozer import db
+from .EmbedQueue import EmbedQueue
 
 
-async def send_log(member):
-    """Sends the message for when a user joins or leave a guild"""
-    config = await CustomJoinLeaveMessages.get_by(guild_id=member.guild.id)
-    if len(config):
-        channel = member.guild.get_channel(config[0].channel_id)
+async def send_log(member, log_queue: EmbedQueue):
+    """Sends the message for when a user joins or leave a guild, through the bot's log queue"""
+    config = await join_leave_config.query_one(guild_id=member.guild.id)
+    if config is not None:
+        channel = member.guild.get_channel(config.channel_id)
         if channel:
             embed = discord.Embed(color=0x00FF00)
             embed.set_author(name='Member Joined', icon_url=member.display_avatar.replace(format='png', size=32))
-            embed.description = format_join_leave(config[0].join_message, member)
+            embed.description = format_join_leave(config.join_message, member)
             embed.set_footer(text=f"{member.guild.name} | {member.guild.member_count} members")
+            if not config.ping:
+                await log_queue.put(channel, embed, coalesce="join",
+                                           summary=f"{member.mention} {discord.utils.escape_markdown(str(member))}")
+                return
             try:
-                await channel.send(content=member.mention if config[0].ping else None, embed=embed)
+                await channel.send(content=member.mention, embed=embed)
             except discord.Forbidden:
                 logger.warning(
                     f"Guild {member.guild}({member.guild.id}) has invalid permissions for join/leave logs")
 
 
+PLACEHOLDERS = {
+    "{guild}": lambda member: member.guild.name,
+    "{user}": str,
+    "{user_mention}": lambda member: member.mention,
+    "{user_id}": lambda member: str(member.id),
+}
+_placeholder_pattern = re.compile("|".join(re.escape(placeholder) for placeholder in PLACEHOLDERS))
+
+
+@functools.lru_cache(maxsize=512)
+def compile_join_leave(template: str) -> typing.Tuple[typing.Tuple[str, typing.Optional[typing.Callable]], ...]:
+    """Splits a template once into a plan of literal text, each followed by the placeholder filled in after it"""
+    plan = []
+    start = 0
+    # Placeholders are matched in the template only, so substituted values can never be mistaken for placeholders
+    for match in _placeholder_pattern.finditer(template):
+        plan.append((template[start:match.start()], PLACEHOLDERS[match.group()]))
+        start = match.end()
+    plan.append((template[start:], None))
+    return tuple(plan)
+
+
 def format_join_leave(template: str, member: discord.Member):
     """Formats join leave message templates
     {guild} = guild name
@@ -30,26 +61,8 @@ def format_join_leave(template: str, member: discord.Member):
     {user_id} = user's ID
     """
     template = template or "{user_mention}\n{user} ({user_id})"
+    return "".join(text + fill(member) if fill else text for text, fill in compile_join_leave(template))
 
-    subst = [("{guild}", member.guild.name),
-             ("{user}", member),  
-             ("{user_mention}", member.mention),
-             ("{user_id}", member.id)]
-    
-    def helper(s: str, subst: list):
-        if not subst:
-            # base case: return self
-            return s
-        cur = subst[0]
-        # split the current string on cur[0]. 
-        # for each split segment call the helper on the rest of the substitutions.
-        # then rejoin on the substitutions (this avoids the substituted values from matching substitution keywords)
-
-        # we could make this not recursive but there's an O(1) number of possible recursions anyway
-        # recursion depth is limited to 5 since the subst list is limited
-        # breadth is limited by template size (indirectly limited by discord message size)
-        return str(cur[1]).join([helper(bit, subst[1:]) for bit in s.split(cur[0])])
-    return helper(template, subst)
 
 class CustomJoinLeaveMessages(db.DatabaseTable):
     """Holds custom join leave messages"""
@@ -111,3 +124,6 @@ class CustomJoinLeaveMessages(db.DatabaseTable):
                                f"add if not exists send_on_verify boolean default null;")
 
     __versions__ = [version_1, version_2]
+
+
+join_leave_config = db.ConfigCache(CustomJoinLeaveMessages)  # invalidate on every change to a guild's config
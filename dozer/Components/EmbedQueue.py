@@ -0,0 +1,155 @@
+"""Per-channel send queues for log embeds"""
+import asyncio
+import collections
+import time
+import typing
+
+import discord
+from loguru import logger
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_EMBED_CHARS = 6000
+QUEUE_SIZE = 500
+COALESCE_WINDOW = 10  # seconds
+COALESCE_AFTER = 5  # events of a kind sent individually per window before the rest are folded into a summary
+MAX_SUMMARY_LINES = 100
+
+
+class Burst:
+    """Events of one kind headed for one channel, past the point where they are sent individually"""
+
+    def __init__(self):
+        self.window_end = time.monotonic() + COALESCE_WINDOW
+        self.sent = 0  # events sent individually this window
+        self.total = 0  # events held for the next summary
+        self.lines = []  # summary lines of the first of them
+        self.last = None  # the latest held embed, which the summary takes its look from
+        self.task = None
+
+
+class EmbedQueue:
+    """
+    Queues embeds per destination channel and sends them from one drain task per channel, packing as many queued embeds
+    into each message as Discord allows. Bursts of log entries then cost a handful of messages instead of one each,
+    and the code logging them doesn't wait on the channel's rate limit.
+    When a channel's queue is full, put() waits for room, pushing back on whoever is producing the burst.
+    Events that come in floods, like joins during a raid, can be coalesced: past the first few of a kind in a short
+    window, the rest are held back and sent as one summary embed listing them when the window ends.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.queues = {}
+        self.tasks = {}
+        self.bursts = {}  # (channel_id, kind) -> Burst
+        self.sent = collections.Counter()  # channel_id -> messages sent
+        self.coalesced = collections.Counter()  # channel_id -> events folded into summaries
+
+    async def put(self, channel: discord.abc.Messageable, embed: discord.Embed, *, coalesce: str = None,
+                  summary: str = None):
+        """
+        Queues an embed to be sent to a channel. Embeds given a kind to coalesce by are folded into a summary during
+        floods of that kind, where each is listed by its summary line.
+        """
+        if coalesce is not None:
+            key = (channel.id, coalesce)
+            burst = self.bursts.get(key)
+            if burst is None or (burst.task is None and time.monotonic() >= burst.window_end):
+                burst = self.bursts[key] = Burst()
+            if burst.task is None and burst.sent < COALESCE_AFTER:
+                burst.sent += 1
+            else:
+                burst.total += 1
+                burst.last = embed
+                if len(burst.lines) < MAX_SUMMARY_LINES:
+                    burst.lines.append(summary or embed.description or "")
+                if burst.task is None:
+                    burst.task = asyncio.get_running_loop().create_task(self._summarize(channel, key, burst),
+                                                                        name=f"EmbedQueue summary {channel.id}")
+                return
+        await self._enqueue(channel, embed)
+
+    async def _summarize(self, channel: discord.abc.Messageable, key: typing.Tuple[int, str], burst: Burst):
+        """Sends a summary of a burst's held events at the end of each window, until a window passes without any"""
+        while True:
+            await asyncio.sleep(max(burst.window_end - time.monotonic(), 0))
+            if not burst.total:
+                break
+            total, lines, last = burst.total, burst.lines, burst.last
+            burst.total, burst.lines, burst.last = 0, [], None
+            burst.window_end = time.monotonic() + COALESCE_WINDOW
+            self.coalesced[channel.id] += total
+            if total == 1:
+                await self._enqueue(channel, last)
+                continue
+            embed = discord.Embed(color=last.color, timestamp=last.timestamp)
+            if last.author.name:
+                embed.set_author(name=f"{last.author.name} x{total}", icon_url=last.author.icon_url)
+            description, shown = "", 0
+            for line in lines:
+                if len(description) + len(line) > 4000:
+                    break
+                description += f"{line}\n"
+                shown += 1
+            if total > shown:
+                description += f"...and {total - shown} more"
+            embed.description = description
+            if last.footer.text:
+                embed.set_footer(text=last.footer.text, icon_url=last.footer.icon_url)
+            await self._enqueue(channel, embed)
+        del self.bursts[key]
+
+    async def _enqueue(self, channel: discord.abc.Messageable, embed: discord.Embed):
+        queue = self.queues.get(channel.id)
+        if queue is None:
+            queue = self.queues[channel.id] = asyncio.Queue(maxsize=self.queue_size)
+        if queue.full():
+            logger.warning(f"Log queue for channel {channel.id} is full, waiting for it to drain")
+        await queue.put(embed)
+        task = self.tasks.get(channel.id)
+        if task is None or task.done():
+            self.tasks[channel.id] = asyncio.get_running_loop().create_task(self._drain(channel, queue),
+                                                                            name=f"EmbedQueue {channel.id}")
+
+    def depth(self, channel_id: int = None):
+        """Returns the number of embeds waiting to be sent to a channel, or to all channels if none is given"""
+        if channel_id is not None:
+            queue = self.queues.get(channel_id)
+            return queue.qsize() if queue else 0
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    def held(self, channel_id: int = None):
+        """Returns the number of events waiting to be summarized for a channel, or for all channels if none is given"""
+        return sum(burst.total for (burst_channel_id, _), burst in self.bursts.items()
+                   if channel_id is None or burst_channel_id == channel_id)
+
+    def stats(self) -> typing.Dict[int, typing.Dict[str, int]]:
+        """Returns the queued and held events of each channel, and how many messages and summarized events it has had"""
+        channel_ids = set(self.queues) | {channel_id for channel_id, _ in self.bursts} | set(self.sent)
+        return {channel_id: {"queued": self.depth(channel_id), "held": self.held(channel_id),
+                             "sent": self.sent[channel_id], "coalesced": self.coalesced[channel_id]}
+                for channel_id in channel_ids}
+
+    async def _drain(self, channel: discord.abc.Messageable, queue: asyncio.Queue):
+        """Sends everything in a channel's queue, then exits"""
+        carry = None  # an embed that didn't fit in the last message, first in line for the next one
+        while carry is not None or not queue.empty():
+            embeds = [carry if carry is not None else queue.get_nowait()]
+            carry = None
+            size = len(embeds[0])
+            while not queue.empty() and len(embeds) < MAX_EMBEDS_PER_MESSAGE:
+                embed = queue.get_nowait()
+                if size + len(embed) > MAX_MESSAGE_EMBED_CHARS:
+                    carry = embed
+                    break
+                embeds.append(embed)
+                size += len(embed)
+            try:
+                await channel.send(embeds=embeds)
+                self.sent[channel.id] += 1
+            except discord.Forbidden as e:
+                logger.warning(f"Unable to send {len(embeds)} log embeds in guild \"{channel.guild}\" ({channel.guild.id}) "
+                               f"reason {e}")
+            except discord.HTTPException as e:
+                logger.error(f"Failed to send {len(embeds)} log embeds to {channel} ({channel.id}): {e}")
+        self.queues.pop(channel.id, None)
@@ -0,0 +1,63 @@
+"""Holder for the new member verification config database class"""
+from dozer import db
+from .CustomJoinLeaveMessages import CustomJoinLeaveMessages
+from .TeamNumbers import TeamNumbers
+
+
+class GuildNewMember(db.DatabaseTable):
+    """Holds new member info"""
+    __tablename__ = 'new_members'
+    __uniques__ = 'guild_id'
+
+    @classmethod
+    async def initial_create(cls):
+        """Create the table in the database"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            CREATE TABLE {cls.__tablename__} (
+            guild_id bigint PRIMARY KEY,
+            channel_id bigint NOT NULL,
+            role_id bigint NOT NULL,
+            message varchar NOT NULL
+            )""")
+
+    def __init__(self, guild_id: int, channel_id: int, role_id: int, message: str, require_team: bool):
+        super().__init__()
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.role_id = role_id
+        self.message = message
+        self.require_team = require_team
+
+    @classmethod
+    async def get_by(cls, **kwargs):
+        results = await super().get_by(**kwargs)
+        result_list = []
+        for result in results:
+            obj = GuildNewMember(guild_id=result.get("guild_id"), channel_id=result.get("channel_id"),
+                                 role_id=result.get("role_id"), message=result.get("message"),
+                                 require_team=result.get("require_team"))
+            result_list.append(obj)
+        return result_list
+
+    async def version_1(self):
+        """DB migration v1"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            ALTER TABLE {self.__tablename__} ADD require_team bool NOT NULL DEFAULT false;
+            """)
+
+    __versions__ = [version_1]
+
+    # noinspection SqlResolve
+    @classmethod
+    async def verification_state(cls, guild_id: int, user_id: int):
+        """Looks up everything a verification needs in one query: whether the user has a team number set, and whether
+        the guild's join log is sent on verification (None if the guild has no member log configured)"""
+        query = f"""SELECT EXISTS(SELECT 1 FROM {TeamNumbers.__tablename__} WHERE user_id = $1) AS has_team,
+                (SELECT send_on_verify FROM {CustomJoinLeaveMessages.__tablename__} WHERE guild_id = $2) AS send_on_verify"""
+        async with db.Pool.acquire() as conn:
+            return await conn.fetchrow(query, user_id, guild_id)
+
+
+new_member_config = db.ConfigCache(GuildNewMember)  # invalidate on every change to a guild's config
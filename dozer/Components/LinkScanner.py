@@ -0,0 +1,62 @@
+"""Finds links in messages and decides whether their domains are allowed"""
+import re
+import typing
+
+# The host part of every http(s) link, skipping any user info. Stops at the port, path, query, fragment, or the closing
+# bracket of a <link> that has its embed suppressed.
+URL_HOST_REGEX = re.compile(r"https?://(?:[^\s/?#@<>]*@)?([^\s/?#:<>]+)", re.IGNORECASE)
+DECISION_CACHE_SIZE = 4096
+
+ALLOWED = True
+DENIED = False
+
+
+def scan_hosts(content: str) -> typing.Set[str]:
+    """Returns the normalized host of every link in a message"""
+    if "://" not in content:
+        return set()
+    return {normalize_domain(host) for host in URL_HOST_REGEX.findall(content)}
+
+
+def normalize_domain(domain: str) -> str:
+    """Lowercases a domain and strips what people tend to type around one, so that `*.Example.com.` matches example.com"""
+    domain = domain.strip().lower()
+    domain = URL_HOST_REGEX.sub(r"\1", domain)  # a full link was given, keep only its host
+    domain = domain.split('/', 1)[0]
+    return domain.lstrip('*.').rstrip('.')
+
+
+class DomainPolicy:
+    """
+    A guild's domain allow and deny lists. A listed domain covers all of its subdomains, and the most specific listed
+    domain decides: denying example.com and allowing cdn.example.com allows cdn.example.com and nothing else under
+    example.com. Looking up a host costs one set lookup per label, and the outcome is cached per host.
+    """
+
+    def __init__(self, allowed: typing.Iterable[str] = (), denied: typing.Iterable[str] = ()):
+        self.rules = {}
+        for domain in allowed:
+            self.rules[domain] = ALLOWED
+        for domain in denied:
+            self.rules[domain] = DENIED
+        self._decisions = {}
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def decide(self, host: str) -> typing.Optional[bool]:
+        """Returns ALLOWED or DENIED if a listed domain covers the host, or None if none does"""
+        try:
+            return self._decisions[host]
+        except KeyError:
+            pass
+        decision = None
+        labels = host.split('.')
+        for i in range(len(labels)):
+            decision = self.rules.get('.'.join(labels[i:]))
+            if decision is not None:
+                break
+        if len(self._decisions) >= DECISION_CACHE_SIZE:
+            self._decisions.clear()
+        self._decisions[host] = decision
+        return decision
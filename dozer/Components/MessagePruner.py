@@ -0,0 +1,69 @@
+"""Deletes ranges of channel history, reading the next page while the previous one is being deleted"""
+import asyncio
+import datetime
+import typing
+
+import discord
+
+BULK_DELETE_LIMIT = 100
+# Discord refuses to bulk delete messages older than 14 days. The margin covers the time a long prune takes to run.
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(minutes=10)
+QUEUED_BATCHES = 4
+
+
+async def prune_messages(channel: discord.abc.Messageable, *, limit: int, after=None, before=None,
+                         check: typing.Callable[[discord.Message], bool] = None, progress=None) -> int:
+    """
+    Deletes every message matching the check out of the last `limit` messages of a channel (or the first `limit` after
+    `after`), returning the number of messages deleted.
+    One task streams the channel history and groups the matching messages into batches: up to 100 messages that are
+    young enough to be bulk deleted, or a single older message, which can only be deleted on its own. The caller's task
+    deletes the batches as they come, so reading history and deleting overlap instead of alternating.
+    progress: optional callable, called with (deleted, checked) after each batch is deleted
+    """
+    queue = asyncio.Queue(maxsize=QUEUED_BATCHES)
+    checked = 0
+    error = None
+    bulk_cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - BULK_DELETE_MAX_AGE)
+
+    async def produce():
+        nonlocal checked, error
+        batch = []
+        try:
+            async for message in channel.history(limit=limit, after=after, before=before):
+                checked += 1
+                if check is not None and not check(message):
+                    continue
+                if message.id < bulk_cutoff:
+                    await queue.put([message])
+                    continue
+                batch.append(message)
+                if len(batch) == BULK_DELETE_LIMIT:
+                    await queue.put(batch)
+                    batch = []
+            if batch:
+                await queue.put(batch)
+        except Exception as e:
+            error = e  # Handed to the caller once it has deleted what was already queued
+        await queue.put(None)
+
+    producer = asyncio.get_running_loop().create_task(produce(), name=f"Prune history of {channel}")
+    deleted = 0
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                break
+            try:
+                # A single message goes through the single delete endpoint, which is the only one old messages allow
+                await channel.delete_messages(batch)
+            except discord.NotFound:
+                pass  # Already deleted by someone else
+            deleted += len(batch)
+            if progress is not None:
+                progress(deleted, checked)
+    finally:
+        producer.cancel()
+    if error is not None:
+        raise error
+    return deleted
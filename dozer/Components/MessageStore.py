@@ -0,0 +1,169 @@
+"""Keeps the content of recent messages in the database, so edits and deletes can be logged after the client forgets them"""
+import asyncio
+import datetime
+import typing
+
+import discord
+from loguru import logger
+
+from .. import db
+
+RETENTION_DAYS = 14
+MAX_PENDING = 5000  # writes are flushed early once this many are waiting
+
+
+class StoredMessage(db.DatabaseTable):
+    """A message as it was last seen, in a guild that opted in to having message content stored"""
+    __tablename__ = 'stored_messages'
+    __uniques__ = 'message_id'
+
+    @classmethod
+    async def initial_create(cls):
+        """Create the table in the database"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            CREATE TABLE {cls.__tablename__} (
+            message_id bigint PRIMARY KEY NOT NULL,
+            guild_id bigint NOT NULL,
+            channel_id bigint NOT NULL,
+            author_id bigint NOT NULL,
+            author_name varchar NOT NULL,
+            content varchar NOT NULL,
+            attachments varchar[] NOT NULL
+            )""")
+
+    def __init__(self, message_id: int, guild_id: int, channel_id: int, author_id: int, author_name: str, content: str,
+                 attachments: typing.List[str]):
+        super().__init__()
+        self.message_id = message_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.author_name = author_name
+        self.content = content
+        self.attachments = attachments
+
+    @classmethod
+    async def get_by(cls, **kwargs):
+        results = await super().get_by(**kwargs)
+        result_list = []
+        for result in results:
+            obj = StoredMessage(message_id=result.get("message_id"), guild_id=result.get("guild_id"),
+                                channel_id=result.get("channel_id"), author_id=result.get("author_id"),
+                                author_name=result.get("author_name"), content=result.get("content"),
+                                attachments=result.get("attachments"))
+            result_list.append(obj)
+        return result_list
+
+    @classmethod
+    def from_message(cls, message: discord.Message):
+        """Makes a row out of a message"""
+        return cls(message_id=message.id, guild_id=message.guild.id, channel_id=message.channel.id,
+                   author_id=message.author.id, author_name=str(message.author), content=message.content,
+                   attachments=[attachment.proxy_url for attachment in message.attachments])
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        """When the message was sent"""
+        return discord.utils.snowflake_time(self.message_id)
+
+
+class MessageStore:
+    """
+    Stores the messages of opted-in guilds, buffering writes in memory until they are flushed in one batch.
+    Messages are keyed by id, which is the primary key, so looking one up is a single index lookup. Message ids are
+    snowflakes and grow with time, so old messages are purged with a range delete on that same key.
+    Lookups see the buffered writes, so a message that is edited or deleted before the next flush is still found.
+    A flush that fails keeps its writes buffered, so they are retried by the next one.
+    """
+
+    def __init__(self):
+        self._pending = {}  # message_id -> StoredMessage waiting to be written
+        self._deleted = set()  # message ids waiting to be deleted
+        self._flushing = {}  # message_id -> StoredMessage being written right now
+        self._flush_lock = asyncio.Lock()  # flushes run one at a time, so an older write never lands after a newer one
+
+    def __len__(self):
+        return len(self._pending) + len(self._deleted)
+
+    @property
+    def full(self) -> bool:
+        """Whether enough writes are waiting that they should be flushed now"""
+        return len(self) >= MAX_PENDING
+
+    def record(self, message: discord.Message):
+        """Stores a message, or its new content after an edit"""
+        self._deleted.discard(message.id)
+        self._pending[message.id] = StoredMessage.from_message(message)
+
+    def record_edit(self, stored: StoredMessage, content: str):
+        """Updates the content of a message known only from the store"""
+        stored.content = content
+        self._pending[stored.message_id] = stored
+
+    def forget(self, message_ids: typing.Iterable[int]):
+        """Stops storing deleted messages"""
+        for message_id in message_ids:
+            self._pending.pop(message_id, None)
+            self._deleted.add(message_id)
+
+    def discard_guild(self, guild_id: int):
+        """Drops the buffered writes of a guild that opted out"""
+        self._pending = {message_id: row for message_id, row in self._pending.items() if row.guild_id != guild_id}
+
+    async def get(self, message_id: int) -> typing.Optional[StoredMessage]:
+        """Returns a stored message by id, or None if it isn't stored"""
+        if message_id in self._pending:
+            return self._pending[message_id]
+        if message_id in self._deleted:
+            return None
+        if message_id in self._flushing:
+            return self._flushing[message_id]
+        results = await StoredMessage.get_by(message_id=message_id)
+        return results[0] if results else None
+
+    async def flush(self):
+        """Writes every buffered change to the database at once"""
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        deleted, self._deleted = self._deleted, set()
+        if not pending and not deleted:
+            return
+        self._flushing = pending
+        try:
+            async with db.Pool.acquire() as conn:
+                async with conn.transaction():
+                    if deleted:
+                        await conn.execute(f"DELETE FROM {StoredMessage.__tablename__} WHERE message_id = ANY($1::bigint[])",
+                                           list(deleted))
+                    if pending:
+                        await conn.executemany(
+                            f"INSERT INTO {StoredMessage.__tablename__} (message_id, guild_id, channel_id, author_id, author_name, "
+                            f"content, attachments) VALUES ($1, $2, $3, $4, $5, $6, $7) ON CONFLICT ({StoredMessage.__uniques__}) "
+                            f"DO UPDATE SET content = EXCLUDED.content, attachments = EXCLUDED.attachments",
+                            [(row.message_id, row.guild_id, row.channel_id, row.author_id, row.author_name, row.content,
+                              row.attachments) for row in pending.values()])
+            logger.debug(f"Stored {len(pending)} message(s); Deleted {len(deleted)} stored message(s)")
+        except Exception as e:
+            logger.error(f"Failed to flush the message store to db, retrying on the next flush, Reason:{e}")
+            # Put the writes back for the next flush, unless the message changed again in the meantime
+            for message_id, row in pending.items():
+                if message_id not in self._pending and message_id not in self._deleted:
+                    self._pending[message_id] = row
+            self._deleted.update(message_id for message_id in deleted if message_id not in self._pending)
+        finally:
+            self._flushing = {}
+
+    @staticmethod
+    async def purge(guild_ids: typing.Iterable[int] = None):
+        """Deletes the messages older than the retention period, and every message of the given guilds"""
+        cutoff = discord.utils.time_snowflake(datetime.datetime.now(tz=datetime.timezone.utc) -
+                                              datetime.timedelta(days=RETENTION_DAYS))
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"DELETE FROM {StoredMessage.__tablename__} WHERE message_id < $1", cutoff)
+            if guild_ids:
+                await conn.execute(f"DELETE FROM {StoredMessage.__tablename__} WHERE guild_id = ANY($1::bigint[])",
+                                   list(guild_ids))
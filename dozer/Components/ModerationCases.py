@@ -0,0 +1,131 @@
+"""Holder for the moderation case log database class"""
+import datetime
+import typing
+
+from dozer import db
+
+# Actions that start a punishment lasting until it is lifted, and which earlier punishment each action ends
+ACTIVE_ACTIONS = frozenset(("muted", "deafened"))
+CLOSES = {"muted": "muted", "unmuted": "muted", "deafened": "deafened", "undeafened": "deafened"}
+
+
+class ModerationCase(db.DatabaseTable):
+    """
+    One row per moderation action, appended as actions are logged. Mutes and deafens stay active until they are lifted
+    or replaced, so the active punishments of a guild and the history of a member are both answered by an index.
+    Listings use keyset pagination: a page is fetched by the position of the last row of the previous page, never by
+    counting past the rows before it.
+    """
+    __tablename__ = 'moderation_cases'
+    __uniques__ = 'case_id'
+
+    @classmethod
+    async def initial_create(cls):
+        """Create the table in the database, carrying over the punishments still running from the timer table"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            CREATE TABLE {cls.__tablename__} (
+            case_id bigserial PRIMARY KEY NOT NULL,
+            guild_id bigint NOT NULL,
+            actor_id bigint NOT NULL,
+            target_id bigint NOT NULL,
+            action varchar NOT NULL,
+            reason varchar null,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            expires_at timestamptz null,
+            active boolean NOT NULL DEFAULT false
+            );
+            CREATE INDEX {cls.__tablename__}_target ON {cls.__tablename__} (guild_id, target_id, created_at);
+            CREATE INDEX {cls.__tablename__}_active ON {cls.__tablename__} (guild_id, active, case_id);
+            """)
+            if await conn.fetchval("SELECT to_regclass('punishment_timers')") is not None:
+                await conn.execute(f"""
+                INSERT INTO {cls.__tablename__} (guild_id, actor_id, target_id, action, reason, expires_at, active)
+                SELECT guild_id, actor_id, target_id, CASE type_of_punishment WHEN 1 THEN 'muted' ELSE 'deafened' END,
+                       reason, to_timestamp(target_ts), true
+                FROM punishment_timers ORDER BY id""")
+
+    def __init__(self, guild_id: int, actor_id: int, target_id: int, action: str, reason: str = None,
+                 created_at: datetime.datetime = None, expires_at: datetime.datetime = None, active: bool = False,
+                 case_id: int = None):
+        super().__init__()
+        self.case_id = case_id
+        self.guild_id = guild_id
+        self.actor_id = actor_id
+        self.target_id = target_id
+        self.action = action
+        self.reason = reason
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.active = active
+
+    @property
+    def self_inflicted(self):
+        """Whether the member did this to themselves, like a self deafen"""
+        return self.actor_id == self.target_id
+
+    @classmethod
+    def _from_record(cls, record):
+        return cls(guild_id=record.get("guild_id"), actor_id=record.get("actor_id"), target_id=record.get("target_id"),
+                   action=record.get("action"), reason=record.get("reason"), created_at=record.get("created_at"),
+                   expires_at=record.get("expires_at"), active=record.get("active"), case_id=record.get("case_id"))
+
+    @classmethod
+    async def get_by(cls, **kwargs):
+        results = await super().get_by(**kwargs)
+        return [cls._from_record(result) for result in results]
+
+    @classmethod
+    async def record(cls, guild_id: int, actor_id: int, target_id: int, action: str, reason: str = None,
+                     expires_at: datetime.datetime = None):
+        """Appends a case, ending whichever still active punishment of the target it lifts or replaces. Returns the case."""
+        async with db.Pool.acquire() as conn:
+            async with conn.transaction():
+                if action in CLOSES:
+                    await conn.execute(f"""UPDATE {cls.__tablename__} SET active = false
+                        WHERE guild_id = $1 AND target_id = $2 AND active AND action = $3""", guild_id, target_id, CLOSES[action])
+                record = await conn.fetchrow(f"""
+                    INSERT INTO {cls.__tablename__} (guild_id, actor_id, target_id, action, reason, expires_at, active)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING *""",
+                                             guild_id, actor_id, target_id, action, reason, expires_at, action in ACTIVE_ACTIONS)
+        return cls._from_record(record)
+
+    @classmethod
+    async def record_many(cls, guild_id: int, actor_id: int, target_ids: typing.Iterable[int], action: str, reason: str = None):
+        """Appends the same case for many targets in one statement, for bulk actions like raid cleanups"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+                INSERT INTO {cls.__tablename__} (guild_id, actor_id, target_id, action, reason, active)
+                SELECT $1::bigint, $2::bigint, target_id, $4::varchar, $5::varchar, $6::boolean FROM unnest($3::bigint[]) AS target_id""",
+                               guild_id, actor_id, list(target_ids), action, reason, action in ACTIVE_ACTIONS)
+
+    @classmethod
+    async def active_page(cls, guild_id: int, after_case_id: int = 0, limit: int = 10):
+        """Returns up to `limit` punishments still running in a guild, oldest first, starting after the given case"""
+        async with db.Pool.acquire() as conn:
+            records = await conn.fetch(f"""SELECT * FROM {cls.__tablename__}
+                WHERE guild_id = $1 AND active AND case_id > $2 AND (expires_at IS NULL OR expires_at > now())
+                ORDER BY case_id LIMIT $3""", guild_id, after_case_id, limit)
+        return [cls._from_record(record) for record in records]
+
+    @classmethod
+    async def active_counts(cls, guild_id: int):
+        """Returns the number of punishments still running in a guild, keyed by (action, self inflicted)"""
+        async with db.Pool.acquire() as conn:
+            records = await conn.fetch(f"""SELECT action, actor_id = target_id AS self_inflicted, count(*) FROM {cls.__tablename__}
+                WHERE guild_id = $1 AND active AND (expires_at IS NULL OR expires_at > now())
+                GROUP BY action, self_inflicted""", guild_id)
+        return {(record["action"], record["self_inflicted"]): record["count"] for record in records}
+
+    @classmethod
+    async def history_page(cls, guild_id: int, target_id: int, before: "ModerationCase" = None, limit: int = 10):
+        """Returns up to `limit` cases of a member, newest first, starting before the given case"""
+        async with db.Pool.acquire() as conn:
+            if before is None:
+                records = await conn.fetch(f"""SELECT * FROM {cls.__tablename__} WHERE guild_id = $1 AND target_id = $2
+                    ORDER BY created_at DESC, case_id DESC LIMIT $3""", guild_id, target_id, limit)
+            else:
+                records = await conn.fetch(f"""SELECT * FROM {cls.__tablename__} WHERE guild_id = $1 AND target_id = $2
+                    AND (created_at, case_id) < ($3, $4)
+                    ORDER BY created_at DESC, case_id DESC LIMIT $5""", guild_id, target_id, before.created_at, before.case_id, limit)
+        return [cls._from_record(record) for record in records]
@@ -0,0 +1,82 @@
+"""Tracks when each not yet verified member joined, so the new member purge only looks at members who are due"""
+import heapq
+import time
+import typing
+
+import discord
+
+
+class NewMemberIndex:
+    """
+    A per-guild index of unverified members ordered by join time.
+    Each guild has a dict of member id -> join timestamp, which is the source of truth, and a min-heap of
+    (join timestamp, member id) used to find the members who joined before a cutoff. Removing a member only touches the
+    dict; heap entries that no longer match it are skipped when popped.
+    """
+
+    def __init__(self):
+        self._joined = {}
+        self._heaps = {}
+
+    def __contains__(self, guild_id: int):
+        return guild_id in self._joined
+
+    def count(self, guild_id: int):
+        """Returns the number of unverified members indexed for a guild"""
+        return len(self._joined.get(guild_id, ()))
+
+    def rebuild(self, guild: discord.Guild, member_role_id: int):
+        """Indexes every member of a guild that doesn't have the member role, replacing whatever was indexed before"""
+        joined = {member.id: self._join_ts(member) for member in guild.members
+                  if not member.bot and member.get_role(member_role_id) is None}
+        heap = [(ts, member_id) for member_id, ts in joined.items()]
+        heapq.heapify(heap)
+        self._joined[guild.id] = joined
+        self._heaps[guild.id] = heap
+
+    def clear(self, guild_id: int):
+        """Stops tracking a guild"""
+        self._joined.pop(guild_id, None)
+        self._heaps.pop(guild_id, None)
+
+    def add(self, member: discord.Member):
+        """Indexes an unverified member. Does nothing for guilds that aren't being tracked."""
+        joined = self._joined.get(member.guild.id)
+        if joined is None or member.bot:
+            return
+        ts = self._join_ts(member)
+        joined[member.id] = ts
+        heapq.heappush(self._heaps[member.guild.id], (ts, member.id))
+
+    def discard(self, guild_id: int, member_id: int):
+        """Removes a member from the index, e.g. once they are verified or have left"""
+        joined = self._joined.get(guild_id)
+        if joined is None or joined.pop(member_id, None) is None:
+            return
+        heap = self._heaps[guild_id]
+        # Rebuild the heap once it is mostly stale entries, so it can't grow without bound
+        if len(heap) > 2 * len(joined) + 64:
+            heap[:] = [(ts, member_id) for member_id, ts in joined.items()]
+            heapq.heapify(heap)
+
+    def pop_expired(self, guild_id: int, cutoff: float) -> typing.List[int]:
+        """
+        Removes and returns the ids of every indexed member of a guild who joined at or before the cutoff timestamp.
+        Members that then aren't removed from the guild, e.g. because kicking them failed, should be added back.
+        """
+        joined = self._joined.get(guild_id)
+        if joined is None:
+            return []
+        heap = self._heaps[guild_id]
+        expired = []
+        while heap and heap[0][0] <= cutoff:
+            ts, member_id = heapq.heappop(heap)
+            if joined.get(member_id) == ts:
+                del joined[member_id]
+                expired.append(member_id)
+        return expired
+
+    @staticmethod
+    def _join_ts(member: discord.Member):
+        """The member's join timestamp. joined_at can be missing for members received in some events."""
+        return member.joined_at.timestamp() if member.joined_at is not None else time.time()
@@ -0,0 +1,128 @@
+"""Applies per-member permission overwrites across every channel of a guild"""
+import asyncio
+
+import discord
+from loguru import logger
+
+from .RateLimiter import RateLimiter, run_bounded
+
+# Overwrite edits are bucketed per channel, so many channels can be edited at once; the global limit is what binds
+OVERWRITE_CONCURRENCY = 8
+OVERWRITE_RATE = 40  # requests per second, under the global limit of 50
+PROGRESS_LOG_INTERVAL = 50
+UNKNOWN = object()  # an edit was cancelled mid-request, so whether it landed is unknown
+
+
+class OverwriteEngine:
+    """
+    Applies a member's permission overwrites to every channel of their guild from the cached guild state.
+    Channels that already have the requested overwrite are skipped, the rest are edited a bounded number at a time.
+    The channel cache only learns of an edit when its channel update event arrives, so the engine remembers each
+    overwrite it set until that event comes in (see channel_updated), and diffs against that instead of the cache.
+    There is only ever one job per member: starting a new one (e.g. an unmute while the mute is still being applied)
+    cancels the old one, and the new job diffs against what the old one had already changed.
+    """
+
+    def __init__(self, bot, concurrency: int = OVERWRITE_CONCURRENCY, limiter: RateLimiter = None):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.limiter = limiter or RateLimiter(OVERWRITE_RATE)
+        self.jobs = {}
+        self.applied = {}  # channel_id -> {member_id: (allow, deny) set by the engine, whose update event is pending}
+
+    def channel_updated(self, channel: discord.abc.GuildChannel):
+        """Forgets the overwrites set in a channel once its update event arrives, as the cache now has them"""
+        self.applied.pop(channel.id, None)
+
+    def cancel(self, member: discord.Member):
+        """Cancels the job running for a member, if there is one. Returns whether a job was cancelled."""
+        task = self.jobs.pop((member.guild.id, member.id), None)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def apply(self, member: discord.Member, progress=None, **overwrites):
+        """
+        Applies the overwrites to the member in every channel the bot can manage.
+        progress: optional callable, called with (done, total) as channels are edited
+        Returns the number of channels edited, or None if the job was cancelled by a newer one.
+        """
+        key = (member.guild.id, member.id)
+        self.cancel(member)
+        task = asyncio.get_running_loop().create_task(self._run(member, overwrites, progress),
+                                                      name=f"Overwrites for {member} ({member.id})")
+        self.jobs[key] = task
+        try:
+            await asyncio.wait((task,))
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if self.jobs.get(key) is task:
+                del self.jobs[key]
+        if task.cancelled():
+            logger.debug(f"Overwrites for {member} ({member.id}) superseded before finishing")
+            return None
+        return task.result()
+
+    async def _run(self, member: discord.Member, overwrites: dict, progress):
+        """Works out which channels need editing and edits them"""
+        guild = member.guild
+        # guild.me can be missing right after joining a guild
+        me = guild.me or await guild.fetch_member(self.bot.user.id)
+        logger.debug(f"Applying overrides to {member} ({member.id})")
+
+        targets = []
+        for channel in guild.channels:
+            if not channel.permissions_for(me).manage_roles:
+                logger.warning(f"Missing permissions to manage roles in {channel} ({channel.id})")
+                continue
+            overwrite = channel.overwrites_for(member)
+            applied = self.applied.get(channel.id, {}).get(member.id)
+            if applied is UNKNOWN:
+                overwrite.update(**overwrites)
+                targets.append((channel, overwrite))
+                continue
+            if applied is not None:
+                overwrite = discord.PermissionOverwrite.from_pair(*applied)
+            before = overwrite.pair()
+            overwrite.update(**overwrites)
+            if overwrite.pair() != before:
+                targets.append((channel, overwrite))
+
+        async def edit(target):
+            channel, overwrite = target
+            try:
+                await channel.set_permissions(target=member, overwrite=None if overwrite.is_empty() else overwrite)
+            except asyncio.CancelledError:
+                self.applied.setdefault(channel.id, {})[member.id] = UNKNOWN
+                raise
+            # The update event can beat the response, in which case the cache already has the edit
+            if channel.overwrites_for(member).pair() != overwrite.pair():
+                self.applied.setdefault(channel.id, {})[member.id] = overwrite.pair()
+            else:
+                self.applied.get(channel.id, {}).pop(member.id, None)
+
+        def report(done, total):
+            if done % PROGRESS_LOG_INTERVAL == 0:
+                logger.debug(f"Applied {done}/{total} overrides to {member} ({member.id})")
+            if progress is not None:
+                progress(done, total)
+
+        results = await run_bounded(targets, edit, concurrency=self.concurrency, limiter=self.limiter, progress=report)
+
+        overwrite_count = 0
+        for (channel, _), result in zip(targets, results):
+            if isinstance(result, discord.Forbidden):
+                logger.error(f"Failed to catch missing perms in {channel} ({channel.id}) Guild: {guild.id}; Error: {result}")
+            elif isinstance(result, discord.HTTPException):
+                logger.error(f"Failed to catch discords horrid permissions system in "
+                             f"{channel} ({channel.id}) Guild: {guild.id}; Error: {result}")
+            elif isinstance(result, Exception):
+                logger.error(f"Failed to catch some unknown or unexpected error: {result}")
+            else:
+                overwrite_count += 1
+        logger.debug(f"Applied {overwrite_count}/({len(targets)}) overrides to {member} ({member.id}), "
+                     f"{len(guild.channels) - len(targets)} channels already up to date or unmanageable")
+        return overwrite_count
@@ -0,0 +1,82 @@
+"""Selects the members caught by a raid cleanup and renders the record of what was done to them"""
+import csv
+import datetime
+import io
+import re
+import typing
+
+import discord
+
+CSV_FIELDS = ("user_id", "username", "display_name", "joined_at", "created_at", "result")
+
+
+class RaidCriteria(typing.NamedTuple):
+    """
+    What a raid cleanup selects members by. Every criterion that is set has to match.
+    joined_within: members who joined at most this long ago
+    account_age: members whose account is at most this old
+    name_pattern: members whose username, global name or nickname matches this pattern
+    """
+    joined_within: typing.Optional[datetime.timedelta] = None
+    account_age: typing.Optional[datetime.timedelta] = None
+    name_pattern: typing.Optional[typing.Pattern] = None
+
+    def is_empty(self):
+        """Whether no criterion is set, which would select every member"""
+        return self.joined_within is None and self.account_age is None and self.name_pattern is None
+
+    def describe(self):
+        """A human readable summary of the criteria"""
+        parts = []
+        if self.joined_within is not None:
+            parts.append(f"Joined in the last {self.joined_within}")
+        if self.account_age is not None:
+            parts.append(f"Account younger than {self.account_age}")
+        if self.name_pattern is not None:
+            parts.append(f"Name matches `{self.name_pattern.pattern}`")
+        return '\n'.join(parts) or "None"
+
+
+def compile_name_pattern(pattern: str):
+    """Compiles a name pattern the way select_members expects it, raising re.error if it is invalid"""
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def select_members(members: typing.Iterable[discord.Member], criteria: RaidCriteria, *, now: datetime.datetime = None,
+                   exclude: typing.Callable[[discord.Member], bool] = None) -> typing.List[discord.Member]:
+    """
+    Picks the members matching the criteria out of a member list, oldest join first. Bots are never selected, and
+    neither is any member the exclude predicate returns True for.
+    This only reads the attributes it is given, so it works as well on a stubbed guild's members as on the member cache.
+    """
+    if criteria.is_empty():
+        return []
+    now = now or discord.utils.utcnow()
+    selected = []
+    for member in members:
+        if member.bot:
+            continue
+        if criteria.joined_within is not None and (member.joined_at is None or now - member.joined_at > criteria.joined_within):
+            continue
+        if criteria.account_age is not None and now - member.created_at > criteria.account_age:
+            continue
+        if criteria.name_pattern is not None and not any(
+                criteria.name_pattern.search(name) for name in (member.name, member.global_name, member.nick) if name):
+            continue
+        if exclude is not None and exclude(member):
+            continue
+        selected.append(member)
+    selected.sort(key=lambda m: m.joined_at or now)
+    return selected
+
+
+def members_csv(rows: typing.Iterable[typing.Tuple[discord.Member, str]]) -> bytes:
+    """Renders (member, result) pairs as a CSV file, one line per member"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for member, result in rows:
+        writer.writerow((member.id, str(member), member.display_name,
+                         member.joined_at.isoformat() if member.joined_at else "",
+                         member.created_at.isoformat(), result))
+    return buffer.getvalue().encode()
@@ -0,0 +1,54 @@
+"""Helpers for spreading bursts of API calls out so they stay within Discord's rate limits"""
+import asyncio
+
+
+class RateLimiter:
+    """Spaces calls out to at most `rate` calls every `per` seconds.
+    Share one instance between everything that draws from the same rate limit bucket."""
+
+    def __init__(self, rate: int, per: float = 1.0):
+        self.interval = per / rate
+        self._next = 0.0
+
+    async def wait(self):
+        """Waits until the next call is allowed"""
+        now = asyncio.get_running_loop().time()
+        delay = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def run_bounded(items, func, *, concurrency: int, limiter: RateLimiter = None, progress=None):
+    """
+    Calls `await func(item)` for every item, with at most `concurrency` calls in flight and, if a limiter is given,
+    paced by it. Returns the results in the same order as the items. Exceptions raised by func are returned in place of
+    a result instead of being raised, so one failure doesn't abort the rest.
+    progress: optional callable, called with (done, total) after each item finishes
+    Cancelling the caller cancels every call still in flight.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    pending = iter(enumerate(items))
+    done = 0
+
+    async def worker():
+        nonlocal done
+        for index, item in pending:
+            if limiter is not None:
+                await limiter.wait()
+            try:
+                results[index] = await func(item)
+            except Exception as e:
+                results[index] = e
+            done += 1
+            if progress is not None:
+                progress(done, len(items))
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(items)))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+    return results
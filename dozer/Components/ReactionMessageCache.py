@@ -0,0 +1,95 @@
+"""Finds the message a raw reaction event is about, and keeps count of its reactions, without refetching it every time"""
+import collections
+import typing
+
+import discord
+
+CACHE_SIZE = 512
+
+
+class MessageReactions:
+    """
+    A message and its reactions, counted by the cache from the reaction events it sees after looking the message up.
+    The message itself is left as it was when looked up.
+    """
+
+    def __init__(self, message: discord.Message):
+        self.message = message
+        self.counts = collections.Counter({str(reaction): reaction.count for reaction in message.reactions})
+        self.mine = {str(reaction) for reaction in message.reactions if reaction.me}
+        self._seen = {}  # emoji -> {user_id: whether that user's reaction is on the message}, from events since lookup
+
+    def count(self, emoji: str) -> int:
+        """Returns the number of reactions of an emoji on the message"""
+        return self.counts[emoji]
+
+    def me(self, emoji: str) -> bool:
+        """Returns whether the bot reacted with an emoji"""
+        return emoji in self.mine
+
+    def apply(self, payload: discord.RawReactionActionEvent, bot_id: int, counted: bool = False):
+        """Counts a reaction event. Events the lookup already counted still record who reacted."""
+        emoji = str(payload.emoji)
+        added = payload.event_type == "REACTION_ADD"
+        self._seen.setdefault(emoji, {})[payload.user_id] = added
+        if payload.user_id == bot_id:
+            if added:
+                self.mine.add(emoji)
+            else:
+                self.mine.discard(emoji)
+        if not counted:
+            self.counts[emoji] = max(self.counts[emoji] + (1 if added else -1), 0)
+
+    async def reacted(self, emoji: str, user_id: int) -> bool:
+        """Returns whether a user reacted with an emoji, only listing the reaction's users if no event has said"""
+        seen = self._seen.get(emoji, {})
+        if user_id in seen:
+            return seen[user_id]
+        for reaction in self.message.reactions:
+            if str(reaction) == emoji:
+                return any([user.id == user_id async for user in reaction.users()])
+        return False
+
+
+class ReactionMessageCache:
+    """
+    Messages looked up for reaction events, by id, least recently used first.
+    A message is looked for in the client's message cache once, the first time it is reacted to, and fetched if it
+    isn't there. Either way its reactions already include that first event. From then on the cache counts each reaction
+    event itself, so repeated reactions on a message neither rescan the client's cache nor fetch it again.
+    """
+
+    def __init__(self, bot: discord.Client, size: int = CACHE_SIZE):
+        self.bot = bot
+        self.size = size
+        self._messages = collections.OrderedDict()  # message_id -> MessageReactions
+
+    async def get(self, payload: discord.RawReactionActionEvent) -> typing.Optional[MessageReactions]:
+        """Returns the message of a reaction event with the event's reaction counted, or None if it can't be found"""
+        reactions = self._messages.get(payload.message_id)
+        if reactions is not None:
+            self._messages.move_to_end(payload.message_id)
+            reactions.apply(payload, self.bot.user.id)
+            return reactions
+
+        message = discord.utils.get(self.bot.cached_messages, id=payload.message_id)
+        if message is None:
+            channel = self.bot.get_channel(payload.channel_id)
+            if channel is None:
+                return None
+            try:
+                message = await channel.fetch_message(payload.message_id)
+            except (discord.NotFound, discord.Forbidden):
+                return None
+            # Another event for the message may have filled the entry while it was being fetched
+            if payload.message_id in self._messages:
+                return await self.get(payload)
+        reactions = self._messages[message.id] = MessageReactions(message)
+        reactions.apply(payload, self.bot.user.id, counted=True)
+        while len(self._messages) > self.size:
+            self._messages.popitem(last=False)
+        return reactions
+
+    def discard(self, message_id: int):
+        """Forgets a message, after it was deleted or its reactions were cleared"""
+        self._messages.pop(message_id, None)
@@ -0,0 +1,67 @@
+"""In-memory index of the messages that give out roles through reactions"""
+import typing
+
+
+class ReactionRoleIndex:
+    """
+    Every role menu and reaction role message the bot tracks, mirroring the role_menus and reaction_roles tables.
+    Nearly every reaction the bot sees is on some other message, and the index turns those away with one dict lookup
+    instead of a database query.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._messages = {}  # message_id -> {role_id: reaction}
+        self._roles = {}  # (message_id, reaction) -> role_id
+
+    def __contains__(self, message_id: int):
+        return message_id in self._messages
+
+    def load(self, menus: typing.Iterable, entries: typing.Iterable):
+        """Replaces the index with the given RoleMenu and ReactionRole rows"""
+        self._messages = {menu.message_id: {} for menu in menus}
+        self._roles = {}
+        for entry in entries:
+            self.add(entry.message_id, entry.role_id, entry.reaction)
+        self.loaded = True
+
+    def get(self, message_id: int, reaction: str) -> typing.Optional[int]:
+        """Returns the id of the role a reaction on a message gives, or None if it gives none"""
+        return self._roles.get((message_id, reaction))
+
+    def entries(self, message_id: int) -> typing.Dict[int, str]:
+        """Returns the reaction of each role on a message, keyed by role id"""
+        return dict(self._messages.get(message_id, {}))
+
+    def add_message(self, message_id: int):
+        """Tracks a message that has no reaction roles yet, like a newly created role menu"""
+        self._messages.setdefault(message_id, {})
+
+    def add(self, message_id: int, role_id: int, reaction: str):
+        """Adds a reaction role, replacing the reaction that role had on the message before"""
+        self.remove(message_id, role_id)
+        self._messages.setdefault(message_id, {})[role_id] = reaction
+        self._roles.setdefault((message_id, reaction), role_id)
+
+    def remove(self, message_id: int, role_id: int):
+        """Removes a reaction role, if the message has one for that role"""
+        reactions = self._messages.get(message_id)
+        if not reactions or role_id not in reactions:
+            return
+        reaction = reactions.pop(role_id)
+        if self._roles.get((message_id, reaction)) == role_id:
+            del self._roles[(message_id, reaction)]
+            # Another role bound to the same reaction takes over, the way the first matching row used to
+            for other_role_id, other_reaction in reactions.items():
+                if other_reaction == reaction:
+                    self._roles[(message_id, reaction)] = other_role_id
+                    break
+
+    def discard_message(self, message_id: int) -> bool:
+        """Forgets a message and all of its reaction roles, returning whether it was tracked"""
+        reactions = self._messages.pop(message_id, None)
+        if reactions is None:
+            return False
+        for reaction in reactions.values():
+            self._roles.pop((message_id, reaction), None)
+        return True
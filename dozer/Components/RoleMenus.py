@@ -0,0 +1,135 @@
+"""Keeps role menu messages and their embeds in memory, so editing a menu doesn't refetch and rebuild it every time"""
+import asyncio
+import collections
+import typing
+
+import discord
+from loguru import logger
+
+from .ReactionRoleIndex import ReactionRoleIndex
+
+EDIT_DELAY = 2  # seconds to wait for more changes to a menu before editing its message
+MESSAGE_CACHE_SIZE = 256
+
+
+class RoleMenuService:
+    """
+    Role menus and the messages reaction roles are attached to.
+    Fetched messages are cached, so adding several roles to a message fetches it once. Each menu's embed is kept
+    alongside it and patched one field at a time as roles are added or removed, and the edits made within a couple of
+    seconds of each other are sent to Discord as a single message edit.
+    The menus themselves are RoleMenu rows, and their entries are read from the reaction role index.
+    """
+
+    def __init__(self, index: ReactionRoleIndex, edit_delay: float = EDIT_DELAY):
+        self.index = index
+        self.edit_delay = edit_delay
+        self.menus = {}  # message_id -> RoleMenu
+        self._messages = collections.OrderedDict()  # message_id -> discord.Message, least recently used first
+        self._embeds = {}  # message_id -> (embed, role ids in field order)
+        self._pending = {}  # message_id -> task waiting to edit the menu
+
+    def load(self, menus: typing.Iterable):
+        """Replaces the known menus with the given RoleMenu rows"""
+        self.menus = {menu.message_id: menu for menu in menus}
+
+    def get_menu(self, guild_id: int, message_id: int):
+        """Returns the guild's menu on a message, or None if the message isn't one of its menus"""
+        menu = self.menus.get(message_id)
+        return menu if menu is not None and menu.guild_id == guild_id else None
+
+    def add_menu(self, menu, message: discord.Message):
+        """Registers a newly created menu along with its message"""
+        self.menus[menu.message_id] = menu
+        self.index.add_message(menu.message_id)
+        self._cache_message(message)
+
+    def forget(self, message_id: int):
+        """Drops everything known about a message, after it was deleted"""
+        self.menus.pop(message_id, None)
+        self._messages.pop(message_id, None)
+        self._embeds.pop(message_id, None)
+        task = self._pending.pop(message_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def fetch_message(self, channel: discord.TextChannel, message_id: int) -> discord.Message:
+        """Returns a message, fetching it only if it isn't cached"""
+        message = self._messages.get(message_id)
+        if message is not None and message.channel.id == channel.id:
+            self._messages.move_to_end(message_id)
+            return message
+        message = await channel.fetch_message(message_id)
+        self._cache_message(message)
+        return message
+
+    def _cache_message(self, message: discord.Message):
+        self._messages[message.id] = message
+        self._messages.move_to_end(message.id)
+        while len(self._messages) > MESSAGE_CACHE_SIZE:
+            # Menu messages stay cached, they're the ones edited over and over
+            for message_id in self._messages:
+                if message_id not in self.menus:
+                    del self._messages[message_id]
+                    break
+            else:
+                break
+
+    def _menu_embed(self, menu, guild: discord.Guild):
+        """Returns the cached embed of a menu, building it from the index the first time"""
+        cached = self._embeds.get(menu.message_id)
+        if cached is None:
+            embed = discord.Embed(title=f"Role Menu: {menu.name}")
+            order = []
+            for role_id, reaction in self.index.entries(menu.message_id).items():
+                self._set_field(embed, order, guild.get_role(role_id), role_id, reaction)
+            cached = self._embeds[menu.message_id] = (embed, order)
+        return cached
+
+    @staticmethod
+    def _set_field(embed: discord.Embed, order: typing.List[int], role: typing.Optional[discord.Role], role_id: int, reaction: str):
+        name = f"Role: {role}" if role is not None else "Role: deleted role"
+        value = f"{reaction}: {role.mention if role is not None else f'<@&{role_id}>'}"
+        if role_id in order:
+            embed.set_field_at(order.index(role_id), name=name, value=value, inline=False)
+        else:
+            order.append(role_id)
+            embed.add_field(name=name, value=value, inline=False)
+
+    def set_role(self, menu, role: discord.Role, reaction: str):
+        """Shows a reaction role on a menu, replacing the reaction shown for that role before"""
+        embed, order = self._menu_embed(menu, role.guild)
+        self._set_field(embed, order, role, role.id, reaction)
+        self._schedule_edit(menu)
+
+    def remove_role(self, menu, guild: discord.Guild, role_id: int):
+        """Takes a reaction role off a menu"""
+        embed, order = self._menu_embed(menu, guild)
+        if role_id in order:
+            embed.remove_field(order.index(role_id))
+            order.remove(role_id)
+        self._schedule_edit(menu)
+
+    def _schedule_edit(self, menu):
+        """Edits the menu message after a short delay, unless an edit is already waiting to go out"""
+        task = self._pending.get(menu.message_id)
+        if task is None or task.done():
+            self._pending[menu.message_id] = asyncio.get_running_loop().create_task(self._edit_later(menu),
+                                                                                    name=f"Role menu edit {menu.message_id}")
+
+    async def _edit_later(self, menu):
+        await asyncio.sleep(self.edit_delay)
+        self._pending.pop(menu.message_id, None)
+        if menu.message_id not in self._embeds:
+            return
+        embed, order = self._embeds[menu.message_id]
+        embed.set_footer(text=f"React to get a role\nMenu ID: {menu.message_id}, Total roles: {len(order)}")
+        message = self._messages.get(menu.message_id)
+        if message is None:
+            return  # Only reachable if the menu was forgotten while the edit waited
+        try:
+            self._cache_message(await message.edit(embed=embed))
+        except discord.NotFound:
+            self.forget(menu.message_id)
+        except discord.HTTPException as e:
+            logger.warning(f"Unable to edit role menu {menu.message_id} in guild {menu.guild_id}: {e}")
@@ -0,0 +1,130 @@
+"""Resolves what members type into giveable roles, tolerating unfinished names and typos"""
+import typing
+
+MIN_INEXACT_LENGTH = 3  # shorter names only ever match exactly
+MIN_SIMILARITY = 0.5
+NGRAM = 2
+
+
+def ngrams(name: str) -> typing.Set[str]:
+    """Returns the n-grams of a name, padded so that its first and last letters count as much as the others"""
+    padded = f"{' ' * (NGRAM - 1)}{name} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+class RoleNameIndex:
+    """
+    The normalized names of one guild's giveable roles. A name resolves to the roles named exactly that; failing that,
+    to the only role whose name it starts, found with a prefix trie; failing that, to the role whose name shares the
+    most n-grams (letter pairs) with it, as long as they are similar enough and no other role is as similar.
+    """
+
+    def __init__(self, roles: typing.Iterable[typing.Tuple[int, str]] = ()):
+        self.names = {}  # norm_name -> set of role ids
+        self._role_names = {}  # role_id -> norm_name
+        self._trie = {"count": 0, "children": {}}
+        self._ngrams = {}  # n-gram -> set of norm_names containing it
+        for role_id, norm_name in roles:
+            self.add(role_id, norm_name)
+
+    def __contains__(self, role_id: int):
+        return role_id in self._role_names
+
+    def __len__(self):
+        return len(self._role_names)
+
+    def role_ids(self) -> typing.KeysView[int]:
+        """Returns the ids of every indexed role"""
+        return self._role_names.keys()
+
+    def add(self, role_id: int, norm_name: str):
+        """Adds a role under a name, or renames it if it is already indexed"""
+        self.remove(role_id)
+        self._role_names[role_id] = norm_name
+        ids = self.names.setdefault(norm_name, set())
+        ids.add(role_id)
+        if len(ids) > 1:
+            return  # the name is already in the trie and n-gram index
+        node = self._trie
+        node["count"] += 1
+        for char in norm_name:
+            node = node["children"].setdefault(char, {"count": 0, "children": {}})
+            node["count"] += 1
+        for gram in ngrams(norm_name):
+            self._ngrams.setdefault(gram, set()).add(norm_name)
+
+    def remove(self, role_id: int):
+        """Removes a role, if it is indexed"""
+        norm_name = self._role_names.pop(role_id, None)
+        if norm_name is None:
+            return
+        ids = self.names[norm_name]
+        ids.discard(role_id)
+        if ids:
+            return
+        del self.names[norm_name]
+        node = self._trie
+        node["count"] -= 1
+        for char in norm_name:
+            child = node["children"][char]
+            child["count"] -= 1
+            if not child["count"]:
+                del node["children"][char]
+                break
+            node = child
+        for gram in ngrams(norm_name):
+            names = self._ngrams[gram]
+            names.discard(norm_name)
+            if not names:
+                del self._ngrams[gram]
+
+    def _complete(self, prefix: str) -> typing.Optional[str]:
+        """Returns the only name starting with a prefix, or None if there are none or several"""
+        node = self._trie
+        for char in prefix:
+            node = node["children"].get(char)
+            if node is None:
+                return None
+        if node["count"] != 1:
+            return None
+        name = prefix
+        while node["children"]:
+            char, node = next(iter(node["children"].items()))
+            name += char
+        return name
+
+    def _closest(self, name: str) -> typing.Optional[str]:
+        """Returns the indexed name most similar to a name, or None if none is similar enough or several tie"""
+        grams = ngrams(name)
+        shared = {}
+        for gram in grams:
+            for candidate in self._ngrams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        best, best_score, tied = None, MIN_SIMILARITY, False
+        for candidate, count in shared.items():
+            score = 2 * count / (len(grams) + len(ngrams(candidate)))  # Dice coefficient
+            if score > best_score:
+                best, best_score, tied = candidate, score, False
+            elif score == best_score and best is not None:
+                tied = True
+        return None if tied else best
+
+    def resolve(self, norm_name: str) -> typing.Set[int]:
+        """Returns the ids of the roles a normalized name refers to, which is empty if it refers to none"""
+        if norm_name in self.names:
+            return set(self.names[norm_name])
+        if len(norm_name) < MIN_INEXACT_LENGTH:
+            return set()
+        match = self._complete(norm_name) or self._closest(norm_name)
+        return set(self.names[match]) if match is not None else set()
+
+    def resolve_many(self, norm_names: typing.Iterable[str]) -> typing.Tuple[typing.Set[int], typing.List[str]]:
+        """Resolves several names at once, returning the ids of every role found and the names that found none"""
+        found, unresolved = set(), []
+        for norm_name in norm_names:
+            ids = self.resolve(norm_name)
+            if ids:
+                found |= ids
+            else:
+                unresolved.append(norm_name)
+        return found, unresolved
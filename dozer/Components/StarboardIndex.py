@@ -0,0 +1,52 @@
+"""In-memory state of the starboard: which messages were posted to it, where, and with how many stars"""
+import collections
+import typing
+
+ABSENT_CACHE_SIZE = 4096
+
+
+class StarboardIndex:
+    """
+    Maps original messages to their starboard posts and back. Each post carries the star count it last showed.
+    Entries are loaded for every message newer than a cutoff, so for those the index is complete: a message newer than
+    the cutoff that isn't indexed was never posted, and finding that out takes no query. Older messages are looked up in
+    the database once and the answer is remembered, including when they were never posted.
+    The index is written through: whoever changes the starboard_message table updates it alongside.
+    """
+
+    def __init__(self):
+        self.cutoff = None  # snowflake the index is complete above, None until loaded
+        self.by_message = {}  # original message id -> StarboardMessage
+        self.by_starboard = {}  # starboard message id -> StarboardMessage
+        self._absent = collections.OrderedDict()  # old message ids known to be neither posted nor a post
+
+    def load(self, entries: typing.Iterable, cutoff: int):
+        """Replaces the index with the given entries, which must be every entry with a message newer than the cutoff"""
+        self.by_message.clear()
+        self.by_starboard.clear()
+        self._absent.clear()
+        for entry in entries:
+            self.add(entry)
+        self.cutoff = cutoff
+
+    def complete_for(self, message_id: int) -> bool:
+        """Whether the index alone can tell if a message was posted to the starboard or is a starboard post"""
+        return (self.cutoff is not None and message_id > self.cutoff) or message_id in self._absent
+
+    def add(self, entry):
+        """Indexes a starboard post"""
+        self.by_message[entry.message_id] = entry
+        self.by_starboard[entry.starboard_message_id] = entry
+        self._absent.pop(entry.message_id, None)
+        self._absent.pop(entry.starboard_message_id, None)
+
+    def remove(self, entry):
+        """Forgets a starboard post"""
+        self.by_message.pop(entry.message_id, None)
+        self.by_starboard.pop(entry.starboard_message_id, None)
+
+    def mark_absent(self, message_id: int):
+        """Remembers that an old message was looked up and is neither posted nor a post"""
+        self._absent[message_id] = None
+        while len(self._absent) > ABSENT_CACHE_SIZE:
+            self._absent.popitem(last=False)
@@ -0,0 +1,122 @@
+"""A single-task timer scheduler shared by every cog that needs to run something at a point in the future"""
+import asyncio
+import heapq
+import itertools
+import time
+
+from loguru import logger
+
+# Upper bound on a single sleep, so that wall clock adjustments are picked up eventually
+MAX_SLEEP = 3600
+
+
+class _TimerEntry:
+    """A pending timer. Entries are never removed from the heap directly, they are flagged as cancelled instead."""
+    __slots__ = ('when', 'seq', 'key', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when: float, seq: int, key, callback, args):
+        self.when = when
+        self.seq = seq
+        self.key = key
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+
+class TimerScheduler:
+    """Keeps every pending timer in one min-heap, serviced by one sleeper task.
+    Timers are identified by a hashable key; scheduling an existing key reschedules it.
+    Timestamps are unix timestamps, as stored in the timer record tables."""
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def when(self, key):
+        """Returns the unix timestamp a timer is due at, or None if there is no such timer"""
+        entry = self._entries.get(key)
+        return entry.when if entry else None
+
+    def schedule(self, key, when: float, callback, *args):
+        """Schedules `await callback(*args)` to be run at the unix timestamp `when`, replacing any timer with the same key."""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            old.cancelled = True
+        entry = _TimerEntry(when, next(self._counter), key, callback, args)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="TimerScheduler")
+
+    def cancel(self, key):
+        """Cancels a pending timer. Returns whether a timer was cancelled."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        # Rebuild the heap once it is mostly dead entries, so it can't grow without bound
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [e for e in self._heap if not e.cancelled]
+            heapq.heapify(self._heap)
+        return True
+
+    def cancel_where(self, predicate):
+        """Cancels every pending timer whose key matches the predicate. Returns the number of timers cancelled."""
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            self.cancel(key)
+        return len(keys)
+
+    def close(self):
+        """Stops the sleeper task. Pending timers are dropped, their records are left in the database."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._heap.clear()
+        self._entries.clear()
+
+    async def _run(self):
+        """The sleeper task: waits until the earliest timer is due, or until an earlier one is scheduled"""
+        while True:
+            self._wakeup.clear()
+            while self._heap and self._heap[0].cancelled:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0].when - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, MAX_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            entry = heapq.heappop(self._heap)
+            del self._entries[entry.key]
+            task = asyncio.get_running_loop().create_task(self._fire(entry), name=f"Timer {entry.key}")
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    @staticmethod
+    async def _fire(entry: _TimerEntry):
+        """Runs a timer callback, making sure one failing timer can't take down the scheduler"""
+        try:
+            await entry.callback(*entry.args)
+        except Exception as e:
+            logger.error(f"Timer {entry.key} failed: {e}")
+            logger.exception(e)
@@ -0,0 +1,64 @@
+"""Renders deleted messages into a plain text transcript file, for logs too large for embeds"""
+import asyncio
+import gzip
+import io
+import typing
+
+import discord
+
+GZIP_THRESHOLD = 512 * 1024  # transcripts estimated larger than this many bytes are compressed
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S UTC"
+
+
+class TranscriptLine(typing.NamedTuple):
+    """What a transcript shows of one message, copied off the message so rendering doesn't touch it"""
+    message_id: int
+    created_at: str
+    author: str
+    author_id: int
+    content: str
+    attachments: typing.Tuple[str, ...]
+    embeds: int
+
+    @classmethod
+    def from_message(cls, message: discord.Message):
+        """Copies the parts of a message a transcript shows"""
+        return cls(message_id=message.id, created_at=message.created_at.strftime(TIME_FORMAT), author=str(message.author),
+                   author_id=message.author.id, content=message.content,
+                   attachments=tuple(attachment.proxy_url for attachment in message.attachments), embeds=len(message.embeds))
+
+
+def _write_transcript(stream: typing.BinaryIO, header: str, lines: typing.Iterable[TranscriptLine]):
+    stream.write(header.encode())
+    for line in lines:
+        text = f"\n[{line.created_at}] {line.author} ({line.author_id}) - message {line.message_id}\n"
+        if line.content:
+            text += "".join(f"    {content_line}\n" for content_line in line.content.splitlines())
+        for url in line.attachments:
+            text += f"    [attachment] {url}\n"
+        if line.embeds:
+            text += f"    [{line.embeds} embed{'s' if line.embeds != 1 else ''}]\n"
+        stream.write(text.encode())
+
+
+def render_transcript(name: str, header: str, lines: typing.Sequence[TranscriptLine]) -> typing.Tuple[bytes, str]:
+    """
+    Writes a transcript of the given messages, oldest first, returning the file contents and name. Transcripts that
+    would be large are gzip compressed as they are written. This blocks, so run it off the event loop.
+    """
+    lines = sorted(lines, key=lambda line: line.message_id)
+    estimate = len(header) + sum(len(line.content) + 100 for line in lines)
+    buffer = io.BytesIO()
+    if estimate > GZIP_THRESHOLD:
+        with gzip.GzipFile(filename=f"{name}.txt", mode="wb", fileobj=buffer) as stream:
+            _write_transcript(stream, header, lines)
+        return buffer.getvalue(), f"{name}.txt.gz"
+    _write_transcript(buffer, header, lines)
+    return buffer.getvalue(), f"{name}.txt"
+
+
+async def transcript_file(name: str, header: str, messages: typing.Iterable[discord.Message]) -> typing.Tuple[discord.File, int]:
+    """Renders a transcript of some messages in a worker thread, returning it as an uploadable file along with its size"""
+    lines = [TranscriptLine.from_message(message) for message in messages]
+    data, filename = await asyncio.get_running_loop().run_in_executor(None, render_transcript, name, header, lines)
+    return discord.File(io.BytesIO(data), filename), len(data)
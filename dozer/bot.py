@@ -13,6 +13,8 @@ from loguru import logger
 from sentry_sdk import capture_exception
 
 from . import utils
+from .Components.EmbedQueue import EmbedQueue
+from .Components.TimerScheduler import TimerScheduler
 from .cogs import _utils
 from .cogs._utils import CommandMixin
 from .context import DozerContext
@@ -44,6 +46,8 @@ class Dozer(commands.Bot):
         self._restarting = False
         self.check(self.global_checks)
         self.aiohttp_sessions = []
+        self.scheduler = TimerScheduler()
+        self.log_queue = EmbedQueue()  # shared by every cog that sends log embeds, so each log channel has one queue
 
     async def setup_hook(self) -> None:
         for ext in os.listdir('dozer/cogs'):
@@ -162,6 +166,7 @@ class Dozer(commands.Bot):
         """performs cleanup and actually shuts down the bot"""
         logger.info("Bot is shutting down...")
         await super().close()
+        self.scheduler.close()
         for ses in self.aiohttp_sessions:
             await ses.close()
     
@@ -1,6 +1,7 @@
 """Utilities for Dozer."""
 import asyncio
 import inspect
+import time
 import typing
 from collections.abc import Mapping
 from typing import Dict, Union
@@ -15,8 +16,8 @@ from loguru import logger
 from dozer import db
 from dozer.context import DozerContext
 
-__all__ = ['bot_has_permissions', 'command', 'group', 'Cog', 'Reactor', 'Paginator', 'paginate', 'chunk', 'dev_check',
-           'DynamicPrefixEntry']
+__all__ = ['bot_has_permissions', 'command', 'group', 'Cog', 'Reactor', 'Paginator', 'paginate', 'LazyPaginator',
+           'paginate_lazily', 'chunk', 'dev_check', 'resolve_members', 'ProgressMessage', 'DynamicPrefixEntry']
 
 
 
@@ -300,6 +301,135 @@ async def paginate(ctx: DozerContext, pages, *, start: int = 0, auto_remove: boo
         pass  # The normal pagination reactions are handled - just drop anything else
 
 
+class LazyPaginator(Reactor):
+    """
+    Pagination for listings too long to fetch and render up front. Each page is fetched and rendered the first time it
+    is shown, and kept for when the caller pages back to it.
+    get_page(cursor) is awaited with None for the first page, and returns the page's embed along with the cursor the
+    next page starts at, or None if it is the last page. Cursors are whatever the caller's query needs to continue
+    from where the previous page stopped, e.g. the last row of that page.
+    Usage:
+        paginator = LazyPaginator(ctx, get_page)
+        async for reaction in paginator:
+            pass  # Only reactions other than the pagination ones are given to the caller
+    """
+    pagination_reactions = (
+        '\N{BLACK LEFT-POINTING TRIANGLE}',  # :arrow_backward:
+        '\N{BLACK RIGHT-POINTING TRIANGLE}',  # :arrow_forward:
+        '\N{BLACK SQUARE FOR STOP}'  # :stop_button:
+    )
+
+    def __init__(self, ctx: DozerContext, get_page, *, auto_remove: bool = True, timeout: int = 60):
+        super().__init__(ctx, self.pagination_reactions, auto_remove=auto_remove, timeout=timeout)
+        self.get_page = get_page
+        self.pages = {}
+        self.cursors = [None]
+        self.page = 0
+
+    async def load(self, page: int):
+        """Fetches and renders a page if it hasn't been yet"""
+        if page in self.pages:
+            return
+        self.pages[page], next_cursor = await self.get_page(self.cursors[page])
+        if next_cursor is not None and len(self.cursors) == page + 1:
+            self.cursors.append(next_cursor)
+
+    @property
+    def is_last_page(self):
+        """Whether the current page is the last one"""
+        return self.page + 1 >= len(self.cursors)
+
+    async def __aiter__(self):
+        await self.load(self.page)
+        async for reaction in super().__aiter__():
+            if reaction == self.pagination_reactions[0]:
+                if self.page > 0:
+                    self.do(self.show(self.page - 1))
+            elif reaction == self.pagination_reactions[1]:
+                if not self.is_last_page:
+                    self.do(self.show(self.page + 1))
+            elif reaction == self.pagination_reactions[2]:
+                self.stop()
+            else:
+                yield reaction
+
+    async def show(self, page: int):
+        """Goes to a page, fetching it if needed"""
+        await self.load(page)
+        self.page = page
+        await self.message.edit(embed=self.pages[page])
+
+
+async def paginate_lazily(ctx: DozerContext, get_page, *, auto_remove: bool = True, timeout: int = 60):
+    """
+    Simple pagination based on LazyPaginator. Listings that fit on one page are sent without the pagination reactions.
+    """
+    paginator = LazyPaginator(ctx, get_page, auto_remove=auto_remove, timeout=timeout)
+    await paginator.load(0)
+    if paginator.is_last_page:
+        await ctx.send(embed=paginator.pages[0])
+        return
+    async for reaction in paginator:
+        pass  # The normal pagination reactions are handled - just drop anything else
+
+
+class ProgressMessage:
+    """
+    A status message for long running jobs, edited as the job progresses but at most once every `interval` seconds.
+    Usage:
+        progress = ProgressMessage(ctx, "Doing things")
+        await run_bounded(items, func, concurrency=5, progress=progress.update)
+        await progress.finish("Did 5 things")
+    The message is only sent once the job reports progress, so jobs with nothing to do stay silent.
+    template is formatted with the reported done and total counts, for jobs where those mean something else.
+    """
+
+    def __init__(self, dest, title: str, *, interval: float = 2.0, color=discord.Color.blurple(),
+                 template: str = "{done}/{total} done"):
+        self.dest = dest
+        self.title = title
+        self.interval = interval
+        self.color = color
+        self.template = template
+        self.message = None
+        self.done = 0
+        self.total = 0
+        self._last_edit = 0.0
+        self._edit_task = None
+
+    def make_embed(self, description: str = None):
+        """Makes the status embed"""
+        return discord.Embed(title=self.title, color=self.color,
+                             description=description or self.template.format(done=self.done, total=self.total))
+
+    def update(self, done: int, total: int):
+        """Records progress, and refreshes the message if it hasn't been refreshed recently. Usable as a progress callback."""
+        self.done, self.total = done, total
+        if self._edit_task is not None and not self._edit_task.done():
+            return
+        if time.monotonic() - self._last_edit < self.interval:
+            return
+        self._last_edit = time.monotonic()
+        self._edit_task = asyncio.get_running_loop().create_task(self._refresh(self.make_embed()))
+
+    async def finish(self, description: str = None):
+        """Waits for any pending refresh, then shows the final status if the message was ever sent"""
+        if self._edit_task is not None:
+            await self._edit_task
+        if self.message is not None:
+            await self._refresh(self.make_embed(description))
+
+    async def _refresh(self, embed: discord.Embed):
+        """Sends or edits the status message"""
+        try:
+            if self.message is None:
+                self.message = await self.dest.send(embed=embed)
+            else:
+                await self.message.edit(embed=embed)
+        except discord.HTTPException as e:
+            logger.debug(f"Failed to update progress message \"{self.title}\": {e}")
+
+
 def chunk(iterable, size: int):
     """
     Break an iterable into chunks of a fixed size. Returns an iterable of iterables.
@@ -311,6 +441,29 @@ def chunk(iterable, size: int):
         yield contents[i:i + size]
 
 
+async def resolve_members(guild: discord.Guild, member_ids) -> Dict[int, discord.Member]:
+    """
+    Resolves member IDs to members, using the member cache first and batched gateway member queries for cache misses.
+    Members that are not in the guild are left out of the returned id -> member dict.
+    """
+    members = {}
+    missing = []
+    for member_id in set(member_ids):
+        member = guild.get_member(member_id)
+        if member is None:
+            missing.append(member_id)
+        else:
+            members[member_id] = member
+    # The gateway accepts up to 100 user IDs per member request
+    for batch in chunk(missing, 100):
+        try:
+            for member in await guild.query_members(user_ids=batch, limit=len(batch), cache=True):
+                members[member.id] = member
+        except (asyncio.TimeoutError, discord.ClientException) as e:
+            logger.warning(f"Failed to query {len(batch)} members in guild {guild} ({guild.id}): {e!r}")
+    return members
+
+
 def bot_has_permissions(**required):
     """Decorator to check if bot has certain permissions when added to a command"""
 
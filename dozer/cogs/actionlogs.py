@@ -1,21 +1,30 @@
 """Provides guild logging functions for Dozer."""
 import asyncio
+import collections
 import datetime
 import math
 import time
+import typing
 
 import discord
 from discord.ext import commands
 from discord.ext.commands import has_permissions, BadArgument
+from discord.ext.tasks import loop
 from discord.utils import escape_markdown
 from loguru import logger
 
 from dozer.context import DozerContext
 from ._utils import *
 from .general import blurple
-from .moderation import GuildNewMember
 from .. import db
-from ..Components.CustomJoinLeaveMessages import CustomJoinLeaveMessages, format_join_leave, send_log
+from ..Components.AuditLogBuffer import AuditLogBuffer, SHORT_WAIT_TIME
+from ..Components.CustomJoinLeaveMessages import CustomJoinLeaveMessages, format_join_leave, join_leave_config, send_log
+from ..Components.GuildNewMember import new_member_config
+from ..Components.MessageStore import MessageStore
+from ..Components.Transcripts import transcript_file
+
+BULK_DELETE_QUIET_TIME = 15  # a bulk delete is logged once no more of it has arrived for this many seconds
+BULK_DELETE_HEADER_INTERVAL = 5  # minimum seconds between edits of a bulk delete's header
 
 
 async def embed_paginatorinator(content_name, embed, text):
@@ -29,6 +38,36 @@ async def embed_paginatorinator(content_name, embed, text):
     return c_embed
 
 
+class BulkDelete:
+    """The deletes of one bulk delete, merged from every payload it arrived in until the deletes stop"""
+
+    def __init__(self, channel: discord.abc.GuildChannel, log_channel: discord.TextChannel):
+        self.channel = channel
+        self.log_channel = log_channel
+        self.started = datetime.datetime.now(tz=datetime.timezone.utc)
+        self.deadline = time.monotonic() + BULK_DELETE_QUIET_TIME
+        self.message_ids = set()
+        self.messages = {}  # message_id -> cached message
+        self.timer = None  # the one task that waits out the deletes and logs them
+        self.header_message = None
+        self.header_task = None
+        self.header_outdated = False
+
+    def add(self, message_ids: typing.Iterable[int], cached_messages: typing.Iterable[discord.Message]):
+        """Merges a payload in, pushing the flush back"""
+        self.message_ids.update(message_ids)
+        self.messages.update((message.id, message) for message in cached_messages)
+        self.deadline = time.monotonic() + BULK_DELETE_QUIET_TIME
+        self.header_outdated = True
+
+    def header_embed(self, logged: str) -> discord.Embed:
+        """Returns the header embed for the deletes so far"""
+        return discord.Embed(title="Bulk Message Delete", color=0xFF0000,
+                             description=f"{len(self.message_ids)} Messages Deleted In: {self.channel.mention}\n"
+                                         f"Messages cached: {len(self.messages)}/{len(self.message_ids)} \n"
+                                         f"Messages logged: {logged}")
+
+
 class Actionlog(Cog):
     """A cog to handle guild events tasks"""
 
@@ -36,48 +75,80 @@ class Actionlog(Cog):
         super().__init__(bot)
         self.edit_delete_config = db.ConfigCache(GuildMessageLog)
         self.bulk_delete_buffer = {}
+        self.message_store = MessageStore()
+        self.audit_log = AuditLogBuffer()
+        self.store_task.start()
+        self.purge_task.start()
+
+    @loop(seconds=30)
+    async def store_task(self):
+        """Writes the messages stored since the last run to the database"""
+        await self.message_store.flush()
+
+    @loop(hours=1)
+    async def purge_task(self):
+        """Deletes stored messages past the retention period"""
+        await self.message_store.purge()
+
+    @store_task.before_loop
+    @purge_task.before_loop
+    async def before_store(self):
+        """Waits for the database to be ready before touching the message store"""
+        await self.bot.wait_until_ready()
+
+    async def cog_unload(self):
+        """Stops the message store tasks and writes out what is still buffered"""
+        self.store_task.stop()
+        self.purge_task.stop()
+        await self.message_store.flush()
+
+    async def stores_content(self, guild: discord.Guild) -> bool:
+        """Whether a guild opted in to having message content stored"""
+        config = await self.edit_delete_config.query_one(guild_id=guild.id)
+        return config is not None and bool(config.store_content)
+
+    @Cog.listener('on_message')
+    async def on_message(self, message: discord.Message):
+        """Stores messages in guilds that opted in, so they can be logged after falling out of the message cache"""
+        if message.guild is None or message.author.bot or not await self.stores_content(message.guild):
+            return
+        self.message_store.record(message)
+        if self.message_store.full:
+            await self.message_store.flush()
 
-    @staticmethod
-    async def check_audit(guild, event_type, event_time=None):
-        """Method for checking the audit log for events"""
-        try:
-            async for entry in guild.audit_logs(limit=1, after=event_time,
-                                                action=event_type):
-                return entry
-        except discord.Forbidden:
-            return None
+    @Cog.listener()
+    async def on_audit_log_entry_create(self, entry: discord.AuditLogEntry):
+        """Buffers audit log entries for the events they explain"""
+        self.audit_log.add(entry)
+
+    @Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        """Drops the audit log entries of a guild the bot left"""
+        self.audit_log.clear(guild.id)
 
     @Cog.listener('on_member_join')
     async def on_member_join(self, member):
         """Logs that a member joined, with optional custom message"""
-        join_leave_config = await CustomJoinLeaveMessages.get_by(guild_id=member.guild.id)
-        new_members_config = await GuildNewMember.get_by(guild_id=member.guild.id)
-        if len(new_members_config) == 0 and len(join_leave_config) == 0:
-            await send_log(member)
-        else:
-            if len(new_members_config) > 0 and new_members_config[0].require_team:
-                return
-            elif len(join_leave_config) > 0 and join_leave_config[0].send_on_verify:
-                return
-            else:
-                await send_log(member)
+        config = await join_leave_config.query_one(guild_id=member.guild.id)
+        if config is None or config.send_on_verify:
+            return
+        new_members = await new_member_config.query_one(guild_id=member.guild.id)
+        if new_members is not None and new_members.require_team:
+            return
+        await send_log(member, self.bot.log_queue)
 
     @Cog.listener('on_member_remove')
     async def on_member_remove(self, member):
         """Logs that a member left."""
-        config = await CustomJoinLeaveMessages.get_by(guild_id=member.guild.id)
-        if len(config):
-            channel = member.guild.get_channel(config[0].channel_id)
+        config = await join_leave_config.query_one(guild_id=member.guild.id)
+        if config is not None:
+            channel = member.guild.get_channel(config.channel_id)
             if channel:
                 embed = discord.Embed(color=0xFF0000)
                 embed.set_author(name='Member Left', icon_url=member.display_avatar.replace(format='png', size=32))
-                embed.description = format_join_leave(config[0].leave_message, member)
+                embed.description = format_join_leave(config.leave_message, member)
                 embed.set_footer(text=f"{member.guild.name} | {member.guild.member_count} members")
-                try:
-                    await channel.send(embed=embed)
-                except discord.Forbidden:
-                    logger.warning(
-                        f"Guild {member.guild}({member.guild.id}) has invalid permissions for join/leave logs")
+                await self.bot.log_queue.put(channel, embed, coalesce="leave", summary=f"{member.mention} {escape_markdown(str(member))}")
 
     @Cog.listener("on_member_update")
     async def on_member_update(self, before, after):
@@ -87,7 +158,8 @@ class Actionlog(Cog):
 
     async def on_nickname_change(self, before, after):
         """The log handler for when a user changes their nicknames"""
-        audit = await self.check_audit(after.guild, discord.AuditLogAction.member_update)
+        audit = await self.audit_log.find(after.guild, discord.AuditLogAction.member_update, after.id,
+                                          check=lambda entry: hasattr(entry.after, "nick"))
 
         embed = discord.Embed(title="Nickname Changed",
                               color=0x00FFFF)
@@ -96,16 +168,14 @@ class Actionlog(Cog):
         embed.add_field(name="After", value=after.nick, inline=False)
 
         if audit:
-            if audit.target == after:
-                audit_member = await after.guild.fetch_member(audit.user.id)
-                embed.description = f"Nickname Changed By: {audit_member.mention}"
+            embed.description = f"Nickname Changed By: <@{audit.user_id}>"
 
         embed.set_footer(text=f"UserID: {after.id}")
         message_log_channel = await self.edit_delete_config.query_one(guild_id=after.guild.id)
         if message_log_channel is not None:
             channel = after.guild.get_channel(message_log_channel.messagelog_channel)
             if channel is not None:
-                await channel.send(embed=embed)
+                await self.bot.log_queue.put(channel, embed)
         await self.check_nickname_lock(before, after)
 
     async def check_nickname_lock(self, before, after):
@@ -130,8 +200,6 @@ class Actionlog(Cog):
         """Log bulk message deletes"""
         guild = self.bot.get_guild(int(payload.guild_id))
         message_channel = self.bot.get_channel(int(payload.channel_id))
-        message_ids = payload.message_ids
-        cached_messages = payload.cached_messages
 
         message_log_channel = await self.edit_delete_config.query_one(guild_id=guild.id)
         if message_log_channel is not None:
@@ -140,127 +208,125 @@ class Actionlog(Cog):
                 return
         else:
             return
-        buffer = self.bulk_delete_buffer.get(message_channel.id)
-        if buffer:
-            self.bulk_delete_buffer[message_channel.id]["last_payload"] = time.time()
-            self.bulk_delete_buffer[message_channel.id]["msg_ids"] += message_ids
-            self.bulk_delete_buffer[message_channel.id]["msgs"] += cached_messages
-            header_message = self.bulk_delete_buffer[message_channel.id]["header_message"]
-            header_embed = discord.Embed(title="Bulk Message Delete", color=0xFF0000)
-            deleted = self.bulk_delete_buffer[message_channel.id]["msg_ids"]
-            cached = self.bulk_delete_buffer[message_channel.id]["msgs"]
-            header_embed.description = f"{len(deleted)} Messages Deleted In: {message_channel.mention}\n" \
-                                       f"Messages cached: {len(cached)}/{len(deleted)} \n" \
-                                       f"Messages logged: *Currently Purging*"
-            await header_message.edit(embed=header_embed)
-        else:
-            header_embed = discord.Embed(title="Bulk Message Delete", color=0xFF0000)
-            header_embed.description = f"{len(message_ids)} Messages Deleted In: {message_channel.mention}\n" \
-                                       f"Messages cached: {len(cached_messages)}/{len(message_ids)} \n" \
-                                       f"Messages logged: *Currently Purging*"
-            header_message = await channel.send(embed=header_embed)
-
-            self.bulk_delete_buffer[message_channel.id] = {"last_payload": time.time(), "msg_ids": list(message_ids),
-                                                           "msgs": list(cached_messages),
-                                                           "log_channel": channel, "header_message": header_message}
-
-        await self.bulk_delete_log(message_channel)
+        if message_log_channel.store_content:
+            self.message_store.forget(payload.message_ids)
+        bulk_delete = self.bulk_delete_buffer.get(message_channel.id)
+        if bulk_delete is None:
+            bulk_delete = BulkDelete(message_channel, channel)
+            self.bulk_delete_buffer[message_channel.id] = bulk_delete
+            bulk_delete.timer = self.bot.loop.create_task(self.bulk_delete_log(bulk_delete))
+        bulk_delete.add(payload.message_ids, payload.cached_messages)
+        if bulk_delete.header_task is None or bulk_delete.header_task.done():
+            bulk_delete.header_task = self.bot.loop.create_task(self.bulk_delete_header(bulk_delete))
 
-    async def bulk_delete_log(self, message_channel):
+    @staticmethod
+    async def bulk_delete_header(bulk_delete):
+        """Keeps the header of a bulk delete in progress up to date, editing it at most once per interval"""
+        while bulk_delete.header_outdated:
+            bulk_delete.header_outdated = False
+            embed = bulk_delete.header_embed("*Currently Purging*")
+            try:
+                if bulk_delete.header_message is None:
+                    bulk_delete.header_message = await bulk_delete.log_channel.send(embed=embed)
+                else:
+                    await bulk_delete.header_message.edit(embed=embed)
+            except discord.HTTPException as e:
+                logger.debug(f"Bulk delete header failed to update: {e}")
+            await asyncio.sleep(BULK_DELETE_HEADER_INTERVAL)
+
+    async def bulk_delete_log(self, bulk_delete):
         """Logs a bulk delete after the bot is finished the bulk delete"""
-        buffer_entry = self.bulk_delete_buffer[message_channel.id]
-        await asyncio.sleep(15)
-        if buffer_entry["last_payload"] > time.time() - 15:
-            return
-        self.bulk_delete_buffer.pop(message_channel.id)
-        message_ids = buffer_entry["msg_ids"]
-        cached_messages = buffer_entry["msgs"]
-        channel = buffer_entry["log_channel"]
-        header_message = buffer_entry["header_message"]
-
-        message_count = 0
-        header_embed = discord.Embed(title="Bulk Message Delete", color=0xFF0000)
-        header_embed.description = f"{len(message_ids)} Messages Deleted In: {message_channel.mention}\n" \
-                                   f"Messages cached: {len(cached_messages)}/{len(message_ids)} \n" \
-                                   f"Messages logged: *Currently Logging*"
-        await header_message.edit(embed=header_embed)
-        link = f"https://discordapp.com/channels/{header_message.guild.id}/{header_message.channel.id}/{header_message.id}"
-        current_page = 1
-        page_character_count = 0
-        page_message_count = 0
-        embed = discord.Embed(title="Bulk Message Delete", color=0xFF0000,
-                              timestamp=datetime.datetime.now(tz=datetime.timezone.utc))
-        for message in sorted(cached_messages, key=lambda msg: msg.created_at):
-            page_character_count += len(message.content[0:512]) + 3
-
-            if page_character_count >= 5000 or page_message_count >= 25:
-                embed.description = f"Messages {message_count}-{message_count + page_message_count} of [bulk delete]({link})"
-                embed.set_footer(text=f"Page {current_page}")
-                current_page += 1
-                try:
-                    await channel.send(embed=embed)
-                except discord.HTTPException as e:
-                    logger.debug(f"Bulk delete embed failed to send: {e}")
-                embed = discord.Embed(title="Bulk Message Delete", color=0xFF0000,
-                                      timestamp=datetime.datetime.now(tz=datetime.timezone.utc))
-                page_character_count = len(message.content)
-                message_count += page_message_count
-                page_message_count = 0
-
-            formatted_time = message.created_at.strftime("%b %d %Y %H:%M:%S")
-            embed.add_field(name=f"{formatted_time}: {message.author}",
-                            value="Message contained no content" if len(
-                                message.content) == 0 else message.content if len(message.content) < 512
-                            else f"{message.content[0:512]}...", inline=False)
-            page_message_count += 1
-            if current_page > 15:
-                break
-        message_count += page_message_count
-        embed.description = f"Messages {message_count}-{message_count + page_message_count} of [bulk delete]({link})"
-        embed.set_footer(text=f"Page {current_page}")
+        # Every payload pushes the deadline back, so this one timer waits for the deletes to stop
+        while (remaining := bulk_delete.deadline - time.monotonic()) > 0:
+            await asyncio.sleep(remaining)
+        self.bulk_delete_buffer.pop(bulk_delete.channel.id)
+        if bulk_delete.header_task is not None:
+            await bulk_delete.header_task
+        cached_messages = list(bulk_delete.messages.values())
+        message_channel = bulk_delete.channel
+
+        header_embed = bulk_delete.header_embed(f"{len(cached_messages)}/{len(bulk_delete.message_ids)}")
+        header_embed.timestamp = datetime.datetime.now(tz=datetime.timezone.utc)
+        attachments = []
+        if cached_messages:
+            first, last = min(msg.created_at for msg in cached_messages), max(msg.created_at for msg in cached_messages)
+            header_embed.add_field(name="Sent between", value=f"{discord.utils.format_dt(first)} and {discord.utils.format_dt(last)}")
+            authors = collections.Counter(str(msg.author) for msg in cached_messages)
+            header_embed.add_field(name="Top authors", value="\n".join(f"{escape_markdown(author)}: {count}"
+                                                                        for author, count in authors.most_common(5)))
+
+            name = f"bulk-delete-{message_channel.name}-{bulk_delete.started:%Y%m%d-%H%M%S}"
+            header = f"{len(bulk_delete.message_ids)} messages deleted in #{message_channel.name} ({message_channel.id}), " \
+                     f"{len(cached_messages)} of them cached\n"
+            transcript, size = await transcript_file(name, header, cached_messages)
+            if size > bulk_delete.log_channel.guild.filesize_limit:
+                header_embed.description = bulk_delete.header_embed(f"0/{len(bulk_delete.message_ids)} (transcript too large to upload)").description
+            else:
+                attachments.append(transcript)
         try:
-            await channel.send(embed=embed)
+            if bulk_delete.header_message is None:
+                await bulk_delete.log_channel.send(embed=header_embed, files=attachments)
+            else:
+                await bulk_delete.header_message.edit(embed=header_embed, attachments=attachments)
+        except discord.NotFound:
+            # Someone deleted the header while the purge was going on
+            for attachment in attachments:
+                attachment.reset()
+            await bulk_delete.log_channel.send(embed=header_embed, files=attachments)
         except discord.HTTPException as e:
-            logger.debug(f"Bulk delete embed failed to send: {e}")
-        header_embed.description = f"{len(message_ids)} Messages Deleted In: {message_channel.mention}\n" \
-                                   f"Messages cached: {len(cached_messages)}/{len(message_ids)} \n" \
-                                   f"Messages logged: {message_count}/{len(message_ids)}"
-        await header_message.edit(embed=header_embed)
+            logger.debug(f"Bulk delete transcript failed to upload: {e}")
 
     @Cog.listener()
     async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
         """When a message is deleted and its not in the bot cache, log it anyway."""
+        guild = self.bot.get_guild(int(payload.guild_id))
+        stored = None
+        if await self.stores_content(guild):
+            if not payload.cached_message:
+                stored = await self.message_store.get(payload.message_id)
+            self.message_store.forget([payload.message_id])
         if payload.cached_message:
             return
-        guild = self.bot.get_guild(int(payload.guild_id))
         message_channel = self.bot.get_channel(int(payload.channel_id))
         message_id = int(payload.message_id)
         message_created = discord.Object(message_id).created_at
         embed = discord.Embed(title="Message Deleted",
                               description=f"Message Deleted In: {message_channel.mention}",
                               color=0xFF00F0, timestamp=message_created)
-        embed.add_field(name="Message", value="N/A", inline=False)
-        embed.set_footer(text=f"Message ID: {message_channel.id} - {message_id}\nSent at ")
+        if stored is not None:
+            embed.description += f"\nSent by: <@{stored.author_id}>"
+            embed.set_author(name=stored.author_name)
+            if stored.content:
+                embed = await embed_paginatorinator("Message Content", embed, stored.content)
+            else:
+                embed.add_field(name="Message Content:", value="N/A", inline=False)
+            if stored.attachments:
+                embed.add_field(name="Attachments", value=", ".join(stored.attachments))
+            embed.set_footer(text=f"Message ID: {message_channel.id} - {message_id}\nUserID: {stored.author_id}")
+        else:
+            embed.add_field(name="Message", value="N/A", inline=False)
+            embed.set_footer(text=f"Message ID: {message_channel.id} - {message_id}\nSent at ")
         message_log_channel = await self.edit_delete_config.query_one(guild_id=guild.id)
         if message_log_channel is not None:
             channel = guild.get_channel(message_log_channel.messagelog_channel)
             if channel is not None:
-                await channel.send(embed=embed)
+                await self.bot.log_queue.put(channel, embed)
 
     @Cog.listener('on_message_delete')
     async def on_message_delete(self, message: discord.Message):
         """When a message is deleted, log it."""
         if message.author == self.bot.user:
             return
-        audit = await self.check_audit(message.guild, discord.AuditLogAction.message_delete, message.created_at)
+        # Members deleting their own messages makes no entry, so this only waits briefly for one
+        audit = await self.audit_log.find(message.guild, discord.AuditLogAction.message_delete, message.author.id,
+                                          timeout=SHORT_WAIT_TIME,
+                                          check=lambda entry: getattr(getattr(entry.extra, "channel", None), "id", None) == message.channel.id)
         embed = discord.Embed(title="Message Deleted",
                               description=f"Message Deleted In: {message.channel.mention}\nSent by: {message.author.mention}",
                               color=0xFF0000, timestamp=message.created_at)
         embed.set_author(name=message.author, icon_url=message.author.display_avatar)
         if audit:
-            if audit.target == message.author:
-                audit_member = await message.guild.fetch_member(audit.user.id)
-                embed.add_field(name="Message Deleted By: ", value=str(audit_member.mention), inline=False)
+            embed.add_field(name="Message Deleted By: ", value=f"<@{audit.user_id}>", inline=False)
         if message.content:
             embed = await embed_paginatorinator("Message Content", embed, message.content)
         else:
@@ -272,7 +338,7 @@ class Actionlog(Cog):
         if message_log_channel is not None:
             channel = message.guild.get_channel(message_log_channel.messagelog_channel)
             if channel is not None:
-                await channel.send(embed=embed)
+                await self.bot.log_queue.put(channel, embed)
 
     @Cog.listener()
     async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
@@ -290,6 +356,13 @@ class Actionlog(Cog):
         author = payload.data.get("author")
         if not author:
             return
+        original = None
+        if await self.stores_content(guild):
+            stored = await self.message_store.get(payload.message_id)
+            if stored is not None:
+                original = stored.content
+                if content is not None:
+                    self.message_store.record_edit(stored, content)
         guild_id = guild.id
         channel_id = payload.channel_id
         user_id = author['id']
@@ -304,7 +377,9 @@ class Actionlog(Cog):
                               description=f"[MESSAGE]({link}) From {mention}\nEdited In: {mchannel.mention}",
                               color=0xFFC400)
         embed.set_author(name=f"{author['username']}{'#' + author['discriminator'] if author['discriminator'] != '0' else ''}", icon_url=avatar_link)
-        embed.add_field(name="Original", value="N/A", inline=False)
+        embed.add_field(name="Original", value=original[0:1023] if original else "N/A", inline=False)
+        if original and len(original) > 1024:
+            embed.add_field(name="Original Continued", value=original[1024:2000], inline=False)
         if content:
             embed.add_field(name="Edited", value=content[0:1023], inline=False)
             if len(content) > 1024:
@@ -316,7 +391,7 @@ class Actionlog(Cog):
         if message_log_channel is not None:
             channel = guild.get_channel(message_log_channel.messagelog_channel)
             if channel is not None:
-                await channel.send(embed=embed)
+                await self.bot.log_queue.put(channel, embed)
 
     @Cog.listener('on_message_edit')
     async def on_message_edit(self, before: discord.Message, after: discord.Message):
@@ -325,6 +400,8 @@ class Actionlog(Cog):
             return
         if isinstance(before.channel, discord.DMChannel):
             return
+        if before.content != after.content and await self.stores_content(after.guild):
+            self.message_store.record(after)
         if after.edited_at is not None or before.edited_at is not None:
             # There is a reason for this. That reason is that otherwise, an infinite spam loop occurs
             guild_id = before.guild.id
@@ -352,31 +429,32 @@ class Actionlog(Cog):
             message_log_channel = await self.edit_delete_config.query_one(guild_id=before.guild.id)
             if message_log_channel is not None:
                 channel = before.guild.get_channel(message_log_channel.messagelog_channel)
-                if channel is not None:
+                if channel is not None and second_embed is None:
+                    await self.bot.log_queue.put(channel, first_embed)
+                elif channel is not None:
+                    # The two halves link to each other, so they are sent directly rather than queued
                     first_message = await channel.send(embed=first_embed)
-                    if second_embed:
-                        second_message = await channel.send(embed=second_embed)
-                        first_embed.add_field(name="Edited",
-                                              value=f"[CONTINUED](https://discordapp.com/channels/{guild_id}"
-                                                    f"/{second_message.channel.id}/{second_message.id})", inline=False)
-                        await first_message.edit(embed=first_embed)
-                        embed.set_field_at(0, name="Original",
-                                           value=f"[CONTINUED](https://discordapp.com/channels/{guild_id}"
-                                                 f"/{first_message.channel.id}/{first_message.id})", inline=False)
-                        await second_message.edit(embed=second_embed)
+                    second_message = await channel.send(embed=second_embed)
+                    first_embed.add_field(name="Edited",
+                                          value=f"[CONTINUED](https://discordapp.com/channels/{guild_id}"
+                                                f"/{second_message.channel.id}/{second_message.id})", inline=False)
+                    await first_message.edit(embed=first_embed)
+                    embed.set_field_at(0, name="Original",
+                                       value=f"[CONTINUED](https://discordapp.com/channels/{guild_id}"
+                                             f"/{first_message.channel.id}/{first_message.id})", inline=False)
+                    await second_message.edit(embed=second_embed)
 
     @Cog.listener('on_member_ban')
     async def on_member_ban(self, guild: discord.Guild, user: discord.User):
         """Logs raw member ban events, even if not banned via &ban"""
-        audit = await self.check_audit(guild, discord.AuditLogAction.ban)
+        audit = await self.audit_log.find(guild, discord.AuditLogAction.ban, user.id)
         embed = discord.Embed(title="User Banned", color=0xff6700)
         embed.set_thumbnail(url=user.display_avatar)
         embed.add_field(name="Banned user", value=f"{user}|({user.id})")
-        if audit and audit.target == user:
-            acton_member = await guild.fetch_member(audit.user.id)
-            embed.description = f"User banned by: {acton_member.mention}\n{acton_member}|({acton_member.id})"
+        if audit:
+            embed.description = f"User banned by: <@{audit.user_id}>\n{audit.user or 'Unknown user'}|({audit.user_id})"
             embed.add_field(name="Reason", value=audit.reason, inline=False)
-            embed.set_footer(text=f"Actor ID: {acton_member.id}\nTarget ID: {user.id}")
+            embed.set_footer(text=f"Actor ID: {audit.user_id}\nTarget ID: {user.id}")
         else:
             embed.description = "No audit log entry found"
             embed.set_footer(text=f"Actor ID: Unknown\nTarget ID: {user.id}")
@@ -385,7 +463,7 @@ class Actionlog(Cog):
         if message_log_channel is not None:
             channel = guild.get_channel(message_log_channel.messagelog_channel)
             if channel is not None:
-                await channel.send(embed=embed)
+                await self.bot.log_queue.put(channel, embed)
 
     @command()
     @has_permissions(administrator=True)
@@ -406,6 +484,28 @@ class Actionlog(Cog):
         `{prefix}messagelogconfig #orwellian-dystopia` - set a channel named #orwellian-dystopia to log message edits/deletions
         """
 
+    @command()
+    @has_permissions(administrator=True)
+    async def messagelogstore(self, ctx: DozerContext, enabled: bool):
+        """Store the content of messages sent in this server, so that edits and deletes of old messages can be logged in full.
+        Messages are kept for up to two weeks, and disabling this deletes every stored message."""
+        config = await GuildMessageLog.get_by(guild_id=ctx.guild.id)
+        if not config:
+            raise BadArgument(f"Set up message logs with `{ctx.prefix}messagelogconfig` first!")
+        config = config[0]
+        config.store_content = enabled
+        await config.update_or_add()
+        self.edit_delete_config.invalidate_entry(guild_id=ctx.guild.id)
+        if not enabled:
+            self.message_store.discard_guild(ctx.guild.id)
+            await self.message_store.purge([ctx.guild.id])
+        await ctx.send(f"{ctx.message.author.mention}, message content storage {'enabled' if enabled else 'disabled'}!")
+
+    messagelogstore.example_usage = """
+        `{prefix}messagelogstore on` - keep message content so edits and deletes of older messages can be logged
+        `{prefix}messagelogstore off` - stop storing message content and delete what was stored
+        """
+
     @group(invoke_without_command=True)
     @has_permissions(administrator=True)
     async def memberlogconfig(self, ctx: DozerContext):
@@ -448,6 +548,7 @@ class Actionlog(Cog):
             channel_id=channel.id
         )
         await config.update_or_add()
+        join_leave_config.invalidate_entry(guild_id=ctx.guild.id)
         e = discord.Embed(color=blurple)
         e.add_field(name='Success!', value=f"Join/Leave log channel has been set to {channel.mention}")
         e.set_footer(text='Triggered by ' + escape_markdown(ctx.author.display_name))
@@ -463,6 +564,7 @@ class Actionlog(Cog):
         else:
             config = [CustomJoinLeaveMessages(guild_id=ctx.guild.id, ping=True)]
         await config[0].update_or_add()
+        join_leave_config.invalidate_entry(guild_id=ctx.guild.id)
 
         e = discord.Embed(color=blurple)
         e.add_field(name='Success!', value=f"Ping on join is set to: {config[0].ping}")
@@ -479,6 +581,7 @@ class Actionlog(Cog):
         else:
             config = [CustomJoinLeaveMessages(guild_id=ctx.guild.id, send_on_verify=True)]
         await config[0].update_or_add()
+        join_leave_config.invalidate_entry(guild_id=ctx.guild.id)
 
         e = discord.Embed(color=blurple)
         e.add_field(name='Success!', value=f"Send on verify is set to: {config[0].send_on_verify}")
@@ -504,6 +607,7 @@ class Actionlog(Cog):
             )
             e.add_field(name='Success!', value="Join message has been set to default")
         await config.update_or_add()
+        join_leave_config.invalidate_entry(guild_id=ctx.guild.id)
         await ctx.send(embed=e)
 
     @memberlogconfig.command()
@@ -525,6 +629,7 @@ class Actionlog(Cog):
             )
             e.add_field(name='Success!', value="Leave message has been set to default")
         await config.update_or_add()
+        join_leave_config.invalidate_entry(guild_id=ctx.guild.id)
         await ctx.send(embed=e)
 
     @memberlogconfig.command()
@@ -538,6 +643,7 @@ class Actionlog(Cog):
             channel_id=CustomJoinLeaveMessages.nullify
         )
         await config.update_or_add()
+        join_leave_config.invalidate_entry(guild_id=ctx.guild.id)
         e.add_field(name='Success!', value="Join/Leave logs have been disabled")
         await ctx.send(embed=e)
 
@@ -649,14 +755,16 @@ class GuildMessageLog(db.DatabaseTable):
             CREATE TABLE {cls.__tablename__} (
             guild_id bigint PRIMARY KEY NOT NULL,
             name varchar NOT NULL,
-            messagelog_channel bigint NOT NULL
+            messagelog_channel bigint NOT NULL,
+            store_content boolean NOT NULL DEFAULT false
             )""")
 
-    def __init__(self, guild_id: int, name: str, messagelog_channel: int):
+    def __init__(self, guild_id: int, name: str, messagelog_channel: int, store_content: bool = None):
         super().__init__()
         self.guild_id = guild_id
         self.name = name
         self.messagelog_channel = messagelog_channel
+        self.store_content = store_content
 
     @classmethod
     async def get_by(cls, **kwargs):
@@ -664,10 +772,20 @@ class GuildMessageLog(db.DatabaseTable):
         result_list = []
         for result in results:
             obj = GuildMessageLog(guild_id=result.get("guild_id"), name=result.get("name"),
-                                  messagelog_channel=result.get("messagelog_channel"))
+                                  messagelog_channel=result.get("messagelog_channel"),
+                                  store_content=result.get("store_content"))
             result_list.append(obj)
         return result_list
 
+    async def version_1(self):
+        """DB migration v1"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            ALTER TABLE {self.__tablename__} ADD COLUMN IF NOT EXISTS store_content boolean NOT NULL DEFAULT false;
+            """)
+
+    __versions__ = [version_1]
+
 
 async def setup(bot):
     """Adds the actionlog cog to the bot."""
@@ -125,6 +125,24 @@ class Development(Cog):
     `{prefix}su cooldude#1234 {prefix}ping` - simulate cooldude sending `{prefix}ping`
     """
 
+    @command()
+    async def logqueue(self, ctx: DozerContext):
+        """Shows the state of the log queue: embeds queued and held for summaries, and messages sent, per channel."""
+        stats = self.bot.log_queue.stats()
+        e = discord.Embed(title="Log queue", color=discord.Color.blurple())
+        e.description = f"{self.bot.log_queue.depth()} queued, {self.bot.log_queue.held()} held for summaries"
+        busiest = sorted(stats.items(), key=lambda item: (item[1]["queued"] + item[1]["held"], item[1]["sent"]), reverse=True)
+        for channel_id, channel_stats in busiest[:25]:
+            channel = self.bot.get_channel(channel_id)
+            e.add_field(name=f"#{channel} ({channel.guild})" if channel else str(channel_id),
+                        value=f"{channel_stats['queued']} queued, {channel_stats['held']} held\n"
+                              f"{channel_stats['sent']} sent, {channel_stats['coalesced']} summarized")
+        await ctx.send(embed=e)
+
+    logqueue.example_usage = """
+    `{prefix}logqueue` - shows how backed up each log channel is
+    """
+
 
 def load_function(code: str, globals_, locals_):
     """Loads the user-evaluted code as a function so it can be executed."""
@@ -0,0 +1,242 @@
+"""Provides link scrubbing for Dozer: removing links posted by members who aren't allowed to post them."""
+import asyncio
+import collections
+
+import discord
+from discord.ext import commands
+from discord.ext.commands import BadArgument, has_permissions
+
+from dozer.context import DozerContext
+from ._utils import *
+from .general import blurple
+from .moderation import SafeRoleConverter
+from .. import db
+from ..Components.LinkScanner import ALLOWED, DENIED, DomainPolicy, normalize_domain, scan_hosts
+
+RECENT_CHECKS = 256
+
+
+class Links(Cog):
+    """
+    Removes links from members without the guild's link role. Domains can be allowed for everyone, or denied to everyone
+    but moderators, regardless of the link role.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        super().__init__(bot)
+        self.links_config = db.ConfigCache(GuildMessageLinks)
+        self.policies = {}
+        self.recent_checks = collections.OrderedDict()  # message_id -> task checking that message
+
+    async def get_policy(self, guild_id: int) -> DomainPolicy:
+        """Returns a guild's domain policy, loading it if it isn't cached"""
+        policy = self.policies.get(guild_id)
+        if policy is None:
+            entries = await GuildLinkDomains.get_by(guild_id=guild_id)
+            policy = self.policies[guild_id] = DomainPolicy(allowed=[entry.domain for entry in entries if entry.allowed],
+                                                            denied=[entry.domain for entry in entries if not entry.allowed])
+        return policy
+
+    async def _check_links_warn(self, msg: discord.Message, warning: str):
+        """Warns a user that they can't send links."""
+        warn_msg = await msg.channel.send(f"{msg.author.mention}, {warning}")
+        await asyncio.sleep(3)
+        await warn_msg.delete()
+
+    async def check_links(self, msg: discord.Message):
+        """Checks messages for the links role if necessary, then checks if the author is allowed to send links in the server"""
+        if msg.guild is None or not isinstance(msg.author, discord.Member) or msg.author.bot or \
+                not msg.guild.me.guild_permissions.manage_messages:
+            return False
+        hosts = scan_hosts(msg.content)
+        if not hosts:
+            return False
+        config = await self.links_config.query_one(guild_id=msg.guild.id)
+        role = msg.guild.get_role(config.role_id) if config is not None else None
+        policy = await self.get_policy(msg.guild.id)
+
+        warning = None
+        for host in hosts:
+            decision = policy.decide(host)
+            if decision is DENIED and not msg.channel.permissions_for(msg.author).manage_messages:
+                warning = f"links to `{host}` aren't allowed here!"
+                break
+            if decision is not ALLOWED and role is not None and role not in msg.author.roles:
+                warning = f"you need the `{role.name}` role to post links!"
+        if warning is None:
+            return False
+        await msg.delete()
+        self.bot.loop.create_task(self._check_links_warn(msg, warning))
+        return True
+
+    async def check_new_message(self, msg: discord.Message) -> bool:
+        """
+        Checks a new message for links once, however many listeners ask, returning whether it was deleted.
+        Other cogs use this to ignore messages that were scrubbed.
+        """
+        task = self.recent_checks.get(msg.id)
+        if task is None:
+            task = self.recent_checks[msg.id] = self.bot.loop.create_task(self.check_links(msg))
+            while len(self.recent_checks) > RECENT_CHECKS:
+                self.recent_checks.popitem(last=False)
+        return await asyncio.shield(task)
+
+    @Cog.listener('on_message')
+    async def on_message(self, message: discord.Message):
+        """Checks for links"""
+        await self.check_new_message(message)
+
+    @Cog.listener('on_message_edit')
+    async def on_message_edit(self, before: discord.Message, after: discord.Message):
+        """Checks for links"""
+        await self.check_links(after)
+
+    @command()
+    @has_permissions(administrator=True)
+    @bot_has_permissions(manage_messages=True)
+    async def linkscrubconfig(self, ctx: DozerContext, *, link_role: SafeRoleConverter):
+        """
+        Set a role that users must have in order to post links.
+        This accepts the safe default role conventions that the memberconfig command does.
+        """
+        if link_role >= ctx.author.top_role:
+            raise BadArgument('Link role cannot be higher than your top role!')
+
+        settings = await GuildMessageLinks.get_by(guild_id=ctx.guild.id)
+        if len(settings) == 0:
+            settings = GuildMessageLinks(guild_id=ctx.guild.id, role_id=link_role.id)
+        else:
+            settings = settings[0]
+            settings.role_id = link_role.id
+        await settings.update_or_add()
+        self.links_config.invalidate_entry(guild_id=ctx.guild.id)
+        await ctx.send(f'Link role set as `{link_role.name}`.')
+
+    linkscrubconfig.example_usage = """
+    `{prefix}linkscrubconfig Links` - set a role called "Links" as the link role
+    `{prefix}linkscrubconfig @everyone` - set the default role as the link role
+    `{prefix}linkscrubconfig everyone` - set the default role as the link role (ping-safe)
+    `{prefix}linkscrubconfig @ everyone` - set the default role as the link role (ping-safe)
+    `{prefix}linkscrubconfig @.everyone` - set the default role as the link role (ping-safe)
+    `{prefix}linkscrubconfig @/everyone` - set the default role as the link role (ping-safe)
+    """
+
+    @group(invoke_without_command=True)
+    @has_permissions(manage_messages=True)
+    async def linkdomains(self, ctx: DozerContext):
+        """Lists the domains that are allowed or denied in this server, regardless of the link role."""
+        entries = await GuildLinkDomains.get_by(guild_id=ctx.guild.id)
+        embed = discord.Embed(title=f"Link domains for {ctx.guild}", color=blurple)
+        for name, allowed in (("Allowed", True), ("Denied", False)):
+            domains = sorted(entry.domain for entry in entries if entry.allowed == allowed)
+            embed.add_field(name=name, value='\n'.join(f"`{domain}`" for domain in domains)[:1024] or "None", inline=False)
+        await ctx.send(embed=embed)
+
+    linkdomains.example_usage = """
+    `{prefix}linkdomains` - list the allowed and denied domains
+    `{prefix}linkdomains allow frc-events.firstinspires.org` - let everyone post links to FRC Events
+    `{prefix}linkdomains deny grabify.link` - remove links to grabify.link and its subdomains, even from members with the link role
+    `{prefix}linkdomains remove grabify.link` - go back to treating grabify.link like any other domain
+    """
+
+    async def _set_domain(self, ctx: DozerContext, domain: str, allowed: bool):
+        """Adds a domain to the allow or deny list"""
+        domain = normalize_domain(domain)
+        if not domain:
+            raise BadArgument("That isn't a domain")
+        await GuildLinkDomains(guild_id=ctx.guild.id, domain=domain, allowed=allowed).update_or_add()
+        self.policies.pop(ctx.guild.id, None)
+        await ctx.send(f"Links to `{domain}` are now {'allowed' if allowed else 'denied'}.")
+
+    @linkdomains.command()
+    @has_permissions(administrator=True)
+    async def allow(self, ctx: DozerContext, domain: str):
+        """Lets everyone post links to a domain and its subdomains, even without the link role."""
+        await self._set_domain(ctx, domain, allowed=True)
+
+    @linkdomains.command()
+    @has_permissions(administrator=True)
+    @bot_has_permissions(manage_messages=True)
+    async def deny(self, ctx: DozerContext, domain: str):
+        """Removes links to a domain and its subdomains from everyone but moderators, even members with the link role."""
+        await self._set_domain(ctx, domain, allowed=False)
+
+    @linkdomains.command()
+    @has_permissions(administrator=True)
+    async def remove(self, ctx: DozerContext, domain: str):
+        """Takes a domain off the allow or deny list."""
+        domain = normalize_domain(domain)
+        result = await GuildLinkDomains.delete(guild_id=ctx.guild.id, domain=domain)
+        self.policies.pop(ctx.guild.id, None)
+        if result == "DELETE 0":
+            await ctx.send(f"`{domain}` isn't on the allow or deny list.")
+        else:
+            await ctx.send(f"`{domain}` removed from the allow and deny lists.")
+
+
+class GuildMessageLinks(db.DatabaseTable):
+    """Contains information for link scrubbing"""
+    __tablename__ = 'guild_msg_links'
+    __uniques__ = 'guild_id'
+
+    @classmethod
+    async def initial_create(cls):
+        """Create the table in the database"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            CREATE TABLE {cls.__tablename__} (
+            guild_id bigint PRIMARY KEY NOT NULL,
+            role_id bigint null
+            )""")
+
+    def __init__(self, guild_id: int, role_id: int = None):
+        super().__init__()
+        self.guild_id = guild_id
+        self.role_id = role_id
+
+    @classmethod
+    async def get_by(cls, **kwargs):
+        results = await super().get_by(**kwargs)
+        result_list = []
+        for result in results:
+            obj = GuildMessageLinks(guild_id=result.get("guild_id"), role_id=result.get("role_id"))
+            result_list.append(obj)
+        return result_list
+
+
+class GuildLinkDomains(db.DatabaseTable):
+    """Domains a guild allows or denies links to, regardless of the link role"""
+    __tablename__ = 'guild_link_domains'
+    __uniques__ = 'guild_id, domain'
+
+    @classmethod
+    async def initial_create(cls):
+        """Create the table in the database"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            CREATE TABLE {cls.__tablename__} (
+            guild_id bigint NOT NULL,
+            domain varchar NOT NULL,
+            allowed boolean NOT NULL,
+            PRIMARY KEY (guild_id, domain)
+            )""")
+
+    def __init__(self, guild_id: int, domain: str, allowed: bool):
+        super().__init__()
+        self.guild_id = guild_id
+        self.domain = domain
+        self.allowed = allowed
+
+    @classmethod
+    async def get_by(cls, **kwargs):
+        results = await super().get_by(**kwargs)
+        result_list = []
+        for result in results:
+            obj = GuildLinkDomains(guild_id=result.get("guild_id"), domain=result.get("domain"), allowed=result.get("allowed"))
+            result_list.append(obj)
+        return result_list
+
+
+async def setup(bot):
+    """Adds the links cog to the bot"""
+    await bot.add_cog(Links(bot))
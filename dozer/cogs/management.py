@@ -1,6 +1,5 @@
 """General, basic commands that are common for Discord bots"""
 
-import asyncio
 import json
 import math
 import os
@@ -27,7 +26,6 @@ class Management(Cog):
     def __init__(self, bot: Dozer):
         super().__init__(bot)
         self.started_timers = False
-        self.timers = {}
         if os.path.isfile(TIMEZONE_FILE):
             logger.info("Loaded timezone configurations")
             with open(TIMEZONE_FILE) as f:
@@ -43,19 +41,24 @@ class Management(Cog):
         started = 0
         if not self.started_timers:
             for message in messages:
-                task = self.bot.loop.create_task(self.msg_timer(message))
-                self.timers[message.request_id] = task
+                self.schedule_msg(message)
                 started += 1
             self.started_timers = True
             logger.info(f"Started {started}/{len(messages)} scheduled messages")
         else:
             logger.info("Client Resumed: Timers still running")
 
+    @staticmethod
+    def msg_timer_key(request_id: int):
+        """The scheduler key of a scheduled message"""
+        return "scheduled_message", request_id
+
+    def schedule_msg(self, db_entry):
+        """Schedules a message to be sent at its requested time"""
+        self.bot.scheduler.schedule(self.msg_timer_key(db_entry.request_id), db_entry.time.timestamp(), self.msg_timer, db_entry)
+
     async def msg_timer(self, db_entry):
-        """Holds the futures for sending a message"""
-        delay = db_entry.time - datetime.now(tz=timezone.utc)
-        if delay.total_seconds() > 0:
-            await asyncio.sleep(delay.total_seconds())
+        """Called by the timer scheduler when a scheduled message is due"""
         await self.send_scheduled_msg(db_entry)
         await db_entry.delete(request_id=db_entry.request_id)
 
@@ -128,8 +131,7 @@ class Management(Cog):
         await entry.update_or_add()
         entries = await ScheduledMessages.get_by(request_id=entry.request_id)
         entry = entries[0]
-        task = self.bot.loop.create_task(self.msg_timer(entry))
-        self.timers[entry.request_id] = task
+        self.schedule_msg(entry)
         await ctx.send(f"Scheduled message(ID: {entry.entry_id}) saved, and will be sent in {channel.mention} on"
                        f" {send_time.strftime('%B %d %H:%M%z %Y')}\nMessage preview:")
         await self.send_scheduled_msg(entry, channel_override=ctx.message.channel.id)
@@ -146,8 +148,7 @@ class Management(Cog):
         e = discord.Embed(color=blurple)
         if len(entries) > 0:
             response = await ScheduledMessages.delete(request_id=entries[0].request_id)
-            task = self.timers.pop(entries[0].request_id)
-            task.cancel()
+            self.bot.scheduler.cancel(self.msg_timer_key(entries[0].request_id))
             if response.split(" ", 1)[1] == "1":
                 e.add_field(name='Success', value=f"Deleted entry with ID: {entry_id} and cancelled planned send")
                 e.set_footer(text='Triggered by ' + escape_markdown(ctx.author.display_name))
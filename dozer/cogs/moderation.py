@@ -5,6 +5,7 @@ import re
 import time
 import traceback
 import typing
+from collections import defaultdict
 from typing import Union
 
 import discord
@@ -17,13 +18,29 @@ from dozer.context import DozerContext
 from ._utils import *
 from .general import blurple
 from .. import db
-from ..Components.CustomJoinLeaveMessages import send_log, CustomJoinLeaveMessages
+from ..Components.CustomJoinLeaveMessages import send_log
+from ..Components.GuildNewMember import GuildNewMember, new_member_config
+from ..Components.MessagePruner import prune_messages
+from ..Components.ModerationCases import ModerationCase
+from ..Components.NewMemberIndex import NewMemberIndex
+from ..Components.OverwriteEngine import OverwriteEngine
+from ..Components.RateLimiter import RateLimiter, run_bounded
 
 __all__ = ["SafeRoleConverter", "Moderation", "NewMemPurgeConfig", "GuildNewMember"]
 
-from ..Components.TeamNumbers import TeamNumbers
-
 MAX_PURGE = 1000
+CASES_PER_PAGE = 8
+RESTORE_CONCURRENCY = 5  # Guilds resolved at once while restoring punishment timers
+CROSSBAN_CONCURRENCY = 5
+BAN_RATE = 10  # bans per second across all guilds, bans are bucketed per guild so the global limit is what binds
+NM_PURGE_CONCURRENCY = 5
+
+
+class CrossBanResult(typing.NamedTuple):
+    """The outcome of cross banning a user from one subscribed guild"""
+    guild: discord.Guild
+    banned: bool
+    error: typing.Optional[str] = None
 
 
 class SafeRoleConverter(RoleConverter):
@@ -45,13 +62,20 @@ class Moderation(Cog):
 
     def __init__(self, bot: commands.Bot):
         super().__init__(bot)
-        self.links_config = db.ConfigCache(GuildMessageLinks)
-        self.punishment_timer_tasks = []
+        self.modlog_config = db.ConfigCache(GuildModLog)
+        self.crossban_config = db.ConfigCache(CrossBanSubscriptions)
+        self.new_member_config = new_member_config  # shared with the join log, so invalidating here covers both
+        self.purge_config = db.ConfigCache(NewMemPurgeConfig)
+        self.unverified = NewMemberIndex()
+        self.ban_limiter = RateLimiter(BAN_RATE)
+        self.started_timers = False
+        self.overwrite_engine = OverwriteEngine(bot)
 
     """=== Helper functions ==="""
 
     async def nm_kick_internal(self, guild: discord.Guild = None):
-        """Kicks people who have not done the new member process within a set amount of time."""
+        """Kicks people who have not done the new member process within a set amount of time.
+        Only the members in the unverified index who joined before the guild's cutoff are looked at."""
         logger.debug("Starting nm_kick cycle...")
         if not guild:
             entries = await NewMemPurgeConfig.get_by()
@@ -62,24 +86,43 @@ class Moderation(Cog):
             guild = self.bot.get_guild(entry.guild_id)
             if guild is None:
                 continue
-            for mem in guild.members:
-                if guild.get_role(entry.member_role) not in mem.roles:
-                    delta = datetime.datetime.now() - mem.joined_at
-                    if delta.days >= entry.days:
-                        await mem.kick(reason="New member purge cycle")
-                        count += 1
+            role = guild.get_role(entry.member_role)
+            if role is None:
+                logger.warning(f"New member purge role {entry.member_role} no longer exists in guild {guild} ({guild.id})")
+                continue
+            if guild.id not in self.unverified:
+                self.unverified.rebuild(guild, role.id)
+            expired = [guild.get_member(member_id) for member_id in
+                       self.unverified.pop_expired(guild.id, time.time() - entry.days * 86400)]
+            targets = [member for member in expired if member is not None and member.get_role(role.id) is None]
+            results = await run_bounded(targets, lambda member: member.kick(reason="New member purge cycle"),
+                                        concurrency=NM_PURGE_CONCURRENCY, limiter=self.ban_limiter)
+            for member, result in zip(targets, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Failed to purge new member {member} ({member.id}) from {guild} ({guild.id}): {result}")
+                    self.unverified.add(member)  # back into the index, so the next cycle retries
+                else:
+                    count += 1
         return count
 
-    @discord.ext.tasks.loop(hours=168)
+    @discord.ext.tasks.loop(hours=1)
     async def nm_kick(self):
         """Kicks new members"""
         await self.nm_kick_internal()
 
+    async def _index_new_members(self):
+        """Builds the unverified member index for every guild with a new member purge configured"""
+        for entry in await NewMemPurgeConfig.get_by():
+            guild = self.bot.get_guild(entry.guild_id)
+            if guild is not None:
+                self.unverified.rebuild(guild, entry.member_role)
+
     async def mod_log(self, actor: discord.Member, action: str, target: Union[discord.User, discord.Member, None],
                       reason, orig_channel=None,
                       embed_color=discord.Color.red(), global_modlog: bool = True, duration: bool = None,
-                      dm: bool = True, guild_override: int = None, extra_fields=None, updated_by: discord.Member = None):
-        """Generates a modlog embed"""
+                      dm: bool = True, guild_override: int = None, extra_fields=None, updated_by: discord.Member = None,
+                      record_case: bool = True):
+        """Generates a modlog embed, and records the action as a moderation case unless record_case is False"""
 
         if target is None:
             title = "Custom Modlog"
@@ -99,6 +142,10 @@ class Moderation(Cog):
             modlog_embed.add_field(name="Updated by", value=f"{updated_by.mention} ({updated_by} | {updated_by.id})", inline=False)
         modlog_embed.add_field(name="Reason", value=reason or "No reason specified", inline=False)
         modlog_embed.timestamp = datetime.datetime.utcnow()
+        if target is not None and record_case:
+            case = await ModerationCase.record(actor.guild.id if guild_override is None else guild_override, actor.id, target.id,
+                                               action, reason, expires_at=discord.utils.utcnow() + duration if duration else None)
+            modlog_embed.set_footer(text=f"Case {case.case_id}")
         if extra_fields is not None:
             for field in extra_fields:
                 modlog_embed.add_field(name=field['name'], value=field['value'], inline=field['inline'])
@@ -125,54 +172,26 @@ class Moderation(Cog):
                 pass
             finally:
                 modlog_embed.remove_field(2)
-        modlog_channel = await GuildModLog.get_by(guild_id=actor.guild.id) if guild_override is None else \
-            await GuildModLog.get_by(guild_id=guild_override)
+        modlog_config = await self.modlog_config.query_one(guild_id=actor.guild.id if guild_override is None else guild_override)
         if orig_channel is not None:
             try:
                 await orig_channel.send(embed=modlog_embed)
             except discord.Forbidden:
                 await orig_channel.send(f"{target} was successfully {action} by {actor}!")
-        if len(modlog_channel) != 0:
+        if modlog_config is not None:
             if global_modlog:
                 channel = self.bot.get_guild(actor.guild.id if guild_override is None else guild_override). \
-                    get_channel(modlog_channel[0].modlog_channel)
+                    get_channel(modlog_config.modlog_channel)
                 if channel is not None and channel != orig_channel:  # prevent duplicate embeds
-                    try:
-                        await channel.send(embed=modlog_embed)
-                    except discord.Forbidden as e:
-                        logger.warning(
-                            f"Unable to send modlog in guild \"{channel.guild}\" ({channel.guild.id}) reason {e}")
+                    await self.bot.log_queue.put(channel, modlog_embed)
         else:
             if orig_channel is not None:
                 await orig_channel.send("Please configure modlog channel to enable modlog functionality")
 
-    async def perm_override(self, member: discord.Member, **overwrites):
-        """Applies the given overrides to the given member in their guild."""
-        logger.debug(f"Applying overrides to {member} ({member.id})")
-        overwrite_count = 0
-        guild = await self.bot.fetch_guild(member.guild.id)
-        channels = await guild.fetch_channels()
-        # For some reason guild.me is returning None only sometimes, so this is a workaround to get perm_overrides working
-        me = await guild.fetch_member(self.bot.user.id)
-        for channel in channels:
-            overwrite = channel.overwrites_for(member)
-            if channel.permissions_for(me).manage_roles:
-                overwrite.update(**overwrites)
-                try:
-                    await channel.set_permissions(target=member, overwrite=None if overwrite.is_empty() else overwrite)
-                    overwrite_count += 1
-                except discord.Forbidden as e:
-                    logger.error(
-                        f"Failed to catch missing perms in {channel} ({channel.id}) Guild: {channel.guild.id}; Error: {e}")
-                except discord.HTTPException as e:
-                    logger.error(
-                        f"Failed to catch discords horrid permissions system in "
-                        f"{channel} ({channel.id}) Guild: {channel.guild.id}; Error: {e}")
-                except Exception as e:
-                    logger.error(f"Failed to catch some unknown or unexpected error: {e}")
-            else:
-                logger.warning(f"Missing permissions to manage roles in {channel} ({channel.id})")
-        logger.debug(f"Applied {overwrite_count}/({len(channels)}) overrides to {member} ({member.id})")
+    async def perm_override(self, member: discord.Member, progress=None, **overwrites):
+        """Applies the given overrides to the given member in their guild. Any overrides still being applied to the member
+        are cancelled first, so lifting a punishment part way through applying it is safe."""
+        return await self.overwrite_engine.apply(member, progress=progress, **overwrites)
 
     hm_regex = re.compile(r"((?P<years>\d+)y)?((?P<months>\d+)M)?((?P<weeks>\d+)w)?((?P<days>\d+)d)?((?P<hours>\d+)h)?((?P<minutes>\d+)m)?(("
                           r"?P<seconds>\d+)s)?")
@@ -191,150 +210,157 @@ class Moderation(Cog):
         # Make sure it is a positive number, and it doesn't exceed the max 32-bit int
         return max(0, min(2147483647, val))
 
-    async def start_punishment_timers(self):
-        """Starts all punishment timers"""
-        q = await PunishmentTimerRecords.get_by()  # no filters: all
-        for r in q:
-            try:
-                guild = await self.bot.fetch_guild(r.guild_id)
-            except discord.NotFound:
-                logger.warning(f"Guild {r.guild_id} not found, skipping punishment timer")
-                continue
-            try:
-                actor = await guild.fetch_member(r.actor_id)
-            except discord.NotFound:
-                actor = None
-            try:
-                target = await guild.fetch_member(r.target_id)
-            except discord.NotFound:
-                logger.warning(f"Target {r.target_id} not found, skipping punishment timer")
-                continue
-            orig_channel = self.bot.get_channel(r.orig_channel_id)
-            punishment_type = r.type_of_punishment
-            reason = r.reason or ""
-            seconds = max(int(r.target_ts - time.time()), 0.01)
-            # await PunishmentTimerRecords.delete(id=r.id)
-            self.bot.loop.create_task(
-                self.punishment_timer(seconds, target, PunishmentTimerRecords.type_map[punishment_type], reason, actor,
-                                      orig_channel, timer_id=r.id))
-            logger.info(
-                f"Restarted {PunishmentTimerRecords.type_map[punishment_type].__name__} of {target} in {guild}")
-
-    async def restart_all_timers(self):
-        """Restarts all timers"""
-        logger.info("Restarting all timers")
-        for timer in self.punishment_timer_tasks:
-            # timer: asyncio.Task
-            logger.info(f"Stopping \"{timer.get_name()}\"")
-        for timer in self.punishment_timer_tasks:
-            timer.cancel()
-        self.punishment_timer_tasks = []
-        await self.start_punishment_timers()
+    def _describe_case(self, case: ModerationCase, show_target: bool = False):
+        """Renders a moderation case as the value of an embed field"""
+        lines = []
+        if show_target:
+            lines.append(f"<@{case.target_id}> ({self.bot.get_user(case.target_id) or 'Unknown user'} | {case.target_id})")
+        lines.append(("Self inflicted" if case.self_inflicted else f"By <@{case.actor_id}>") +
+                     f" <t:{round(case.created_at.timestamp())}:R>")
+        if case.expires_at is not None:
+            lines.append(f"Expires: <t:{round(case.expires_at.timestamp())}:R>")
+        reason = case.reason or "No reason specified"
+        lines.append(f"Reason: {reason if len(reason) <= 200 else reason[:200] + '...'}")
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _punishment_timer_key(guild_id: int, target_id: int, type_of_punishment: int):
+        """The scheduler key of a punishment timer. There is at most one timer per punishment type per member."""
+        return "punishment", guild_id, target_id, type_of_punishment
+
+    def _schedule_punishment(self, record):
+        """Schedules the expiry of a punishment timer record, replacing any pending timer for the same punishment"""
+        self.bot.scheduler.schedule(
+            self._punishment_timer_key(record.guild_id, record.target_id, record.type_of_punishment),
+            record.target_ts, self._punishment_expired, record)
+
+    def _cancel_punishment_timer(self, member: discord.Member, punishment):
+        """Cancels the pending expiry of a punishment, if there is one"""
+        self.bot.scheduler.cancel(self._punishment_timer_key(member.guild.id, member.id, punishment.type))
+
+    async def _start_punishment_timers(self):
+        """Loads all punishment timer records into the timer scheduler.
+        Guilds come from the gateway cache, and the members involved are resolved up front (cache first, batched member
+        queries for misses) so the timers don't have to go to the API when they expire."""
+        start = time.monotonic()
+        records_by_guild = defaultdict(list)
+        records = await PunishmentTimerRecords.get_by()  # no filters: all
+        for record in records:
+            records_by_guild[record.guild_id].append(record)
+
+        semaphore = asyncio.Semaphore(RESTORE_CONCURRENCY)
+
+        async def restore_guild(guild_id: int, guild_records: list):
+            async with semaphore:
+                guild = self.bot.get_guild(guild_id)
+                if guild is None:
+                    logger.warning(f"Guild {guild_id} not found, skipping {len(guild_records)} punishment timers")
+                    return 0
+                members = await resolve_members(guild, [r.target_id for r in guild_records] + [r.actor_id for r in guild_records])
+                for record in guild_records:
+                    if record.target_id not in members:
+                        logger.warning(f"Target {record.target_id} not found in {guild}, its punishment timer will be skipped on expiry")
+                    self._schedule_punishment(record)
+                return len(guild_records)
+
+        restored = await asyncio.gather(*(restore_guild(guild_id, guild_records)
+                                          for guild_id, guild_records in records_by_guild.items()))
+        logger.info(f"Restored {sum(restored)}/{len(records)} punishment timers across {len(records_by_guild)} guilds "
+                    f"in {time.monotonic() - start:.2f}s")
 
     async def punishment_timer(self, seconds: int, target: discord.Member, punishment, reason: str,
                                actor: discord.Member, orig_channel=None,
-                               global_modlog: bool = True, timer_id: int = None):
-        """Asynchronous task that sleeps for a set time to unmute/undeafen a member for a set period of time."""
-
-        # Add this task to the list of active timer tasks
-        asyncio.current_task().set_name(f"PunishmentTimer for {target}")
-        self.punishment_timer_tasks.append(asyncio.current_task())
+                               global_modlog: bool = True):
+        """Registers a timer record to unmute/undeafen a member after a set period of time, and schedules it."""
+        if seconds == 0:
+            return
 
         logger.info(f"Starting{' self' if not global_modlog else ''} {punishment.__name__} timer of \"{target}\" in \"{target.guild}\" will "
                     f"expire in {seconds} seconds")
-
-        if seconds == 0:
+        ent = PunishmentTimerRecords(
+            guild_id=target.guild.id,
+            actor_id=actor.id,
+            target_id=target.id,
+            orig_channel_id=orig_channel.id if orig_channel else 0,
+            type_of_punishment=punishment.type,
+            reason=reason,
+            target_ts=int(seconds + time.time()),
+            self_inflicted=not global_modlog
+        )
+        await ent.update_or_add()
+        self._schedule_punishment(ent)
+
+    async def _punishment_expired(self, record):
+        """Called by the timer scheduler when a punishment timer runs out, performs the un-punishment."""
+        punishment = PunishmentTimerRecords.type_map[record.type_of_punishment]
+        guild = self.bot.get_guild(record.guild_id)
+        if guild is None:
+            logger.warning(f"Guild {record.guild_id} not found, skipping {punishment.__name__} timer")
             return
-
-        if timer_id is None:
-            # register the timer
-            ent = PunishmentTimerRecords(
-                guild_id=target.guild.id,
-                actor_id=actor.id,
-                target_id=target.id,
-                orig_channel_id=orig_channel.id if orig_channel else 0,
-                type_of_punishment=punishment.type,
-                reason=reason,
-                target_ts=int(seconds + time.time()),
-                self_inflicted=not global_modlog
-            )
-            await ent.update_or_add()
-        else:
-            ent = (await PunishmentTimerRecords.get_by(id=timer_id))[0]
-            # seconds = max(int(ent.target_ts - time.time()), 0.01)
-
-        await asyncio.sleep(seconds)
+        members = await resolve_members(guild, (record.target_id, record.actor_id))
+        target = members.get(record.target_id)
+        if target is None:
+            # The member left; lift the punishment anyway so it isn't reapplied when they rejoin
+            logger.info(f"Target {record.target_id} of {punishment.__name__} timer not in \"{guild}\", "
+                        f"lifting the punishment without un-punishing")
+            try:
+                await punishment.delete(guild_id=guild.id, member_id=record.target_id)
+                await PunishmentTimerRecords.delete(guild_id=guild.id, target_id=record.target_id,
+                                                    type_of_punishment=punishment.type)
+            except Exception as e:
+                logger.error(f"Error while lifting {punishment.__name__} of {record.target_id} in {guild}, {e}")
+                logger.exception(e)
+            return
+        actor = members.get(record.actor_id) or guild.me
+        orig_channel = self.bot.get_channel(record.orig_channel_id)
+        global_modlog = not record.self_inflicted
         logger.info(f"Finished{' self' if not global_modlog else ''} {punishment.__name__} "
-                    f"timer of \"{target}\" in \"{target.guild}\", preforming un-punishment")
+                    f"timer of \"{target}\" in \"{guild}\", preforming un-punishment")
 
-        user = await punishment.get_by(member_id=target.id)
         try:
+            user = await punishment.get_by(guild_id=guild.id, member_id=target.id)
             if len(user) != 0:
                 await self.mod_log(actor=actor,
                                    action="un" + punishment.past_participle,
                                    target=target,
-                                   reason=reason,
+                                   reason=record.reason or "",
                                    orig_channel=orig_channel,
                                    embed_color=discord.Color.green(),
                                    global_modlog=global_modlog)
-                self.punishment_timer_tasks.remove(asyncio.current_task())
-                self.bot.loop.create_task(coro=punishment.finished_callback(self, target))
+                await punishment.finished_callback(self, target)
             else:
                 logger.warning(f"User {target} was not found in the {punishment.__name__} database, skipping un-punishment")
 
-            if ent:
-                await PunishmentTimerRecords.delete(guild_id=target.guild.id, target_id=target.id,
-                                                    type_of_punishment=punishment.type)
+            await PunishmentTimerRecords.delete(guild_id=guild.id, target_id=target.id,
+                                                type_of_punishment=punishment.type)
         except Exception as e:
-            logger.error(f"Error while un-punishing {target} in {target.guild}, {e}")
+            logger.error(f"Error while un-punishing {target} in {guild}, {e}")
             logger.exception(e)
 
-    async def _check_links_warn(self, msg: discord.Message, role: discord.Role):
-        """Warns a user that they can't send links."""
-        warn_msg = await msg.channel.send(f"{msg.author.mention}, you need the `{role.name}` role to post links!")
-        await asyncio.sleep(3)
-        await warn_msg.delete()
+    async def run_cross_ban(self, ctx: DozerContext, user: discord.User, reason: str, progress=None):
+        """Bans the user from every guild subscribed to the banning guild, several guilds at a time.
+        progress: optional callable, called with (done, total) as guilds finish
+        Returns a CrossBanResult for every subscribed guild the bot is in."""
+        subscriptions = await self.crossban_config.query_all(subscription_id=ctx.guild.id)
+        sub_guilds = [guild for guild in (self.bot.get_guild(sub.subscriber_id) for sub in subscriptions) if guild]
+        extra_fields = [{"name": "Origin Guild", "value": f"**{ctx.guild}** ({ctx.guild.id})", "inline": False}]
 
-    async def check_links(self, msg: discord.Message):
-        """Checks messages for the links role if necessary, then checks if the author is allowed to send links in the server"""
-        if msg.guild is None or not isinstance(msg.author,
-                                               discord.Member) or not msg.guild.me.guild_permissions.manage_messages:
-            return
-        config = await self.links_config.query_one(guild_id=msg.guild.id)
-        if config is None:
-            return
-        role = msg.guild.get_role(config.role_id)
-        if role is None:
-            return
-        if role not in msg.author.roles and re.search("https?://", msg.content):
-            await msg.delete()
-            self.bot.loop.create_task(self._check_links_warn(msg, role))
-            return True
-        return False
-
-    async def run_cross_ban(self, ctx: DozerContext, user: discord.User, reason: str):
-        """Checks for guilds that are subscribed to the banned members guild"""
-        subscriptions = await CrossBanSubscriptions.get_by(subscription_id=ctx.guild.id)
-        bans = []
-        for subscription in subscriptions:
-            sub_guild = self.bot.get_guild(subscription.subscriber_id)
-            if sub_guild:
-                modlog_channel = await GuildModLog.get_by(guild_id=sub_guild.id)
-                try:
-                    await sub_guild.ban(user, reason=f"User Cross Banned from \"{ctx.guild}\" for: {reason}")
-                    if modlog_channel:
-                        await self.mod_log(actor=ctx.message.author, action="crossbanned", target=user, reason=reason,
-                                           dm=False,
-                                           guild_override=sub_guild.id,
-                                           extra_fields=[
-                                               {"name": "Origin Guild", "value": f"**{ctx.guild}** ({ctx.guild.id})",
-                                                "inline": False}])
-                except discord.Forbidden:
-                    continue
-
-                bans.append(sub_guild)
-
-        return bans
+        async def cross_ban(sub_guild: discord.Guild):
+            try:
+                await sub_guild.ban(user, reason=f"User Cross Banned from \"{ctx.guild}\" for: {reason}")
+            except discord.Forbidden:
+                return CrossBanResult(sub_guild, False, "Missing permissions")
+            except discord.HTTPException as e:
+                return CrossBanResult(sub_guild, False, str(e)[:100])
+            if await self.modlog_config.query_one(guild_id=sub_guild.id):
+                await self.mod_log(actor=ctx.message.author, action="crossbanned", target=user, reason=reason, dm=False,
+                                   guild_override=sub_guild.id, extra_fields=extra_fields)
+            return CrossBanResult(sub_guild, True)
+
+        results = await run_bounded(sub_guilds, cross_ban, concurrency=CROSSBAN_CONCURRENCY, limiter=self.ban_limiter,
+                                    progress=progress)
+        return [result if isinstance(result, CrossBanResult) else CrossBanResult(guild, True, f"Modlog failed: {str(result)[:100]}")
+                for guild, result in zip(sub_guilds, results)]
 
     """=== context-free backend functions ==="""
 
@@ -350,9 +376,8 @@ class Moderation(Cog):
         results = await Mute.get_by(guild_id=member.guild.id, member_id=member.id)
         if results:
             await PunishmentTimerRecords.delete(target_id=member.id, guild_id=member.guild.id, type_of_punishment=Mute.type)
-            await self.restart_all_timers()
-            self.bot.loop.create_task(
-                self.punishment_timer(seconds, member, Mute, reason, actor or member.guild.me, orig_channel=orig_channel))
+            self._cancel_punishment_timer(member, Mute)
+            await self.punishment_timer(seconds, member, Mute, reason, actor or member.guild.me, orig_channel=orig_channel)
             return False  # member already muted, edit preexisting record
         else:
             user = Mute(member_id=member.id, guild_id=member.guild.id)
@@ -360,9 +385,8 @@ class Moderation(Cog):
             await self.perm_override(member, send_messages=False, add_reactions=False, speak=False, stream=False,
                                      create_public_threads=False, create_private_threads=False)
 
-            self.bot.loop.create_task(
-                self.punishment_timer(seconds, member, Mute, reason, actor or member.guild.me,
-                                      orig_channel=orig_channel))
+            await self.punishment_timer(seconds, member, Mute, reason, actor or member.guild.me,
+                                        orig_channel=orig_channel)
             return True
 
     async def _unmute(self, member: discord.Member):
@@ -372,9 +396,9 @@ class Moderation(Cog):
             await Mute.delete(member_id=member.id, guild_id=member.guild.id)
             await PunishmentTimerRecords.delete(target_id=member.id, guild_id=member.guild.id,
                                                 type_of_punishment=Mute.type)
+            self._cancel_punishment_timer(member, Mute)
             await self.perm_override(member, send_messages=None, add_reactions=None, speak=None, stream=None,
                                      create_public_threads=None, create_private_threads=None)
-            await self.restart_all_timers()
             return True
         else:
             return False  # member not muted
@@ -393,15 +417,13 @@ class Moderation(Cog):
         results = await Deafen.get_by(guild_id=member.guild.id, member_id=member.id)
         if results:
             await PunishmentTimerRecords.delete(target_id=member.id, guild_id=member.guild.id, type_of_punishment=Deafen.type)
-
-            await self.restart_all_timers()
-            self.bot.loop.create_task(
-                self.punishment_timer(seconds, member,
-                                      Deafen,
-                                      reason,
-                                      actor or member.guild.me,
-                                      orig_channel=orig_channel,
-                                      global_modlog=not self_inflicted))
+            self._cancel_punishment_timer(member, Deafen)
+            await self.punishment_timer(seconds, member,
+                                        Deafen,
+                                        reason,
+                                        actor or member.guild.me,
+                                        orig_channel=orig_channel,
+                                        global_modlog=not self_inflicted)
             return False
         else:
             user = Deafen(member_id=member.id, guild_id=member.guild.id, self_inflicted=self_inflicted)
@@ -410,13 +432,12 @@ class Moderation(Cog):
 
             if self_inflicted and seconds == 0:
                 seconds = 30  # prevent lockout in case of bad argument
-            self.bot.loop.create_task(
-                self.punishment_timer(seconds, member,
-                                      punishment=Deafen,
-                                      reason=reason,
-                                      actor=actor or member.guild.me,
-                                      orig_channel=orig_channel,
-                                      global_modlog=not self_inflicted))
+            await self.punishment_timer(seconds, member,
+                                        punishment=Deafen,
+                                        reason=reason,
+                                        actor=actor or member.guild.me,
+                                        orig_channel=orig_channel,
+                                        global_modlog=not self_inflicted)
             return True
 
     async def _undeafen(self, member: discord.Member):
@@ -426,7 +447,7 @@ class Moderation(Cog):
             await self.perm_override(member=member, read_messages=None)
             await PunishmentTimerRecords.delete(target_id=member.id, guild_id=member.guild.id,
                                                 type_of_punishment=Deafen.type)
-            await self.restart_all_timers()
+            self._cancel_punishment_timer(member, Deafen)
             await Deafen.delete(member_id=member.id, guild_id=member.guild.id)
             truths = [True, results[0].self_inflicted]
             return truths
@@ -438,12 +459,18 @@ class Moderation(Cog):
     @Cog.listener('on_ready')
     async def on_ready(self):
         """Restore punishment timers on bot startup and trigger the nm purge cycle"""
-        await self.start_punishment_timers()
-        await self.nm_kick.start()
+        if self.started_timers:
+            return  # Client resumed, the timers are still scheduled
+        self.started_timers = True
+        await self._start_punishment_timers()
+        await self._index_new_members()
+        self.nm_kick.start()
 
     @Cog.listener('on_member_join')
     async def on_member_join(self, member: discord.Member):
         """Logs that a member joined."""
+        if member.guild.id in self.unverified:
+            self.unverified.add(member)
         users = await Mute.get_by(guild_id=member.guild.id, member_id=member.id)
         if users:
             await self.perm_override(member, add_reactions=False, send_messages=False)
@@ -451,43 +478,57 @@ class Moderation(Cog):
         if users:
             await self.perm_override(member, read_messages=False)
 
+    @Cog.listener('on_member_remove')
+    async def on_member_remove(self, member: discord.Member):
+        """Drops members who left from the new member purge index"""
+        self.unverified.discard(member.guild.id, member.id)
+
+    @Cog.listener('on_guild_channel_update')
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        """Lets the overwrite engine know the cache has caught up with its edits of a channel"""
+        self.overwrite_engine.channel_updated(after)
+
+    @Cog.listener('on_guild_channel_delete')
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """Drops the overwrite engine's record of edits to a deleted channel"""
+        self.overwrite_engine.channel_updated(channel)
+
+    @Cog.listener('on_member_update')
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        """Keeps the new member purge index in step with roles given or taken by hand"""
+        if after.guild.id not in self.unverified or before.roles == after.roles:
+            return
+        config = await self.purge_config.query_one(guild_id=after.guild.id)
+        if config is None:
+            return
+        if after.get_role(config.member_role) is not None:
+            self.unverified.discard(after.guild.id, after.id)
+        elif before.get_role(config.member_role) is not None:
+            self.unverified.add(after)
+
     @Cog.listener('on_message')
     async def on_message(self, message: discord.Message):
         """Check things when messages come in."""
         if message.author.bot or message.guild is None or not message.guild.me.guild_permissions.manage_roles:
             return
-        if await self.check_links(message):
+        config = await self.new_member_config.query_one(guild_id=message.guild.id)
+        # Everything up to here is served from memory, only an actual verification touches the database
+        if config is None or message.channel.id != config.channel_id or config.message not in message.content.casefold():
+            return
+        links = self.bot.get_cog("Links")
+        if links is not None and await links.check_new_message(message):
+            return  # the message was removed for its links, so it doesn't count
+        state = await GuildNewMember.verification_state(message.guild.id, message.author.id)
+        if config.require_team and not state['has_team']:
+            ctx = await self.bot.get_context(message)
+            prefix = ctx.prefix if ctx.prefix is not None else self.bot.config['prefix']
+            await message.reply(f"You must set a team number first. ex: `{prefix}setteam frc 0`")
             return
-        config = await GuildNewMember.get_by(guild_id=message.guild.id)
-        ctx = await self.bot.get_context(message)
-        if len(config) != 0:
-            config = config[0]
-            string = config.message
-            content = message.content.casefold()
-            if string not in content:
-                return
-            channel = config.channel_id
-            role_id = config.role_id
-            if message.channel.id != channel:
-                return
-            if config.require_team:
-                teams = await TeamNumbers.get_by(user_id=message.author.id)
-                if len(teams) == 0:
-                    if ctx.prefix is None:
-                        ctx.prefix = self.bot.config['prefix']
-                    await message.reply(f"You must set a team number first. ex: `{ctx.prefix}setteam frc 0`")
-                    return
-
-            custom_log_config = await CustomJoinLeaveMessages.get_by(guild_id=message.guild.id)
-
-            await message.author.add_roles(message.guild.get_role(role_id))
-            if len(custom_log_config) > 0 and custom_log_config[0].send_on_verify:
-                await send_log(member=message.author)
 
-    @Cog.listener('on_message_edit')
-    async def on_message_edit(self, before: discord.Message, after: discord.Message):
-        """Checks for links"""
-        await self.check_links(after)
+        await message.author.add_roles(message.guild.get_role(config.role_id))
+        self.unverified.discard(message.guild.id, message.author.id)
+        if state['send_on_verify']:
+            await send_log(member=message.author, log_queue=self.bot.log_queue)
 
     """=== Direct moderation commands ==="""
 
@@ -585,19 +626,25 @@ class Moderation(Cog):
                 return message.author == target
 
         try:
-            msg = await ctx.message.channel.fetch_message(num)
-            deleted = await ctx.message.channel.purge(after=msg, limit=MAX_PURGE, check=check_target)
-            await ctx.send(
-                f"Deleted {len(deleted)} messages under request of {ctx.message.author.mention}",
-                delete_after=5)
+            after = await ctx.message.channel.fetch_message(num)
         except discord.NotFound:
+            after = None
             if num > MAX_PURGE:
                 await ctx.send("Message cannot be found or you're trying to purge too many messages.")
                 return
-            deleted = await ctx.message.channel.purge(limit=num + 1, check=check_target)
-            await ctx.send(
-                f"Deleted {len(deleted) - 1} messages under request of {ctx.message.author.mention}",
-                delete_after=5)
+        # Messages sent once the prune has started, like its own progress message, are left alone
+        before = discord.Object(discord.utils.time_snowflake(discord.utils.utcnow(), high=True))
+        progress = ProgressMessage(ctx, f"Pruning #{ctx.channel}", template="Deleted {done} of the {total} messages checked")
+        deleted = await prune_messages(ctx.channel, limit=MAX_PURGE if after else num + 1, after=after, before=before,
+                                       check=check_target, progress=progress.update)
+        if after is None and ctx.interaction is None and check_target(ctx.message):
+            deleted -= 1  # Don't count the command message
+        summary = f"Deleted {deleted} messages under request of {ctx.message.author.mention}"
+        await progress.finish(summary)
+        if progress.message is not None:
+            await progress.message.delete(delay=5)
+        else:
+            await ctx.send(summary, delete_after=5)
 
     prune.example_usage = """
     `{prefix}prune 10` - Delete the last 10 messages in the current channel.
@@ -609,55 +656,49 @@ class Moderation(Cog):
     @has_permissions(manage_roles=True)
     async def punishments(self, ctx: DozerContext):
         """List currently active mutes and deafens in a guild"""
-        punishments = await PunishmentTimerRecords.get_by(guild_id=ctx.guild.id)
-        deafen_records = await Deafen.get_by(guild_id=ctx.guild.id)
-        self_inflicted = [record.member_id for record in deafen_records if record.self_inflicted]
-        deafens = [punishment for punishment in punishments if
-                   punishment.type_of_punishment == 2 and punishment.target_id not in self_inflicted]
-        self_deafens = [punishment for punishment in punishments if
-                        punishment.type_of_punishment == 2 and punishment.target_id in self_inflicted]
-        mutes = [punishment for punishment in punishments if punishment.type_of_punishment == 1]
-        embed = discord.Embed(title=f"Active punishments in {ctx.guild}", color=blurple)
-        embed.set_footer(text='Triggered by ' + ctx.author.display_name)
-
-        def get_mention(target_id):
-            member = ctx.guild.get_member(target_id)
-            if member:
-                return member.mention
-            else:
-                return "**Member left**"
+        counts = await ModerationCase.active_counts(ctx.guild.id)
+        summary = (f"Deafens - {counts.get(('deafened', False), 0)} | Mutes - {counts.get(('muted', False), 0)} | "
+                   f"Self Deafens - {counts.get(('deafened', True), 0)}")
 
-        def get_name(target_id):
-            user = ctx.bot.get_user(target_id)
-            if user:
-                return user
-            else:
-                return "**Unknown#NONE**"
-
-        for field_number, punishments in enumerate(chunk(deafens, 3)):
-            embed.add_field(name=f"Deafens - {len(deafens)}", value='\n-\n'.join(
-                f"{get_mention(punishment.target_id)} ({get_name(punishment.target_id)} | {punishment.target_id}) "
-                f"\nExpires: <t:{round(punishment.target_ts)}:R> Reason: {punishment.reason}"
-                for punishment in punishments) or 'None', inline=False)
-
-        for field_number, punishments in enumerate(chunk(mutes, 3)):
-            embed.add_field(name=f"Mutes - {len(mutes)}", value='\n-\n'.join(
-                f"{get_mention(punishment.target_id)} ({get_name(punishment.target_id)} | {punishment.target_id}) "
-                f"\nExpires: <t:{round(punishment.target_ts)}:R> Reason: {punishment.reason}"
-                for punishment in punishments) or 'None', inline=False)
-
-        for field_number, punishments in enumerate(chunk(self_deafens, 3)):
-            embed.add_field(name=f"Self Deafens - {len(self_deafens)}", value='\n-\n'.join(
-                f"{get_mention(punishment.target_id)} ({get_name(punishment.target_id)} | {punishment.target_id}) "
-                f"\nExpires: <t:{round(punishment.target_ts)}:R> Reason: {punishment.reason}"
-                for punishment in punishments) or 'None', inline=False)
+        async def get_page(after_case_id):
+            cases = await ModerationCase.active_page(ctx.guild.id, after_case_id or 0, limit=CASES_PER_PAGE + 1)
+            embed = discord.Embed(title=f"Active punishments in {ctx.guild}", description=summary, color=blurple)
+            embed.set_footer(text='Triggered by ' + ctx.author.display_name)
+            for case in cases[:CASES_PER_PAGE]:
+                embed.add_field(name=f"{'Self deafen' if case.self_inflicted else case.action.capitalize()} - Case {case.case_id}",
+                                value=self._describe_case(case, show_target=True), inline=False)
+            return embed, cases[CASES_PER_PAGE - 1].case_id if len(cases) > CASES_PER_PAGE else None
 
-        await ctx.send(embed=embed)
+        await paginate_lazily(ctx, get_page)
 
     punishments.example_usage = """
     `{prefix}punishments:` Lists currently active punishments in current guild
     """
 
+    @command()
+    @guild_only()
+    @has_permissions(kick_members=True)
+    async def history(self, ctx: DozerContext, member: discord.User):
+        """List the moderation cases of a member in this guild, newest first"""
+
+        async def get_page(before):
+            cases = await ModerationCase.history_page(ctx.guild.id, member.id, before, limit=CASES_PER_PAGE + 1)
+            embed = discord.Embed(title=f"Moderation history of {member}", color=blurple)
+            embed.set_footer(text='Triggered by ' + ctx.author.display_name)
+            if not cases:
+                embed.description = "No cases found"
+            for case in cases[:CASES_PER_PAGE]:
+                embed.add_field(name=f"Case {case.case_id} - {case.action.capitalize() or 'Logged'}"
+                                     f"{' (active)' if case.active else ''}",
+                                value=self._describe_case(case), inline=False)
+            return embed, cases[CASES_PER_PAGE - 1] if len(cases) > CASES_PER_PAGE else None
+
+        await paginate_lazily(ctx, get_page)
+
+    history.example_usage = """
+    `{prefix}history @user`: Lists every warning, mute, kick, ban and so on @user has received in this guild
+    """
+
     @command()
     @has_permissions(ban_members=True)
     @bot_has_permissions(ban_members=True)
@@ -668,14 +709,22 @@ class Moderation(Cog):
             orig_channel = ctx.interaction.followup if ctx.interaction else ctx.channel
             await self.mod_log(actor=ctx.author, action="banned", target=user_mention, reason=reason,
                                orig_channel=orig_channel, dm=False)
-            cross_guilds = await self.run_cross_ban(ctx, user_mention, reason)
+            progress = ProgressMessage(ctx, f"Cross banning {user_mention}")
+            results = await self.run_cross_ban(ctx, user_mention, reason, progress=progress.update)
+            banned = [result for result in results if result.banned]
+            failed = [result for result in results if not result.banned]
+            await progress.finish(f"Cross banned from {len(banned)}/{len(results)} subscribed guilds")
             extra_fields = [{"name": "Origin Guild", "value": f"**{ctx.guild}** ({ctx.guild.id})", "inline": False}]
-            for field_number, guilds in enumerate(chunk(cross_guilds, 10)):
+            for field_number, guilds in enumerate(chunk(banned, 10)):
                 extra_fields.append(
-                    {"name": "Cross Banned From", "value": '\n'.join(f"**{guild}** ({guild.id})" for guild in guilds),
+                    {"name": "Cross Banned From", "value": '\n'.join(f"**{r.guild}** ({r.guild.id})" for r in guilds),
                      "inline": False})
+            for field_number, guilds in enumerate(chunk(failed, 10)):
+                extra_fields.append(
+                    {"name": "Cross Ban Failed In",
+                     "value": '\n'.join(f"**{r.guild}** ({r.guild.id}): {r.error}" for r in guilds), "inline": False})
             await self.mod_log(actor=ctx.author, action="banned", target=user_mention, reason=reason, global_modlog=False,
-                               extra_fields=extra_fields, orig_channel=ctx.channel)
+                               extra_fields=extra_fields, orig_channel=ctx.channel, record_case=False)
         except Exception as e:
             await ctx.send(f"A modlog exception occurred: {e}, user was still banned.")
         await ctx.guild.ban(user_mention, reason=reason)
@@ -866,6 +915,7 @@ class Moderation(Cog):
         else:
             config = GuildModLog(guild_id=ctx.guild.id, modlog_channel=channel_mentions.id, name=ctx.guild.name)
         await config.update_or_add()
+        self.modlog_config.invalidate_entry(guild_id=ctx.guild.id)
         await ctx.send(ctx.message.author.mention + ', modlog settings configured!')
 
     modlogconfig.example_usage = """
@@ -877,19 +927,20 @@ class Moderation(Cog):
     async def verifymember(self, ctx, member: discord.Member):
         """Command to verify a member who may not have a team number set, or who hasn't sent the required
         verification message. """
-        config = await GuildNewMember.get_by(guild_id=ctx.guild.id)
-        if len(config) != 0:
-            role_id = config[0].role_id
+        config = await self.new_member_config.query_one(guild_id=ctx.guild.id)
+        if config is not None:
+            role_id = config.role_id
             role = ctx.guild.get_role(role_id)
             if role in member.roles:
                 await ctx.send("Member is already verified. ")
                 return
 
             await member.add_roles(role)
+            self.unverified.discard(ctx.guild.id, member.id)
 
-            custom_join_config = await CustomJoinLeaveMessages.get_by(guild_id=member.guild.id)
-            if custom_join_config[0].send_on_verify:
-                await send_log(member=member)
+            state = await GuildNewMember.verification_state(member.guild.id, member.id)
+            if state['send_on_verify']:
+                await send_log(member=member, log_queue=self.bot.log_queue)
             await ctx.send(f"Member verified on request of {ctx.author.display_name}")
 
     @command()
@@ -909,6 +960,7 @@ class Moderation(Cog):
             config = GuildNewMember(guild_id=ctx.guild.id, channel_id=channel_mention.id, role_id=role.id,
                                     message=message.casefold(), require_team=requireteam)
         await config.update_or_add()
+        self.new_member_config.invalidate_entry(guild_id=ctx.guild.id)
 
         role_name = role.name
         # this should be an embed or something else entirely
@@ -927,6 +979,8 @@ class Moderation(Cog):
         """Sets the config for the new members purge"""
         config = NewMemPurgeConfig(guild_id=ctx.guild.id, member_role=role.id, days=days)
         await config.update_or_add()
+        self.purge_config.invalidate_entry(guild_id=ctx.guild.id)
+        self.unverified.rebuild(ctx.guild, role.id)
 
         await ctx.send("Settings saved!")
 
@@ -962,36 +1016,6 @@ class Moderation(Cog):
     `{prefix}memberconfig @/everyone` - set the default role as the member role (ping-safe)
     """
 
-    @command()
-    @has_permissions(administrator=True)
-    @bot_has_permissions(manage_messages=True)
-    async def linkscrubconfig(self, ctx: DozerContext, *, link_role: SafeRoleConverter):
-        """
-        Set a role that users must have in order to post links.
-        This accepts the safe default role conventions that the memberconfig command does.
-        """
-        if link_role >= ctx.author.top_role:
-            raise BadArgument('Link role cannot be higher than your top role!')
-
-        settings = await GuildMessageLinks.get_by(guild_id=ctx.guild.id)
-        if len(settings) == 0:
-            settings = GuildMessageLinks(guild_id=ctx.guild.id, role_id=link_role.id)
-        else:
-            settings = settings[0]
-            settings.role_id = link_role.id
-        await settings.update_or_add()
-        self.links_config.invalidate_entry(guild_id=ctx.guild.id)
-        await ctx.send(f'Link role set as `{link_role.name}`.')
-
-    linkscrubconfig.example_usage = """
-    `{prefix}linkscrubconfig Links` - set a role called "Links" as the link role
-    `{prefix}linkscrubconfig @everyone` - set the default role as the link role
-    `{prefix}linkscrubconfig everyone` - set the default role as the link role (ping-safe)
-    `{prefix}linkscrubconfig @ everyone` - set the default role as the link role (ping-safe)
-    `{prefix}linkscrubconfig @.everyone` - set the default role as the link role (ping-safe)
-    `{prefix}linkscrubconfig @/everyone` - set the default role as the link role (ping-safe)
-    """
-
     @command()
     @has_permissions(manage_messages=True)
     @bot_has_permissions(send_messages=True)
@@ -1010,8 +1034,8 @@ class Moderation(Cog):
     @has_permissions(manage_messages=True)
     async def crossbans(self, ctx: DozerContext):
         """Cross ban"""
-        subscriptions = await CrossBanSubscriptions.get_by(subscriber_id=ctx.guild.id)
-        subscribers = await CrossBanSubscriptions.get_by(subscription_id=ctx.guild.id)
+        subscriptions = await self.crossban_config.query_all(subscriber_id=ctx.guild.id)
+        subscribers = await self.crossban_config.query_all(subscription_id=ctx.guild.id)
         embed = discord.Embed(title="Cross ban subscriptions", color=blurple)
         for field_number, target_ids in enumerate(chunk(subscriptions, 10)):
             embed.add_field(name='Subscriptions',
@@ -1044,6 +1068,8 @@ class Moderation(Cog):
                 subscription_id=guild.id
             )
             await subscription.update_or_add()
+            self.crossban_config.invalidate_entry(subscriber_id=ctx.guild.id)
+            self.crossban_config.invalidate_entry(subscription_id=guild.id)
             embed = discord.Embed(title='Success!',
                                   description=f"**{ctx.guild}** is now subscribed to receive crossbans from **{guild}**",
                                   color=blurple)
@@ -1061,6 +1087,8 @@ class Moderation(Cog):
             subscriber_id=ctx.guild.id,
             subscription_id=guild_id
         )
+        self.crossban_config.invalidate_entry(subscriber_id=ctx.guild.id)
+        self.crossban_config.invalidate_entry(subscription_id=guild_id)
 
         if int(result.split(" ", 1)[1]) > 0:
             guild = self.bot.get_guild(guild_id)
@@ -1290,82 +1318,6 @@ class NewMemPurgeConfig(db.DatabaseTable):
         return result_list
 
 
-class GuildNewMember(db.DatabaseTable):
-    """Holds new member info"""
-    __tablename__ = 'new_members'
-    __uniques__ = 'guild_id'
-
-    @classmethod
-    async def initial_create(cls):
-        """Create the table in the database"""
-        async with db.Pool.acquire() as conn:
-            await conn.execute(f"""
-            CREATE TABLE {cls.__tablename__} (
-            guild_id bigint PRIMARY KEY,
-            channel_id bigint NOT NULL,
-            role_id bigint NOT NULL,
-            message varchar NOT NULL
-            )""")
-
-    def __init__(self, guild_id: int, channel_id: int, role_id: int, message: str, require_team: bool):
-        super().__init__()
-        self.guild_id = guild_id
-        self.channel_id = channel_id
-        self.role_id = role_id
-        self.message = message
-        self.require_team = require_team
-
-    @classmethod
-    async def get_by(cls, **kwargs):
-        results = await super().get_by(**kwargs)
-        result_list = []
-        for result in results:
-            obj = GuildNewMember(guild_id=result.get("guild_id"), channel_id=result.get("channel_id"),
-                                 role_id=result.get("role_id"), message=result.get("message"),
-                                 require_team=result.get("require_team"))
-            result_list.append(obj)
-        return result_list
-
-    async def version_1(self):
-        """DB migration v1"""
-        async with db.Pool.acquire() as conn:
-            await conn.execute(f"""
-            ALTER TABLE {self.__tablename__} ADD require_team bool NOT NULL DEFAULT false;
-            """)
-
-    __versions__ = [version_1]
-
-
-class GuildMessageLinks(db.DatabaseTable):
-    """Contains information for link scrubbing"""
-    __tablename__ = 'guild_msg_links'
-    __uniques__ = 'guild_id'
-
-    @classmethod
-    async def initial_create(cls):
-        """Create the table in the database"""
-        async with db.Pool.acquire() as conn:
-            await conn.execute(f"""
-            CREATE TABLE {cls.__tablename__} (
-            guild_id bigint PRIMARY KEY NOT NULL,
-            role_id bigint null
-            )""")
-
-    def __init__(self, guild_id: int, role_id: int = None):
-        super().__init__()
-        self.guild_id = guild_id
-        self.role_id = role_id
-
-    @classmethod
-    async def get_by(cls, **kwargs):
-        results = await super().get_by(**kwargs)
-        result_list = []
-        for result in results:
-            obj = GuildMessageLinks(guild_id=result.get("guild_id"), role_id=result.get("role_id"))
-            result_list.append(obj)
-        return result_list
-
-
 class PunishmentTimerRecords(db.DatabaseTable):
     """Punishment Timer Records"""
     type_map = {p.type: p for p in (Mute, Deafen)}
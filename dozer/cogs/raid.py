@@ -0,0 +1,184 @@
+"""Provides raid cleanup commands for Dozer, acting on every member caught by a set of filters at once."""
+import datetime
+import io
+import re
+import typing
+
+import discord
+from discord.ext import commands
+from discord.ext.commands import BadArgument, has_permissions, guild_only
+
+from dozer.context import DozerContext
+from ._utils import *
+from .general import blurple
+from ..Components.ModerationCases import ModerationCase
+from ..Components.RaidSelector import RaidCriteria, compile_name_pattern, members_csv, select_members
+from ..Components.RateLimiter import run_bounded
+
+MAX_RAID_TARGETS = 1000
+RAID_CONCURRENCY = 5
+PREVIEW_LIMIT = 20
+
+
+class RaidFilters(commands.FlagConverter, delimiter=':', prefix=''):
+    """The filters raid commands select members by"""
+    joined: typing.Optional[str] = commands.flag(default=None, description="Members who joined within this long, e.g. 15m")
+    age: typing.Optional[str] = commands.flag(default=None, description="Members whose account is younger than this, e.g. 2d")
+    name: typing.Optional[str] = commands.flag(default=None, description="A regex matched against usernames and nicknames")
+    reason: str = commands.flag(default="Raid cleanup", description="The reason recorded in the modlog and audit log")
+
+
+class Raid(Cog):
+    """Commands for cleaning up after a raid by banning or kicking every member caught by a set of filters."""
+
+    @property
+    def moderation(self):
+        """The moderation cog, which owns the modlog configuration and the ban rate limit"""
+        return self.bot.get_cog("Moderation")
+
+    def _duration(self, value: typing.Optional[str]):
+        """Parses a duration filter"""
+        if value is None:
+            return None
+        seconds = self.moderation.hm_to_seconds(value)
+        if not seconds:
+            raise BadArgument(f"`{value}` is not a duration, use something like `15m` or `1d12h`")
+        return datetime.timedelta(seconds=seconds)
+
+    def select(self, ctx: DozerContext, filters: RaidFilters):
+        """Works out the criteria given by the filters, and the members of the guild they select.
+        Members the invoker or the bot can't act on because of the role hierarchy are left out."""
+        try:
+            name_pattern = compile_name_pattern(filters.name) if filters.name else None
+        except re.error as err:
+            raise BadArgument(f"Invalid RegEx! ```{err.msg}```")
+        criteria = RaidCriteria(joined_within=self._duration(filters.joined), account_age=self._duration(filters.age),
+                                name_pattern=name_pattern)
+        if criteria.is_empty():
+            raise BadArgument("At least one of `joined`, `age` or `name` is required")
+        guild = ctx.guild
+
+        def protected(member: discord.Member):
+            if member == guild.owner or member.top_role >= guild.me.top_role:
+                return True
+            return ctx.author != guild.owner and member.top_role >= ctx.author.top_role
+
+        return criteria, select_members(guild.members, criteria, exclude=protected)
+
+    async def raid_log(self, ctx: DozerContext, action: str, criteria: RaidCriteria, reason: str, rows: list):
+        """Posts one modlog entry for a whole raid cleanup, with what happened to each member attached as a CSV"""
+        failed = sum(1 for _, result in rows if result != action)
+        embed = discord.Embed(title=f"Raid cleanup: {len(rows) - failed} members {action}!", color=discord.Color.red())
+        embed.add_field(name="Performed by", value=f"{ctx.author.mention} ({ctx.author} | {ctx.author.id})", inline=False)
+        embed.add_field(name="Reason", value=reason, inline=False)
+        embed.add_field(name="Criteria", value=criteria.describe(), inline=False)
+        embed.add_field(name="Members selected", value=len(rows))
+        embed.add_field(name="Failed", value=failed)
+        embed.timestamp = discord.utils.utcnow()
+        data = members_csv(rows)
+        filename = f"raid-{ctx.guild.id}-{int(embed.timestamp.timestamp())}.csv"
+
+        await ctx.send(embed=embed, file=discord.File(io.BytesIO(data), filename))
+        modlog_config = await self.moderation.modlog_config.query_one(guild_id=ctx.guild.id)
+        if modlog_config is None:
+            await ctx.send("Please configure modlog channel to enable modlog functionality")
+            return
+        channel = ctx.guild.get_channel(modlog_config.modlog_channel)
+        if channel is not None and channel != ctx.channel:
+            try:
+                await channel.send(embed=embed, file=discord.File(io.BytesIO(data), filename))
+            except discord.HTTPException as e:
+                await ctx.send(f"Failed to send the raid cleanup to the modlog: `{e}`")
+
+    async def mass_action(self, ctx: DozerContext, filters: RaidFilters, action: str, func):
+        """Runs `await func(member, audit_reason)` for every selected member, a bounded number at a time, then logs it all"""
+        await ctx.defer()
+        criteria, targets = self.select(ctx, filters)
+        if not targets:
+            await ctx.send("No members match those filters.")
+            return
+        if len(targets) > MAX_RAID_TARGETS:
+            await ctx.send(f"Those filters match {len(targets)} members, more than the limit of {MAX_RAID_TARGETS}. "
+                           f"Narrow them down and try again.")
+            return
+        audit_reason = f"{filters.reason} (raid cleanup by {ctx.author} | {ctx.author.id})"
+        progress = ProgressMessage(ctx, f"Raid cleanup: {len(targets)} members")
+        results = await run_bounded(targets, lambda member: func(member, audit_reason), concurrency=RAID_CONCURRENCY,
+                                    limiter=self.moderation.ban_limiter, progress=progress.update)
+        rows = [(member, f"failed: {result}" if isinstance(result, Exception) else action)
+                for member, result in zip(targets, results)]
+        done = [member.id for member, result in rows if result == action]
+        await progress.finish(f"{len(done)}/{len(targets)} members {action}")
+        await ModerationCase.record_many(ctx.guild.id, ctx.author.id, done, action, filters.reason)
+        await self.raid_log(ctx, action, criteria, filters.reason, rows)
+
+    @group(invoke_without_command=True)
+    @guild_only()
+    @has_permissions(kick_members=True)
+    async def raid(self, ctx: DozerContext, *, filters: RaidFilters):
+        """Shows which members the raid commands would act on with the given filters, without acting on them."""
+        criteria, targets = self.select(ctx, filters)
+        embed = discord.Embed(title=f"{len(targets)} members match", color=blurple)
+        embed.add_field(name="Criteria", value=criteria.describe(), inline=False)
+        if targets:
+            shown = '\n'.join(f"{member.mention} ({member} | {member.id}) joined "
+                              f"{discord.utils.format_dt(member.joined_at, 'R') if member.joined_at else 'at an unknown time'}"
+                              for member in targets[:PREVIEW_LIMIT])
+            if len(targets) > PREVIEW_LIMIT:
+                shown += f"\n...and {len(targets) - PREVIEW_LIMIT} more, see the attached file"
+            embed.add_field(name="Members", value=shown[:1024], inline=False)
+            await ctx.send(embed=embed, file=discord.File(io.BytesIO(members_csv((member, "matched") for member in targets)),
+                                                          f"raid-preview-{ctx.guild.id}.csv"))
+        else:
+            await ctx.send(embed=embed)
+
+    raid.example_usage = """
+    `{prefix}raid joined:15m` - show every member who joined in the last 15 minutes
+    `{prefix}raid preview age:1d name:^free nitro` - show every member with an account under a day old named "free nitro..."
+    `{prefix}raid ban joined:10m age:2d reason:Spam raid` - ban every member who joined in the last 10 minutes with an account under 2 days old
+    `{prefix}raid kick joined:1h name:discord\\.gg` - kick every member who joined in the last hour with an invite in their name
+    """
+
+    @raid.command()
+    @guild_only()
+    @has_permissions(kick_members=True)
+    async def preview(self, ctx: DozerContext, *, filters: RaidFilters):
+        """Shows which members the raid commands would act on with the given filters, without acting on them."""
+        await self.raid(ctx, filters=filters)
+
+    @raid.command()
+    @guild_only()
+    @has_permissions(ban_members=True)
+    @bot_has_permissions(ban_members=True)
+    async def ban(self, ctx: DozerContext, *, filters: RaidFilters):
+        """Bans every member matching the filters, and posts a single modlog entry listing them."""
+
+        async def ban_member(member: discord.Member, audit_reason: str):
+            await ctx.guild.ban(member, reason=audit_reason, delete_message_seconds=0)
+
+        await self.mass_action(ctx, filters, "banned", ban_member)
+
+    ban.example_usage = """
+    `{prefix}raid ban joined:10m age:2d reason:Spam raid` - ban every member who joined in the last 10 minutes with an account under 2 days old
+    """
+
+    @raid.command()
+    @guild_only()
+    @has_permissions(kick_members=True)
+    @bot_has_permissions(kick_members=True)
+    async def kick(self, ctx: DozerContext, *, filters: RaidFilters):
+        """Kicks every member matching the filters, and posts a single modlog entry listing them."""
+
+        async def kick_member(member: discord.Member, audit_reason: str):
+            await ctx.guild.kick(member, reason=audit_reason)
+
+        await self.mass_action(ctx, filters, "kicked", kick_member)
+
+    kick.example_usage = """
+    `{prefix}raid kick joined:1h name:discord\\.gg` - kick every member who joined in the last hour with an invite in their name
+    """
+
+
+async def setup(bot):
+    """Adds the raid cog to the bot"""
+    await bot.add_cog(Raid(bot))
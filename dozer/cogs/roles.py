@@ -11,9 +11,11 @@ from discord.utils import escape_markdown
 
 from dozer.context import DozerContext
 from ._utils import *
-from .actionlogs import CustomJoinLeaveMessages
-from .moderation import MemberRole
 from .. import db
+from ..Components.CustomJoinLeaveMessages import join_leave_config
+from ..Components.ReactionRoleIndex import ReactionRoleIndex
+from ..Components.RoleMenus import RoleMenuService
+from ..Components.RoleNameIndex import RoleNameIndex
 from ..db import *
 
 blurple = discord.Color.blurple()
@@ -24,6 +26,11 @@ class Roles(Cog):
 
     def __init__(self, bot: commands.Bot):
         super().__init__(bot)
+        self.started_timers = False
+        self.reaction_roles = ReactionRoleIndex()
+        self.menus = RoleMenuService(self.reaction_roles)
+        self.giveable = {}  # guild_id -> RoleNameIndex of its giveable roles
+        self.giveable_loaded = False
         for loop_command in self.giveme.walk_commands():
             @loop_command.before_invoke  # pylint: disable=cell-var-from-loop
             async def givemeautopurge(self, ctx: DozerContext):
@@ -39,44 +46,58 @@ class Roles(Cog):
         time_release = round(time.time() + time_delta)
         return time_release
 
-    @staticmethod
-    async def safe_message_fetch(ctx: DozerContext, menu=None, channel: discord.TextChannel = None,
+    async def safe_message_fetch(self, ctx: DozerContext, menu=None, channel: discord.TextChannel = None,
                                  message_id: int = None):
         """Used to safely get a message and raise an error message cannot be found"""
+        if menu:
+            channel = ctx.guild.get_channel(menu.channel_id)
+            message_id = menu.message_id
+        else:
+            channel = channel or ctx.message.channel
+        if channel is None:
+            raise BadArgument("That message does not exist or is not in this channel!")
         try:
-            if menu:
-                channel = ctx.guild.get_channel(menu.channel_id)
-                return await channel.fetch_message(menu.message_id)
-            else:
-                if channel:
-                    return await channel.fetch_message(message_id)
-                else:
-                    return await ctx.message.channel.fetch_message(message_id)
+            return await self.menus.fetch_message(channel, message_id)
         except discord.HTTPException:
             raise BadArgument("That message does not exist or is not in this channel!")
 
-    @staticmethod
-    async def add_to_message(message: discord.Message, entry):
+    async def add_to_message(self, message: discord.Message, entry):
         """Adds a reaction role to a message"""
         await message.add_reaction(entry.reaction)
         await entry.update_or_add()
+        self.reaction_roles.add(entry.message_id, entry.role_id, entry.reaction)
 
     @staticmethod
-    async def del_from_message(message: discord.Message, entry):
+    async def del_from_message(message: discord.Message, reaction: str):
         """Removes a reaction from a message"""
-        await message.clear_reaction(entry.reaction)
+        await message.clear_reaction(reaction)
 
     @Cog.listener('on_ready')
     async def on_ready(self):
-        """Restore tempRole timers on bot startup"""
+        """Restore tempRole timers and load the reaction role index on bot startup"""
+        if self.started_timers:
+            return  # Client resumed, the timers are still scheduled
+        self.started_timers = True
+        menus = await RoleMenu.get_by()
+        self.reaction_roles.load(menus, await ReactionRole.get_by())
+        self.menus.load(menus)
+        giveable = {}
+        for entry in await GiveableRole.get_by():
+            giveable.setdefault(entry.guild_id, []).append((entry.role_id, entry.norm_name))
+        self.giveable = {guild_id: RoleNameIndex(roles) for guild_id, roles in giveable.items()}
+        self.giveable_loaded = True
         q = await TempRoleTimerRecords.get_by()  # no filters: all
         for record in q:
-            self.bot.loop.create_task(self.removal_timer(record))
+            self.schedule_removal(record)
+        logger.info(f"Restored {len(q)} temporary role timers")
 
     @Cog.listener()
     async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
         """Used to remove dead reaction role entries"""
         message_id = payload.message_id
+        self.menus.forget(message_id)
+        if not self.reaction_roles.discard_message(message_id) and self.reaction_roles.loaded:
+            return
         await ReactionRole.delete(message_id=message_id)
         await RoleMenu.delete(message_id=message_id)
 
@@ -93,12 +114,17 @@ class Roles(Cog):
     async def on_raw_reaction_action(self, payload: discord.RawReactionActionEvent):
         """Called whenever a reaction is added or removed"""
         message_id = payload.message_id
-        reaction = str(payload.emoji)
-        reaction_roles = await ReactionRole.get_by(message_id=message_id, reaction=reaction)
-        if len(reaction_roles):
+        if self.reaction_roles.loaded:
+            if message_id not in self.reaction_roles:
+                return
+            role_id = self.reaction_roles.get(message_id, str(payload.emoji))
+        else:  # Reactions that come in before the index is loaded at startup
+            reaction_roles = await ReactionRole.get_by(message_id=message_id, reaction=str(payload.emoji))
+            role_id = reaction_roles[0].role_id if reaction_roles else None
+        if role_id is not None:
             guild = self.bot.get_guild(payload.guild_id)
             member = guild.get_member(payload.user_id)
-            role = guild.get_role(reaction_roles[0].role_id)
+            role = guild.get_role(role_id)
             if member.bot:
                 return
             if role:
@@ -110,74 +136,72 @@ class Roles(Cog):
                 except discord.Forbidden:
                     logger.debug(f"Unable to add reaction role in guild {guild} due to missing permissions")
 
-    async def removal_timer(self, record):
-        """Asynchronous task that sleeps for a set time to remove a role from a member after a set period of time."""
+    def schedule_removal(self, record):
+        """Schedules the removal of a temporary role, replacing any pending removal of the same role from the same member"""
+        key = ("temprole", record.guild_id, record.target_id, record.target_role_id)
+        self.bot.scheduler.schedule(key, record.removal_ts, self.removal_expired, record)
 
+    async def removal_expired(self, record):
+        """Called by the timer scheduler to remove a temporary role from a member once its time is up."""
         guild = self.bot.get_guild(int(record.guild_id))
-        target = guild.get_member(int(record.target_id))
-        target_role = guild.get_role(int(record.target_role_id))
-        removal_time = record.removal_ts
-
-        # Max function is used to make sure the delay is not negative
-        time_delta = max(int(removal_time - time.time()), 1)
-
-        await asyncio.sleep(time_delta)
+        target = guild.get_member(int(record.target_id)) if guild else None
+        target_role = guild.get_role(int(record.target_role_id)) if guild else None
+        if target is not None and target_role is not None:
+            await target.remove_roles(target_role)
+        else:
+            logger.warning(f"Unable to remove temporary role {record.target_role_id} from {record.target_id} in guild {record.guild_id}")
 
-        await target.remove_roles(target_role)
+        await TempRoleTimerRecords.delete(guild_id=record.guild_id, target_id=record.target_id,
+                                          target_role_id=record.target_role_id)
 
-        await TempRoleTimerRecords.delete(id=record.id)
+    async def _giveable_names(self, guild_id: int) -> RoleNameIndex:
+        """Returns the name index of a guild's giveable roles, loading it if the startup load hasn't happened yet"""
+        index = self.giveable.get(guild_id)
+        if index is None:
+            entries = [] if self.giveable_loaded else await GiveableRole.get_by(guild_id=guild_id)
+            index = self.giveable[guild_id] = RoleNameIndex((entry.role_id, entry.norm_name) for entry in entries)
+        return index
 
     @Cog.listener('on_guild_role_update')
     async def on_role_edit(self, old, new):
         """Changes role names in database when they are changed in the guild"""
         if self.normalize(old.name) != self.normalize(new.name):
-            results = await GiveableRole.get_by(norm_name=self.normalize(old.name), guild_id=old.guild.id)
-            if results:
+            index = await self._giveable_names(new.guild.id)
+            if new.id in index:
                 logger.debug(f"Role {new.id} name updated. updating name")
                 await GiveableRole.from_role(new).update_or_add()
+                index.add(new.id, self.normalize(new.name))
 
     @Cog.listener('on_guild_role_delete')
     async def on_role_delete(self, old):
         """Deletes roles from database when the roles are deleted from the guild. """
-        results = await GiveableRole.get_by(norm_name=self.normalize(old.name), guild_id=old.guild.id)
-        if results:
+        index = await self._giveable_names(old.guild.id)
+        if old.id in index:
             logger.debug(f"Role {old.id} deleted. Deleting from database.")
             await GiveableRole.delete(role_id=old.id)
+            index.remove(old.id)
 
     @Cog.listener('on_member_join')
     async def on_member_join(self, member: discord.Member):
         """Restores a member's roles when they join if they have joined before."""
-        me = member.guild.me
-        top_restorable = me.top_role.position if me.guild_permissions.manage_roles else 0
-        restore = await MissingRole.get_by(guild_id=member.guild.id, member_id=member.id)
-        if len(restore) == 0:
+        snapshot = await MemberRoleSnapshot.pop(member.guild.id, member.id)
+        if snapshot is None:
             return  # New member - nothing to restore
 
-        # try and prioritize the member role first for Speed
-        member_role_id = None
-        stg = await MemberRole.get_by(guild_id=member.guild.id)
-        if stg:
-            member_role_id = stg[0].member_role
-            member_role =  member.guild.get_role(member_role_id)
-            if member_role is not None and any(s.role_id == member_role_id for s in restore) and member_role.position <= top_restorable:
-                await member.add_roles(member_role)
-            else:
-                member_role_id = None
-
+        can_manage = member.guild.me.guild_permissions.manage_roles
         valid, cant_give, missing = set(), set(), set()
-        for missing_role in restore:
-            role = member.guild.get_role(missing_role.role_id)
+        for role_id, role_name in zip(snapshot.role_ids, snapshot.role_names):
+            role = member.guild.get_role(role_id)
             if role is None:  # Role with that ID does not exist
-                missing.add(missing_role.role_name)
-            elif role.position > top_restorable:
+                missing.add(role_name)
+            elif not can_manage or not role.is_assignable():
                 cant_give.add(role.name)
-            elif role.id != member_role_id:
+            else:
                 valid.add(role)
-        for entry in restore:
-            # Not missing anymore - remove the record to free up the primary key
-            await MissingRole.delete(role_id=entry.role_id, member_id=entry.member_id)
 
-        await member.add_roles(*valid)
+        valid.difference_update(member.roles)
+        if valid:
+            await member.edit(roles=[*member.roles[1:], *valid], reason="Restoring roles of a returning member")
         if not missing and not cant_give:
             return
 
@@ -189,58 +213,37 @@ class Roles(Cog):
             e.add_field(name='I couldn\'t restore these roles, as I don\'t have permission.',
                         value='\n'.join(sorted(cant_give)))
         try:
-            dest_id = await CustomJoinLeaveMessages.get_by(guild_id=member.guild.id)
-            dest = member.guild.get_channel(dest_id[0].memberlog_channel)
+            dest_id = await join_leave_config.query_one(guild_id=member.guild.id)
+            dest = member.guild.get_channel(dest_id.channel_id)
             await dest.send(embed=e)
         except discord.Forbidden:
             pass
-        except IndexError:
+        except (IndexError, AttributeError):
             pass
 
     @Cog.listener('on_member_remove')
     async def on_member_remove(self, member: discord.Member):
         """Saves a member's roles when they leave in case they rejoin."""
-        guild_id = member.guild.id
-        member_id = member.id
-        for role in member.roles[1:]:  # Exclude the @everyone role
-            db_member = MissingRole(role_id=role.id, role_name=role.name, guild_id=guild_id, member_id=member_id)
-            await db_member.update_or_add()
-
-    async def giveme_purge(self, rolelist):
-        """Purges roles in the giveme database that no longer exist. The argument is a list of GiveableRole objects."""
-        for role in rolelist:
-            dbrole = await GiveableRole.get_by(role_id=role.role_id)
-            if dbrole:
-                await GiveableRole.delete(role_id=role.role_id)
+        await MemberRoleSnapshot.save(member)
 
     async def ctx_purge(self, ctx: DozerContext):
         """Purges all giveme roles that no longer exist in a guild"""
-        counter = 0
-        roles = await GiveableRole.get_by(guild_id=ctx.guild.id)
-        guildroles = []
-        rolelist = []
-        for i in ctx.guild.roles:
-            guildroles.append(i.id)
-        for role in roles:
-            if role.role_id not in guildroles:
-                rolelist.append(role)
-                counter += 1
-        await self.giveme_purge(rolelist)
-        return counter
-
-    async def on_guild_role_delete(self, role: discord.Role):
-        """Automatically delete giveme roles if they are deleted from the guild"""
-        rolelist = [role]
-        await self.giveme_purge(rolelist)
+        index = await self._giveable_names(ctx.guild.id)
+        # The index mirrors the giveable roles table, so the database is only touched when a role is actually gone
+        if all(ctx.guild.get_role(role_id) is not None for role_id in index.role_ids()):
+            return 0
+        purged = await GiveableRole.purge_missing(ctx.guild)
+        for role_id in purged:
+            index.remove(role_id)
+        return len(purged)
 
     @group(invoke_without_command=True)
     @bot_has_permissions(manage_roles=True)
     async def giveme(self, ctx: DozerContext, *, roles):
-        """Give you one or more giveable roles, separated by commas."""
-        norm_names = [self.normalize(name) for name in roles.split(',')]
-        giveable_ids = [tup.role_id for tup in await GiveableRole.get_by(guild_id=ctx.guild.id) if
-                        tup.norm_name in norm_names]
-        valid = set(role for role in ctx.guild.roles if role.id in giveable_ids)
+        """Give you one or more giveable roles, separated by commas. Names may be shortened or slightly misspelled."""
+        index = await self._giveable_names(ctx.guild.id)
+        giveable_ids, unresolved = index.resolve_many(self.normalize(name) for name in roles.split(','))
+        valid = set(role for role in map(ctx.guild.get_role, giveable_ids) if role is not None)
 
         already_have = valid & set(ctx.author.roles)
         given = valid - already_have
@@ -254,9 +257,8 @@ class Roles(Cog):
             already_have_names = sorted((role.name for role in already_have), key=str.casefold)
             e.add_field(name=f'You already have {len(already_have)} role(s)!',
                         value='\n'.join(already_have_names), inline=False)
-        extra = len(norm_names) - len(valid)
-        if extra > 0:
-            e.add_field(name=f'{extra} role(s) could not be found!',
+        if unresolved:
+            e.add_field(name=f'{len(unresolved)} role(s) could not be found!',
                         value=f'Use `{ctx.prefix}{ctx.invoked_with} list` to find valid giveable roles!',
                         inline=False)
         msg = await ctx.send(embed=e)
@@ -287,6 +289,7 @@ class Roles(Cog):
     giveme.example_usage = """
     `{prefix}giveme Java` - gives you the role called Java, if it exists
     `{prefix}giveme Java, Python` - gives you the roles called Java and Python, if they exist
+    `{prefix}giveme Pyhton, Javascr` - also gives you Python and JavaScript, if no other role is a closer match
     """
 
     @giveme.command()
@@ -312,8 +315,8 @@ class Roles(Cog):
         if ',' in name:
             raise BadArgument('giveable role names must not contain commas!')
         norm_name = self.normalize(name)
-        settings = await GiveableRole.get_by(guild_id=ctx.guild.id, norm_name=norm_name)
-        if settings:
+        index = await self._giveable_names(ctx.guild.id)
+        if norm_name in index.names:
             raise BadArgument('that role already exists and is giveable!')
         candidates = [role for role in ctx.guild.roles if self.normalize(role.name) == norm_name]
 
@@ -324,6 +327,7 @@ class Roles(Cog):
         else:
             raise BadArgument(f'{len(candidates)} roles with that name exist!')
         await GiveableRole.from_role(role).update_or_add()
+        index.add(role.id, norm_name)
         await ctx.send(f'Role "{role.name}" added! Use `{ctx.prefix}{ctx.command.parent} {role.name}` to get it!')
 
     add.example_usage = """
@@ -340,11 +344,12 @@ class Roles(Cog):
         if ',' in name:
             raise BadArgument('giveable role names must not contain commas!')
         norm_name = self.normalize(name)
-        settings = await GiveableRole.get_by(guild_id=ctx.guild.id, norm_name=norm_name)
-        if not settings:
+        index = await self._giveable_names(ctx.guild.id)
+        if norm_name not in index.names:
             role = await ctx.guild.create_role(name=name, reason=f'Giveable role created by {ctx.author}')
             settings = GiveableRole.from_role(role)
             await settings.update_or_add()
+            index.add(role.id, settings.norm_name)
             await ctx.send(f'Role "{role.name}" created! Use `{ctx.prefix}{ctx.command.parent} {role.name}` to get it!')
 
         else:
@@ -358,15 +363,10 @@ class Roles(Cog):
     @giveme.command()
     @bot_has_permissions(manage_roles=True)
     async def remove(self, ctx: DozerContext, *, roles):
-        """Removes multiple giveable roles from you. Names must be separated by commas."""
-        norm_names = [self.normalize(name) for name in roles.split(',')]
-        query = await GiveableRole.get_by(guild_id=ctx.guild.id)
-        roles_to_remove = []
-        for role in query:
-            if role.norm_name in norm_names:
-                roles_to_remove.append(role)
-        removable_ids = [tup.role_id for tup in roles_to_remove]
-        valid = set(role for role in ctx.guild.roles if role.id in removable_ids)
+        """Removes multiple giveable roles from you. Names must be separated by commas, and may be shortened or slightly misspelled."""
+        index = await self._giveable_names(ctx.guild.id)
+        removable_ids, unresolved = index.resolve_many(self.normalize(name) for name in roles.split(','))
+        valid = set(role for role in map(ctx.guild.get_role, removable_ids) if role is not None)
 
         removed = valid & set(ctx.author.roles)
         dont_have = valid - removed
@@ -380,9 +380,8 @@ class Roles(Cog):
             dont_have_names = sorted((role.name for role in dont_have), key=str.casefold)
             e.add_field(name=f'You didn\'t have {len(dont_have)} role(s)!', value='\n'.join(dont_have_names),
                         inline=False)
-        extra = len(norm_names) - len(valid)
-        if extra > 0:
-            e.add_field(name=f'{extra} role(s) could not be found!',
+        if unresolved:
+            e.add_field(name=f'{len(unresolved)} role(s) could not be found!',
                         value=f'Use `{ctx.prefix}{ctx.invoked_with} list` to find valid giveable roles!',
                         inline=False)
         msg = await ctx.send(embed=e)
@@ -422,20 +421,17 @@ class Roles(Cog):
         """Deletes and removes a giveable role."""
         if ',' in name:
             raise BadArgument('this command only works with single roles!')
-        norm_name = self.normalize(name)
-        valid_ids = set(role.id for role in ctx.guild.roles)
-        roles = await GiveableRole.get_by(guild_id=ctx.guild.id, norm_name=norm_name)
-        valid_roles = []
-        for role_option in roles:
-            if role_option.role_id in valid_ids:
-                valid_roles.append(role_option)
+        # Deleting only ever goes by the exact name, never a guess
+        index = await self._giveable_names(ctx.guild.id)
+        valid_roles = [role for role in map(ctx.guild.get_role, index.names.get(self.normalize(name), ())) if role is not None]
         if len(valid_roles) == 0:
             raise BadArgument('that role does not exist or is not giveable!')
         elif len(valid_roles) > 1:
             raise BadArgument('multiple giveable roles with that name exist!')
         else:
-            role = ctx.guild.get_role(valid_roles[0].role_id)
-            await GiveableRole.delete(guild_id=ctx.guild.id, norm_name=valid_roles[0].norm_name)
+            role = valid_roles[0]
+            await GiveableRole.delete(role_id=role.id)
+            index.remove(role.id)
             await role.delete(reason=f'Giveable role deleted by {ctx.author}')
             await ctx.send(f'Role "{role}" deleted!')
 
@@ -470,20 +466,18 @@ class Roles(Cog):
         # Honestly this is the giveme delete command but modified to only delete from the DB
         if ',' in name:
             raise BadArgument('this command only works with single roles!')
-        norm_name = self.normalize(name)
-        valid_ids = set(role.id for role in ctx.guild.roles)
-        roles = await GiveableRole.get_by(guild_id=ctx.guild.id)
-        valid_roles = []
-        for role_option in roles:
-            if role_option.norm_name == norm_name and role_option.role_id in valid_ids:
-                valid_roles.append(role_option)
+        index = await self._giveable_names(ctx.guild.id)
+        # Only an exact name, so a typo can't take a different role off the list
+        valid_roles = [role for role in map(ctx.guild.get_role, index.names.get(self.normalize(name), ())) if role is not None]
         if len(valid_roles) == 0:
             raise BadArgument('that role does not exist or is not giveable!')
         elif len(valid_roles) > 1:
             raise BadArgument('multiple giveable roles with that name exist!')
         else:
-            await GiveableRole.delete(guild_id=ctx.guild.id, norm_name=valid_roles[0].norm_name)
-            await ctx.send(f'Role "{name}" deleted from list!')
+            role = valid_roles[0]
+            await GiveableRole.delete(role_id=role.id)
+            index.remove(role.id)
+            await ctx.send(f'Role "{role.name}" deleted from list!')
 
     delete.example_usage = """
     `{prefix}giveme removefromlist Java` - removes the role "Java" from the list of giveable roles but does not remove it from the server or members who have it 
@@ -513,7 +507,7 @@ class Roles(Cog):
 
         await member.add_roles(role)
         await ent.update_or_add()
-        self.bot.loop.create_task(self.removal_timer(ent))
+        self.schedule_removal(ent)
         e = discord.Embed(color=blurple)
         e.add_field(name='Success!', value=f'Gave {role.mention} to {member.mention} for {length}!')
         e.set_footer(text='Triggered by ' + escape_markdown(ctx.author.display_name))
@@ -557,31 +551,18 @@ class Roles(Cog):
     `{prefix}take cooldude#1234 Java` - takes any role named Java, giveable or not, from cooldude
     """
 
-    async def update_role_menu(self, ctx: DozerContext, menu):
-        """Updates a reaction role menu"""
-        menu_message = await self.safe_message_fetch(ctx, menu=menu)
-
-        menu_embed = discord.Embed(title=f"Role Menu: {menu.name}")
-        menu_entries = await ReactionRole.get_by(message_id=menu.message_id)
-        for entry in menu_entries:
-            role = ctx.guild.get_role(entry.role_id)
-            menu_embed.add_field(name=f"Role: {role}", value=f"{entry.reaction}: {role.mention}", inline=False)
-        menu_embed.set_footer(text=f"React to get a role\nMenu ID: {menu_message.id}, Total roles: {len(menu_entries)}")
-        await menu_message.edit(embed=menu_embed)
-
     @group(invoke_without_command=True, aliases=["reactionrole", "reactionroles"])
     @bot_has_permissions(manage_roles=True, embed_links=True)
     @has_permissions(manage_roles=True)
     @guild_only()
     async def rolemenu(self, ctx: DozerContext):
         """Base command for setting up and tracking reaction roles"""
-        rolemenus = await RoleMenu.get_by(guild_id=ctx.guild.id)
+        rolemenus = [menu for menu in self.menus.menus.values() if menu.guild_id == ctx.guild.id]
         embed = discord.Embed(title="Reaction Role Messages", color=blurple)
         boundroles = []
         for rolemenu in rolemenus:
-            menu_entries = await ReactionRole.get_by(message_id=rolemenu.message_id)
-            for role in menu_entries:
-                boundroles.append(role.message_id)
+            menu_entries = self.reaction_roles.entries(rolemenu.message_id)
+            boundroles.append(rolemenu.message_id)
             link = f"https://discordapp.com/channels/{rolemenu.guild_id}/{rolemenu.channel_id}/{rolemenu.message_id}"
             embed.add_field(name=f"Menu: {rolemenu.name}",
                             value=f"[Contains {len(menu_entries)} role watchers]({link})", inline=False)
@@ -635,7 +616,8 @@ class Roles(Cog):
         await e.update_or_add()
 
         menu_embed.set_footer(text=f"Menu ID: {message.id}, Total roles: {0}")
-        await message.edit(embed=menu_embed)
+        message = await message.edit(embed=menu_embed)
+        self.menus.add_menu(e, message)
 
         e = discord.Embed(color=blurple)
         link = f"https://discordapp.com/channels/{ctx.guild.id}/{message.channel.id}/{message.id}"
@@ -679,8 +661,7 @@ class Roles(Cog):
         if role.managed:
             raise BadArgument("I am not allowed to assign that role!")
 
-        menu_return = await RoleMenu.get_by(guild_id=ctx.guild.id, message_id=message_id)
-        menu = menu_return[0] if len(menu_return) else None
+        menu = self.menus.get_menu(ctx.guild.id, message_id)
         message = await self.safe_message_fetch(ctx, menu=menu, channel=channel, message_id=message_id)
 
         reaction_role = ReactionRole(
@@ -691,13 +672,13 @@ class Roles(Cog):
             reaction=str(emoji)
         )
 
-        old_reaction = await ReactionRole.get_by(message_id=message.id, role_id=role.id)
-        if len(old_reaction):
-            await self.del_from_message(message, old_reaction[0])
+        old_reaction = self.reaction_roles.entries(message.id).get(role.id)
+        if old_reaction is not None:
+            await self.del_from_message(message, old_reaction)
         await self.add_to_message(message, reaction_role)
 
         if menu:
-            await self.update_role_menu(ctx, menu)
+            self.menus.set_role(menu, role, reaction_role.reaction)
 
         e = discord.Embed(color=blurple)
         link = f"https://discordapp.com/channels/{ctx.guild.id}/{message.channel.id}/{message_id}"
@@ -721,16 +702,16 @@ class Roles(Cog):
                       role: discord.Role):
         """Removes a reaction role from a message or a role menu"""
         message_id = int(message_id)
-        menu_return = await RoleMenu.get_by(guild_id=ctx.guild.id, message_id=message_id)
-        menu = menu_return[0] if len(menu_return) else None
+        menu = self.menus.get_menu(ctx.guild.id, message_id)
         message = await self.safe_message_fetch(ctx, menu=menu, channel=channel, message_id=message_id)
 
-        reaction = await ReactionRole.get_by(message_id=message.id, role_id=role.id)
-        if len(reaction):
-            await self.del_from_message(message, reaction[0])
+        reaction = self.reaction_roles.entries(message.id).get(role.id)
+        if reaction is not None:
+            await self.del_from_message(message, reaction)
             await ReactionRole.delete(message_id=message.id, role_id=role.id)
+            self.reaction_roles.remove(message.id, role.id)
         if menu:
-            await self.update_role_menu(ctx, menu)
+            self.menus.remove_role(menu, ctx.guild, role.id)
 
         e = discord.Embed(color=blurple)
         link = f"https://discordapp.com/channels/{ctx.guild.id}/{message.channel.id}/{message_id}"
@@ -861,41 +842,74 @@ class GiveableRole(db.DatabaseTable):
         """Creates a GiveableRole record from a discord.Role."""
         return cls(role_id=role.id, name=role.name, norm_name=Roles.normalize(role.name), guild_id=role.guild.id)
 
+    @classmethod
+    async def purge_missing(cls, guild: discord.Guild) -> typing.List[int]:
+        """Deletes the guild's giveable roles that no longer exist in it, returning the ids of the deleted roles"""
+        async with db.Pool.acquire() as conn:
+            records = await conn.fetch(f"""DELETE FROM {cls.__tablename__} WHERE guild_id = $1 AND role_id != ALL($2::bigint[])
+                RETURNING role_id""", guild.id, [role.id for role in guild.roles])
+        return [record["role_id"] for record in records]
+
 
-class MissingRole(db.DatabaseTable):
-    """Holds the roles of those who leave"""
-    __tablename__ = 'missing_roles'
-    __uniques__ = 'role_id, member_id'
+class MemberRoleSnapshot(db.DatabaseTable):
+    """The roles a member had when they left a guild, kept in one row so it is saved and restored in one statement"""
+    __tablename__ = 'member_role_snapshots'
+    __uniques__ = 'guild_id, member_id'
 
     @classmethod
     async def initial_create(cls):
-        """Create the table in the database"""
+        """Create the table in the database, carrying over the roles saved one row per role in missing_roles"""
         async with db.Pool.acquire() as conn:
             await conn.execute(f"""
             CREATE TABLE {cls.__tablename__} (
             guild_id bigint NOT NULL,
             member_id bigint NOT NULL,
-            role_id bigint NOT NULL,
-            role_name varchar NOT NULL,
-            PRIMARY KEY (role_id, member_id)
+            role_ids bigint[] NOT NULL,
+            role_names varchar[] NOT NULL,
+            PRIMARY KEY (guild_id, member_id)
             )""")
+            if await conn.fetchval("SELECT to_regclass('missing_roles')") is not None:
+                await conn.execute(f"""
+                INSERT INTO {cls.__tablename__} (guild_id, member_id, role_ids, role_names)
+                SELECT guild_id, member_id, array_agg(role_id ORDER BY role_id), array_agg(role_name ORDER BY role_id)
+                FROM missing_roles GROUP BY guild_id, member_id""")
 
-    def __init__(self, guild_id: int, member_id: int, role_id: int, role_name: str):
+    def __init__(self, guild_id: int, member_id: int, role_ids: typing.List[int], role_names: typing.List[str]):
         super().__init__()
         self.guild_id = guild_id
         self.member_id = member_id
-        self.role_id = role_id
-        self.role_name = role_name
+        self.role_ids = role_ids
+        self.role_names = role_names
+
+    @classmethod
+    def _from_record(cls, record):
+        return cls(guild_id=record.get("guild_id"), member_id=record.get("member_id"), role_ids=list(record.get("role_ids")),
+                   role_names=list(record.get("role_names")))
 
     @classmethod
     async def get_by(cls, **kwargs):
         results = await super().get_by(**kwargs)
-        result_list = []
-        for result in results:
-            obj = MissingRole(guild_id=result.get("guild_id"), role_id=result.get("role_id"),
-                              member_id=result.get("member_id"), role_name=result.get("role_name"))
-            result_list.append(obj)
-        return result_list
+        return [cls._from_record(result) for result in results]
+
+    @classmethod
+    async def save(cls, member: discord.Member):
+        """Saves the roles of a member, replacing whatever was saved for them before"""
+        roles = member.roles[1:]  # Exclude the @everyone role
+        if not roles:
+            return
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+                INSERT INTO {cls.__tablename__} (guild_id, member_id, role_ids, role_names) VALUES ($1, $2, $3, $4)
+                ON CONFLICT (guild_id, member_id) DO UPDATE SET role_ids = EXCLUDED.role_ids, role_names = EXCLUDED.role_names""",
+                               member.guild.id, member.id, [role.id for role in roles], [role.name for role in roles])
+
+    @classmethod
+    async def pop(cls, guild_id: int, member_id: int) -> typing.Optional["MemberRoleSnapshot"]:
+        """Removes and returns the roles saved for a member, or None if none were saved"""
+        async with db.Pool.acquire() as conn:
+            record = await conn.fetchrow(f"DELETE FROM {cls.__tablename__} WHERE guild_id = $1 AND member_id = $2 RETURNING *",
+                                         guild_id, member_id)
+        return cls._from_record(record) if record is not None else None
 
 
 class TempRoleTimerRecords(db.DatabaseTable):
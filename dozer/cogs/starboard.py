@@ -1,5 +1,8 @@
 """Cog to post specific 'Hall of Fame' messages in a specific channel"""
 import asyncio
+import datetime
+import typing
+import weakref
 
 import discord
 from discord.ext import commands
@@ -10,29 +13,35 @@ from loguru import logger
 from dozer.context import DozerContext
 from ._utils import *
 from .. import db
+from ..Components.RateLimiter import RateLimiter, run_bounded
+from ..Components.ReactionMessageCache import MessageReactions, ReactionMessageCache
+from ..Components.StarboardIndex import StarboardIndex
 
 MAX_EMBED = 1024
-LOCK_TIME = .1
-FORCE_TRY_TIME = 1
+STAR_DEBOUNCE = 2  # seconds without a new star reaction on a message before evaluating its stars together
+STAR_DEBOUNCE_MAX = 10  # seconds after the first star that its stars are evaluated even if more keep coming
 
 VIDEO_FORMATS = ['.mp4', '.mov', 'webm']
+WARM_WINDOW = datetime.timedelta(days=30)  # starboard posts of messages this recent are loaded on startup
+MAX_BACKFILL_DAYS = 90
+BACKFILL_CONCURRENCY = 3  # channels scanned at once
+BACKFILL_POSTS_PER_MINUTE = 20
+TOP_AUTHORS = 10
 
 
-async def is_cancelled(emoji, message: discord.Message, me, author: discord.Member = None):
+async def is_cancelled(emoji, reactions: MessageReactions, me, author: discord.Member = None):
     """Determine if the message has cancellation reacts"""
     if author is None:
-        author = message.author
+        author = reactions.message.author
 
-    for reaction in message.reactions:
-        if str(reaction) != emoji:
-            continue
-
-        users = [user async for user in reaction.users()]
-        if author in users or me in users:
-            return True
+    if not reactions.count(emoji):
         return False
-
-    return False
+    if reactions.me(emoji):
+        return True
+    if author == me:
+        return False
+    # Only walk the reacting users over the API when no reaction event has said whether the author reacted
+    return await reactions.reacted(emoji, author.id)
 
 
 def make_starboard_embed(msg: discord.Message, reaction_count: int):
@@ -64,7 +73,12 @@ class Starboard(Cog):
     def __init__(self, bot: commands.Bot):
         super().__init__(bot)
         self.config_cache = db.ConfigCache(StarboardConfig)
-        self.locked_messages = set()
+        self.message_locks = weakref.WeakValueDictionary()
+        self.pending_checks = {}  # message_id -> (member whose star decides, loop time of the first star, waiting task)
+        self.messages = ReactionMessageCache(bot)
+        self.index = StarboardIndex()
+        self.index_loaded = False
+        self.backfill_limiter = RateLimiter(BACKFILL_POSTS_PER_MINUTE, 60)
 
     def make_config_embed(self, ctx: DozerContext, title, config):
         """Makes a config embed."""
@@ -82,53 +96,99 @@ class Starboard(Cog):
         e.set_footer(text=f"For more information, try {ctx.prefix}help starboard")
         return e
 
-    async def send_to_starboard(self, config, message: discord.Message, reaction_count: int, add_react: bool = True):
-        """Given a message which may or may not exist, send it to the starboard"""
+    @Cog.listener('on_ready')
+    async def on_ready(self):
+        """Loads the starboard posts of recent messages into the index"""
+        if self.index_loaded:
+            return
+        self.index_loaded = True
+        cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - WARM_WINDOW)
+        entries = await StarboardMessage.get_newer(cutoff)
+        self.index.load(entries, cutoff)
+        logger.info(f"Loaded {len(entries)} recent starboard posts")
+
+        # Posts from before the table recorded guilds are attributed to theirs once, to seed the per-author totals
+        channel_ids = await StarboardMessage.unassigned_channels()
+        channels = [channel for channel in map(self.bot.get_channel, channel_ids) if channel is not None]
+        if channels:
+            guild_ids = await StarboardMessage.assign_guilds({channel.id: channel.guild.id for channel in channels})
+            await StarboardAuthor.rebuild(guild_ids)
+            logger.info(f"Attributed starboard posts in {len(channels)} channels to {len(guild_ids)} guilds")
+
+    async def get_entry(self, message_id: int = None, starboard_message_id: int = None):
+        """Returns the starboard post of a message, or the post that is the given starboard message, or None"""
+        if message_id is not None:
+            entry, lookup_id, column = self.index.by_message.get(message_id), message_id, "message_id"
+        else:
+            entry, lookup_id, column = self.index.by_starboard.get(starboard_message_id), starboard_message_id, "starboard_message_id"
+        if entry is not None or self.index.complete_for(lookup_id):
+            return entry
+        entries = await StarboardMessage.get_by(**{column: lookup_id})
+        if entries:
+            self.index.add(entries[0])
+            return entries[0]
+        self.index.mark_absent(lookup_id)
+        return None
+
+    async def send_to_starboard(self, config, message: discord.Message, stars: int, add_react: bool = True):
+        """Given a message which may or may not exist, send it to the starboard. stars doesn't count the bot's own star."""
         starboard_channel = message.guild.get_channel(config.channel_id)
         if starboard_channel is None:
             return
 
         # check if the message we're trying to HoF is a hof message
-        starboard_check = await StarboardMessage.get_by(starboard_message_id=message.id)
-        if len(starboard_check):
+        if await self.get_entry(starboard_message_id=message.id) is not None:
             logger.info("Attempt to star starboard message, skipping")
             return
 
-        db_msgs = await StarboardMessage.get_by(message_id=message.id)
-        if len(db_msgs) == 0:
-            sent_msg = await starboard_channel.send(embed=make_starboard_embed(message, reaction_count))
-            db_msg = StarboardMessage(message.id, message.channel.id, sent_msg.id, message.author.id)
-            await db_msg.update_or_add()
+        entry = await self.get_entry(message_id=message.id)
+        if entry is None:
+            sent_msg = await starboard_channel.send(embed=make_starboard_embed(message, stars))
+            entry = StarboardMessage(message.id, message.channel.id, sent_msg.id, message.author.id,
+                                     guild_id=message.guild.id, stars=stars)
+            await entry.record()
+            self.index.add(entry)
             if add_react:
                 await message.add_reaction(config.star_emoji)
-        else:
+        elif entry.stars != stars:
             try:
-                sent_msg = await self.bot.get_channel(config.channel_id).fetch_message(db_msgs[0].starboard_message_id)
+                await starboard_channel.get_partial_message(entry.starboard_message_id).edit(
+                    embed=make_starboard_embed(message, stars))
             except discord.errors.NotFound:
                 # Uh oh! Starboard message was deleted. Let's try and delete it
-                logger.warning(f"Cannot find Starboard Message {db_msgs[0].starboard_message_id} to update")
-                fake_msg = discord.Object(db_msgs[0].starboard_message_id)
-                await self.remove_from_starboard(config, fake_msg, True)
+                logger.warning(f"Cannot find Starboard Message {entry.starboard_message_id} to update")
+                await self.remove_from_starboard(config, entry, True)
                 return
-            await sent_msg.edit(embed=make_starboard_embed(message, reaction_count - 1))
-
-    async def remove_from_starboard(self, config, starboard_message: discord.Message, cancel: bool = False):
-        """Given a starboard message or snowflake, remove that message and remove it from the DB"""
-        db_msgs = await StarboardMessage.get_by(starboard_message_id=starboard_message.id)
-        if len(db_msgs):
-            if hasattr(starboard_message, 'delete'):
-                await starboard_message.delete()
-            if cancel:
-                try:
-                    orig_msg = await self.bot.get_channel(db_msgs[0].channel_id).fetch_message(db_msgs[0].message_id)
-                    await orig_msg.add_reaction(config.cancel_emoji)
-                except discord.NotFound:
-                    pass
-            await StarboardMessage.delete(message_id=db_msgs[0].message_id)
+            await entry.set_stars(stars)
 
-    async def starboard_check(self, reaction: discord.Reaction, member: discord.Member):
+    async def remove_from_starboard(self, config, entry, cancel: bool = False):
+        """Given a starboard post, delete its message and remove it from the DB"""
+        starboard_channel = self.bot.get_channel(config.channel_id)
+        try:
+            if starboard_channel is not None:
+                await starboard_channel.get_partial_message(entry.starboard_message_id).delete()
+        except discord.NotFound:
+            pass
+        if cancel:
+            orig_channel = self.bot.get_channel(entry.channel_id)
+            try:
+                if orig_channel is not None:
+                    await orig_channel.get_partial_message(entry.message_id).add_reaction(config.cancel_emoji)
+            except discord.NotFound:
+                pass
+        await entry.remove()
+        self.index.remove(entry)
+
+    def message_lock(self, message_id: int) -> asyncio.Lock:
+        """Returns the lock serializing starboard updates for a message. It lives as long as someone holds or waits on it."""
+        lock = self.message_locks.get(message_id)
+        if lock is None:
+            lock = self.message_locks[message_id] = asyncio.Lock()
+        return lock
+
+    async def starboard_check(self, reactions: MessageReactions, emoji: str, member: discord.Member):
         """Provides all logic for checking and updating the Starboard"""
-        msg = reaction.message
+        msg = reactions.message
         if not msg.guild:
             return
 
@@ -136,59 +196,75 @@ class Starboard(Cog):
         if config is None:
             return
 
-        time_waiting = 0
-        while msg in self.locked_messages and time_waiting < FORCE_TRY_TIME:
-            await asyncio.sleep(LOCK_TIME)
-            time_waiting += LOCK_TIME
-        self.locked_messages.add(msg)
-
-        self_react = 0
-        if await is_cancelled(config.star_emoji, msg, msg.guild.me, msg.guild.me):
-            self_react = 1
-
-        # Starboard check
-        if str(reaction) == config.star_emoji and (reaction.count - self_react) >= config.threshold and \
-                member != msg.guild.me and not await is_cancelled(config.cancel_emoji, msg, msg.guild.me):
-            logger.debug(f"Starboard threshold reached on message {reaction.message.id} in "
-                         f"{reaction.message.guild.name} from user {member.id}, sending to starboard")
-            await self.send_to_starboard(config, msg, reaction.count)
-
-        # check if it's gone under the limit
-        elif str(reaction) == config.star_emoji and (reaction.count - self_react) < config.threshold:
-            db_msgs = await StarboardMessage.get_by(message_id=msg.id)
-            if len(db_msgs):
-                logger.debug("Under starboard threshold, removing starboard")
-                try:
-                    starboard_msg = await self.bot.get_channel(config.channel_id). \
-                        fetch_message(db_msgs[0].starboard_message_id)
-                except discord.NotFound:
-                    logger.warning(f"Cannot find Starboard Message {db_msgs[0].starboard_message_id} to remove")
-                    starboard_msg = discord.Object(db_msgs[0].starboard_message_id)
-                await self.remove_from_starboard(config, starboard_msg)
-
-        # check if it's been cancelled in the starboard channel
-        elif str(reaction) == config.cancel_emoji and msg.channel.id == config.channel_id:
-            db_msgs = await StarboardMessage.get_by(starboard_message_id=msg.id)
-            if len(db_msgs) and member.id == db_msgs[0].author_id:
-                logger.debug("Message cancelled in starboard channel, cancelling")
-                await self.remove_from_starboard(config, msg, True)
-
-        # check if it's been cancelled on the original message
-        elif str(reaction) == config.cancel_emoji:
-            db_msgs = await StarboardMessage.get_by(message_id=msg.id)
-            if len(db_msgs) and member.id == db_msgs[0].author_id:
-                logger.debug("Message cancelled in original channel, cancelling")
-                try:
-                    starboard_msg = await self.bot.get_channel(config.channel_id). \
-                        fetch_message(db_msgs[0].starboard_message_id)
-                except discord.NotFound:
-                    logger.warning(f"Cannot find Starboard Message {db_msgs[0].starboard_message_id} to remove")
-                    starboard_msg = discord.Object(db_msgs[0].starboard_message_id)
-                await self.remove_from_starboard(config, starboard_msg, True)
-        try:
-            self.locked_messages.remove(msg)
-        except KeyError:
-            return
+        async with self.message_lock(msg.id):
+            count = reactions.count(emoji)
+            self_react = 0
+            if await is_cancelled(config.star_emoji, reactions, msg.guild.me, msg.guild.me):
+                self_react = 1
+
+            # Starboard check
+            if emoji == config.star_emoji and (count - self_react) >= config.threshold and \
+                    member != msg.guild.me and not await is_cancelled(config.cancel_emoji, reactions, msg.guild.me):
+                logger.debug(f"Starboard threshold reached on message {msg.id} in "
+                             f"{msg.guild.name} from user {member.id}, sending to starboard")
+                await self.send_to_starboard(config, msg, count - self_react)
+
+            # check if it's gone under the limit
+            elif emoji == config.star_emoji and (count - self_react) < config.threshold:
+                entry = await self.get_entry(message_id=msg.id)
+                if entry is not None:
+                    logger.debug("Under starboard threshold, removing starboard")
+                    await self.remove_from_starboard(config, entry)
+
+            # check if it's been cancelled in the starboard channel
+            elif emoji == config.cancel_emoji and msg.channel.id == config.channel_id:
+                entry = await self.get_entry(starboard_message_id=msg.id)
+                if entry is not None and member.id == entry.author_id:
+                    logger.debug("Message cancelled in starboard channel, cancelling")
+                    await self.remove_from_starboard(config, entry, True)
+
+            # check if it's been cancelled on the original message
+            elif emoji == config.cancel_emoji:
+                entry = await self.get_entry(message_id=msg.id)
+                if entry is not None and member.id == entry.author_id:
+                    logger.debug("Message cancelled in original channel, cancelling")
+                    await self.remove_from_starboard(config, entry, True)
+
+    def debounce_star_check(self, reactions: MessageReactions, emoji: str, member: discord.Member):
+        """
+        Evaluates the star reactions of a message once they stop coming in for a moment, so a burst of stars on a popular
+        message costs one evaluation and at most one starboard post or edit instead of one per star. Every star restarts
+        the wait, up to STAR_DEBOUNCE_MAX after the first, so a steady stream of stars still gets evaluated.
+        """
+        msg = reactions.message
+        now = self.bot.loop.time()
+        first_star = now
+        pending = self.pending_checks.get(msg.id)
+        if pending is not None:
+            pending_member, first_star, task = pending
+            task.cancel()
+            if member == msg.guild.me:
+                member = pending_member  # a member's star decides, the bot's own doesn't post
+        delay = min(STAR_DEBOUNCE, first_star + STAR_DEBOUNCE_MAX - now)
+
+        async def check_later():
+            await asyncio.sleep(delay)
+            # Once the check starts, new stars schedule a check of their own instead of cancelling this one
+            del self.pending_checks[msg.id]
+            try:
+                await self.starboard_check(reactions, emoji, member)
+            except Exception as e:
+                logger.error(f"Starboard check of message {msg.id} failed: {e}")
+                logger.exception(e)
+
+        task = self.bot.loop.create_task(check_later(), name=f"Starboard check {msg.id}")
+        self.pending_checks[msg.id] = (member, first_star, task)
+
+    async def cog_unload(self):
+        """Cancels the star checks that haven't started yet"""
+        for _, _, task in self.pending_checks.values():
+            task.cancel()
+        self.pending_checks.clear()
 
     @Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
@@ -200,24 +276,40 @@ class Starboard(Cog):
         """Raw API event for reaction remove, passes event to action handler"""
         await self.on_raw_reaction_action(payload)
 
+    @Cog.listener()
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        """Drops a message whose reactions were all removed from the reaction message cache"""
+        self.messages.discard(payload.message_id)
+
+    @Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload: discord.RawReactionClearEmojiEvent):
+        """Drops a message whose reactions of one emoji were removed from the reaction message cache"""
+        self.messages.discard(payload.message_id)
+
+    @Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """Drops a deleted message from the reaction message cache"""
+        self.messages.discard(payload.message_id)
+
     async def on_raw_reaction_action(self, payload: discord.RawReactionActionEvent):
         """Convert the payload into a reaction event and pass the reaction event onto our handler"""
-        for msg in self.bot.cached_messages:
-            if msg.id == payload.message_id:
-                message = msg
-                break
-        else:
-            channel = self.bot.get_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-
+        if payload.guild_id is None:
+            return
+        config = await self.config_cache.query_one(guild_id=payload.guild_id)
         emoji = str(payload.emoji)
-        matching_reaction = [reaction for reaction in message.reactions if str(reaction.emoji) == emoji]
+        if config is None or emoji not in (config.star_emoji, config.cancel_emoji):
+            return
+
+        reactions = await self.messages.get(payload)
+        if reactions is None:
+            logger.debug(f"Unable to find message({payload.message_id}) for starboard reaction")
+            return
 
-        member = payload.member or message.author
-        if len(matching_reaction):
-            await self.starboard_check(matching_reaction[0], member)
+        member = payload.member or reactions.message.author
+        if emoji == config.star_emoji:
+            self.debounce_star_check(reactions, emoji, member)
         else:
-            logger.debug(f"Unable to find reaction for message({message.id})")
+            await self.starboard_check(reactions, emoji, member)
 
     @guild_only()
     @group(invoke_without_command=True, aliases=['hof'])
@@ -328,12 +420,8 @@ class Starboard(Cog):
 
         try:
             msg = await channel.fetch_message(message_id)
-            for reaction in msg.reactions:
-                if str(reaction) != config.star_emoji:
-                    await self.send_to_starboard(config, msg, reaction.count, False)
-                    break
-            else:
-                await self.send_to_starboard(config, msg, 0, False)
+            stars = next((reaction.count - reaction.me for reaction in msg.reactions if str(reaction) == config.star_emoji), 0)
+            await self.send_to_starboard(config, msg, stars, False)
         except discord.NotFound:
             await ctx.send(f"Message {message_id} not found in {channel.mention}")
             return
@@ -345,6 +433,86 @@ class Starboard(Cog):
     manually.
     """
 
+    @staticmethod
+    def _backfill_stars(config, msg: discord.Message) -> int:
+        """Counts the stars of a message from the reactions its history payload came with, without listing who reacted"""
+        stars = 0
+        for reaction in msg.reactions:
+            if str(reaction) == config.cancel_emoji and reaction.me:
+                return 0  # cancelled before
+            if str(reaction) == config.star_emoji:
+                stars = reaction.count - reaction.me
+        return stars
+
+    @guild_only()
+    @has_permissions(manage_guild=True)
+    @bot_has_permissions(read_message_history=True, embed_links=True)
+    @starboard.command()
+    async def backfill(self, ctx: DozerContext, days: int, channel: discord.TextChannel = None):
+        """Posts messages from the last few days that have enough stars but never made it to the starboard, oldest first.
+        Scans the given channel, or every channel the bot can read if none is given."""
+        config = await self.config_cache.query_one(guild_id=ctx.guild.id)
+        if config is None:
+            await ctx.send(f"There is not a Starboard configured for this server. Set one up with "
+                           f"`{ctx.prefix}starboard config`")
+            return
+        if not 0 < days <= MAX_BACKFILL_DAYS:
+            raise BadArgument(f"Backfills can go back between 1 and {MAX_BACKFILL_DAYS} days")
+        channels = [channel for channel in ([channel] if channel else ctx.guild.text_channels)
+                    if channel.id != config.channel_id and channel.permissions_for(ctx.me).read_message_history]
+        after = discord.utils.utcnow() - datetime.timedelta(days=days)
+
+        found = []
+
+        async def scan(channel: discord.TextChannel):
+            async for msg in channel.history(limit=None, after=after):
+                stars = self._backfill_stars(config, msg)
+                if stars >= config.threshold and not msg.author.bot:
+                    found.append((msg, stars))
+
+        scanning = ProgressMessage(ctx, "Starboard backfill", template="{done}/{total} channels scanned")
+        results = await run_bounded(channels, scan, concurrency=BACKFILL_CONCURRENCY, progress=scanning.update)
+        failed = sum(isinstance(result, Exception) for result in results)
+        await scanning.finish(f"Scanned {len(channels) - failed} channels, found {len(found)} starred messages")
+
+        found.sort(key=lambda pair: pair[0].id)
+        posting = ProgressMessage(ctx, "Starboard backfill", template="{done}/{total} starred messages checked")
+        posted = 0
+        for done, (msg, stars) in enumerate(found, 1):
+            async with self.message_lock(msg.id):
+                if await self.get_entry(message_id=msg.id) is None:
+                    await self.backfill_limiter.wait()
+                    await self.send_to_starboard(config, msg, stars, add_react=False)
+                    posted += 1
+            posting.update(done, len(found))
+        await posting.finish(f"Posted {posted} messages")
+        await ctx.send(f"Backfill complete: posted {posted} of {len(found)} starred messages"
+                       f"{f', {failed} channels could not be scanned' if failed else ''}.")
+
+    backfill.example_usage = """
+    `{prefix}starboard backfill 14` - post every message of the last two weeks that has enough stars but isn't on the starboard
+    `{prefix}starboard backfill 30 #general` - do the same for the last 30 days of #general only
+    """
+
+    @guild_only()
+    @starboard.command()
+    async def top(self, ctx: DozerContext):
+        """Shows the members whose messages collected the most stars on the starboard."""
+        authors = await StarboardAuthor.top(ctx.guild.id, TOP_AUTHORS)
+        e = discord.Embed(title=f"Most starred members in {ctx.guild}", color=discord.Color.gold())
+        e.description = '\n'.join(f"**{rank}.** <@{author.author_id}> - {author.stars} star{'s' if author.stars != 1 else ''} "
+                                   f"over {author.posts} post{'s' if author.posts != 1 else ''}"
+                                   for rank, author in enumerate(authors, 1)) or "Nothing has been starred yet!"
+        estimated = await StarboardMessage.estimated_posts(ctx.guild.id)
+        if estimated:
+            e.set_footer(text=f"{estimated} post{'s' if estimated != 1 else ''} from before star counts were recorded "
+                              f"count as the star threshold until starred again")
+        await ctx.send(embed=e)
+
+    top.example_usage = """
+    `{prefix}starboard top` - show the ten members with the most starred messages
+    """
+
 
 async def setup(bot):
     """Add this cog to the bot"""
@@ -403,24 +571,177 @@ class StarboardMessage(db.DatabaseTable):
             message_id bigint PRIMARY KEY NOT NULL,
             channel_id bigint NOT NULL,
             starboard_message_id bigint NOT NULL,
-            author_id bigint NOT NULL
+            author_id bigint NOT NULL,
+            guild_id bigint null,
+            stars int NOT NULL DEFAULT 0,
+            stars_estimated boolean NOT NULL DEFAULT false
             )""")
 
-    def __init__(self, message_id: int, channel_id: int, starboard_message_id: int, author_id: int):
+    def __init__(self, message_id: int, channel_id: int, starboard_message_id: int, author_id: int, guild_id: int = None,
+                 stars: int = 0, stars_estimated: bool = False):
         super().__init__()
         self.message_id = message_id
         self.channel_id = channel_id
         self.starboard_message_id = starboard_message_id
         self.author_id = author_id
+        self.guild_id = guild_id
+        self.stars = stars
+        self.stars_estimated = stars_estimated
+
+    @classmethod
+    def _from_record(cls, record):
+        return cls(message_id=record.get("message_id"), channel_id=record.get("channel_id"),
+                   starboard_message_id=record.get("starboard_message_id"), author_id=record.get('author_id'),
+                   guild_id=record.get("guild_id"), stars=record.get("stars"), stars_estimated=record.get("stars_estimated"))
 
     @classmethod
     async def get_by(cls, **kwargs):
         results = await super().get_by(**kwargs)
-        result_list = []
-        for result in results:
-            obj = StarboardMessage(message_id=result.get("message_id"),
-                                   channel_id=result.get("channel_id"),
-                                   starboard_message_id=result.get("starboard_message_id"),
-                                   author_id=result.get('author_id'))
-            result_list.append(obj)
-        return result_list
+        return [cls._from_record(result) for result in results]
+
+    @classmethod
+    async def get_newer(cls, snowflake: int):
+        """Returns every entry whose original message or starboard post is newer than a snowflake"""
+        async with db.Pool.acquire() as conn:
+            results = await conn.fetch(f"""SELECT * FROM {cls.__tablename__}
+                WHERE message_id > $1 OR starboard_message_id > $1""", snowflake)
+        return [cls._from_record(result) for result in results]
+
+    async def record(self):
+        """Adds this post, counting it towards its author's totals in the same statement"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+                WITH added AS (
+                    INSERT INTO {self.__tablename__} (message_id, channel_id, starboard_message_id, author_id, guild_id, stars)
+                    VALUES ($1, $2, $3, $4, $5, $6) ON CONFLICT (message_id) DO NOTHING
+                    RETURNING guild_id, author_id, stars)
+                INSERT INTO {StarboardAuthor.__tablename__} AS totals (guild_id, author_id, posts, stars)
+                SELECT guild_id, author_id, 1, stars FROM added
+                ON CONFLICT (guild_id, author_id) DO UPDATE SET posts = totals.posts + 1, stars = totals.stars + EXCLUDED.stars""",
+                               self.message_id, self.channel_id, self.starboard_message_id, self.author_id, self.guild_id,
+                               self.stars)
+
+    async def set_stars(self, stars: int):
+        """Updates the star count of this post and its author's totals"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+                WITH old AS (SELECT guild_id, author_id, stars FROM {self.__tablename__} WHERE message_id = $1 FOR UPDATE),
+                updated AS (UPDATE {self.__tablename__} SET stars = $2, stars_estimated = false WHERE message_id = $1)
+                UPDATE {StarboardAuthor.__tablename__} AS totals SET stars = totals.stars + $2 - old.stars
+                FROM old WHERE totals.guild_id = old.guild_id AND totals.author_id = old.author_id""", self.message_id, stars)
+        self.stars = stars
+        self.stars_estimated = False
+
+    async def remove(self):
+        """Deletes this post, taking it out of its author's totals in the same statement"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+                WITH removed AS (DELETE FROM {self.__tablename__} WHERE message_id = $1 RETURNING guild_id, author_id, stars)
+                UPDATE {StarboardAuthor.__tablename__} AS totals SET posts = totals.posts - 1, stars = totals.stars - removed.stars
+                FROM removed WHERE totals.guild_id = removed.guild_id AND totals.author_id = removed.author_id""",
+                               self.message_id)
+
+    @classmethod
+    async def unassigned_channels(cls):
+        """Returns the channels of the posts recorded before the table had a guild column"""
+        async with db.Pool.acquire() as conn:
+            records = await conn.fetch(f"SELECT DISTINCT channel_id FROM {cls.__tablename__} WHERE guild_id IS NULL")
+        return [record["channel_id"] for record in records]
+
+    @classmethod
+    async def assign_guilds(cls, guilds_by_channel: dict):
+        """
+        Fills in the guild of posts recorded without one, given the guild of each channel. Returns the guilds filled in.
+        Those posts were recorded without their stars either. Every one of them reached its guild's threshold, so that
+        is what they count as, marked as an estimate until the post is starred again and its real count is recorded.
+        """
+        async with db.Pool.acquire() as conn:
+            records = await conn.fetch(f"""
+                UPDATE {cls.__tablename__} AS posts SET guild_id = channels.guild_id,
+                    stars = GREATEST(posts.stars, COALESCE(config.threshold, 0)), stars_estimated = true
+                FROM unnest($1::bigint[], $2::bigint[]) AS channels (channel_id, guild_id)
+                LEFT JOIN {StarboardConfig.__tablename__} AS config ON config.guild_id = channels.guild_id
+                WHERE posts.channel_id = channels.channel_id AND posts.guild_id IS NULL
+                RETURNING posts.guild_id""", list(guilds_by_channel.keys()), list(guilds_by_channel.values()))
+        return list({record["guild_id"] for record in records})
+
+    @classmethod
+    async def estimated_posts(cls, guild_id: int) -> int:
+        """Returns how many posts of a guild count their stars as the threshold, not the recorded number"""
+        async with db.Pool.acquire() as conn:
+            return await conn.fetchval(f"SELECT count(*) FROM {cls.__tablename__} WHERE guild_id = $1 AND stars_estimated",
+                                       guild_id)
+
+    async def version_1(self):
+        """DB migration v1"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            alter table {self.__tablename__} add if not exists guild_id bigint null;
+            alter table {self.__tablename__} add if not exists stars int not null default 0;
+            """)
+
+    async def version_2(self):
+        """DB migration v2"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            alter table {self.__tablename__} add if not exists stars_estimated boolean not null default false;
+            """)
+
+    __versions__ = [version_1, version_2]
+
+
+class StarboardAuthor(db.DatabaseTable):
+    """How many of a member's messages made it to the starboard, and how many stars they collected"""
+    __tablename__ = 'starboard_authors'
+    __uniques__ = 'guild_id, author_id'
+
+    @classmethod
+    async def initial_create(cls):
+        """Create the table in the database"""
+        async with db.Pool.acquire() as conn:
+            await conn.execute(f"""
+            CREATE TABLE {cls.__tablename__} (
+            guild_id bigint NOT NULL,
+            author_id bigint NOT NULL,
+            posts int NOT NULL DEFAULT 0,
+            stars bigint NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, author_id)
+            );
+            CREATE INDEX {cls.__tablename__}_stars ON {cls.__tablename__} (guild_id, stars DESC, posts DESC);
+            """)
+
+    def __init__(self, guild_id: int, author_id: int, posts: int = 0, stars: int = 0):
+        super().__init__()
+        self.guild_id = guild_id
+        self.author_id = author_id
+        self.posts = posts
+        self.stars = stars
+
+    @classmethod
+    def _from_record(cls, record):
+        return cls(guild_id=record.get("guild_id"), author_id=record.get("author_id"), posts=record.get("posts"),
+                   stars=record.get("stars"))
+
+    @classmethod
+    async def get_by(cls, **kwargs):
+        results = await super().get_by(**kwargs)
+        return [cls._from_record(result) for result in results]
+
+    @classmethod
+    async def top(cls, guild_id: int, limit: int):
+        """Returns the members of a guild with the most stars, most first"""
+        async with db.Pool.acquire() as conn:
+            records = await conn.fetch(f"""SELECT * FROM {cls.__tablename__} WHERE guild_id = $1 AND posts > 0
+                ORDER BY stars DESC, posts DESC LIMIT $2""", guild_id, limit)
+        return [cls._from_record(record) for record in records]
+
+    @classmethod
+    async def rebuild(cls, guild_ids: typing.List[int]):
+        """Recounts the totals of every member of the given guilds from the posts table"""
+        async with db.Pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(f"DELETE FROM {cls.__tablename__} WHERE guild_id = ANY($1::bigint[])", guild_ids)
+                await conn.execute(f"""
+                    INSERT INTO {cls.__tablename__} (guild_id, author_id, posts, stars)
+                    SELECT guild_id, author_id, count(*), sum(stars) FROM {StarboardMessage.__tablename__}
+                    WHERE guild_id = ANY($1::bigint[]) GROUP BY guild_id, author_id""", guild_ids)